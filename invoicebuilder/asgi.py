@@ -0,0 +1,22 @@
+"""
+ASGI config for invoicebuilder project.
+
+It exposes the ASGI callable as a module-level variable named ``application``,
+e.g. for ``uvicorn invoicebuilder.asgi:application``. Requests run on a pool
+of ASGI_THREADS threads, see invoicebuilder.handlers.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "invoicebuilder.settings")
+django.setup(set_prefix=False)
+
+from invoicebuilder.handlers import ThreadedASGIHandler  # noqa: E402
+
+application = ThreadedASGIHandler()
+
+from invoices.pdf import warm_pdf_renderer  # noqa: E402
+
+warm_pdf_renderer()
@@ -0,0 +1,54 @@
+"""
+SQLite backend for several worker processes sharing one database file.
+
+It understands two OPTIONS that Django's own backend only gained in 5.1,
+under the same names:
+
+``init_command``
+    Statements separated by semicolons, usually PRAGMAs, run on every new
+    connection.
+``transaction_mode``
+    ``DEFERRED``, ``IMMEDIATE`` or ``EXCLUSIVE``, how atomic() blocks
+    BEGIN. IMMEDIATE takes the write lock up front, so a transaction that
+    reads before it writes waits for the lock (see the ``timeout`` option)
+    instead of failing with "database is locked" when it tries to upgrade.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+
+TRANSACTION_MODES = {'DEFERRED', 'IMMEDIATE', 'EXCLUSIVE'}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        # Ours, not sqlite3.connect()'s
+        params.pop('init_command', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    @property
+    def transaction_mode(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        if mode is not None and mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"transaction_mode must be one of {', '.join(sorted(TRANSACTION_MODES))}, not {mode!r}"
+            )
+        return mode and mode.upper()
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        init_command = self.settings_dict['OPTIONS'].get('init_command')
+        if init_command:
+            for statement in init_command.split(';'):
+                if statement.strip():
+                    conn.execute(statement)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            super()._start_transaction_under_autocommit()
+        else:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
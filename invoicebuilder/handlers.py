@@ -0,0 +1,142 @@
+import asyncio
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core import signals
+from django.core.exceptions import RequestAborted
+from django.core.handlers.asgi import ASGIHandler
+from django.http import FileResponse
+from django.urls import set_script_prefix
+
+
+class ThreadedASGIHandler(ASGIHandler):
+    """
+    ASGI handler that keeps the event loop free of Django's blocking work.
+
+    Django 3.0 views are synchronous, and its ASGIHandler iterates streaming
+    responses (the CSV and PDF exports) on the event loop, where their
+    queries fail as async-unsafe. Here the whole request, from
+    request_started to response.close(), runs on one thread of a pool of
+    ASGI_THREADS, so each request keeps its database connection and
+    request_finished closes it. Response bodies are handed to the event loop
+    through a small queue, which also applies back-pressure to slow clients.
+    When the client disconnects mid-response the thread stops producing the
+    body within put_timeout seconds, closes the response and is free again.
+    """
+    body_queue_size = 4
+    put_timeout = 1
+
+    def __init__(self):
+        super().__init__()
+        self.executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'ASGI_THREADS', None), thread_name_prefix='asgi-request',
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await super().__call__(scope, receive, send)
+        try:
+            body_file = await self.read_body(receive)
+        except RequestAborted:
+            return
+
+        loop = asyncio.get_running_loop()
+        messages = asyncio.Queue(maxsize=self.body_queue_size)
+        aborted = threading.Event()
+        handled = loop.run_in_executor(self.executor, self.handle_sync, scope, body_file, loop, messages, aborted)
+        sending = asyncio.ensure_future(self.send_response(messages, send))
+        disconnected = asyncio.ensure_future(self.wait_for_disconnect(receive))
+        try:
+            await asyncio.wait([sending, disconnected], return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            aborted.set()
+            sending.cancel()
+            raise
+        finally:
+            disconnected.cancel()
+        if not sending.done():
+            # The client went away mid-response
+            sending.cancel()
+            await asyncio.wait([sending])
+        if sending.cancelled() or sending.exception() is not None:
+            # Nobody reads the rest of the body, the request thread stops producing it
+            aborted.set()
+        # Re-raises anything that went wrong in the request thread
+        await handled
+        if not sending.cancelled():
+            sending.result()
+
+    @staticmethod
+    async def wait_for_disconnect(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def send_response(self, messages, send):
+        response = await messages.get()
+        if response is None:
+            return
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': self.response_headers(response),
+        })
+        while True:
+            part = await messages.get()
+            if part is None:
+                break
+            for chunk, _ in self.chunk_bytes(part):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body'})
+
+    def handle_sync(self, scope, body_file, loop, messages, aborted):
+        def put(message):
+            # Waits for room in the queue, False once nobody reads it anymore
+            while not aborted.is_set():
+                future = asyncio.run_coroutine_threadsafe(
+                    asyncio.wait_for(messages.put(message), self.put_timeout), loop,
+                )
+                try:
+                    future.result()
+                    return True
+                except asyncio.TimeoutError:
+                    continue
+                except CancelledError:
+                    # The event loop is shutting down
+                    break
+            return False
+
+        try:
+            set_script_prefix(self.get_script_prefix(scope))
+            signals.request_started.send(sender=self.__class__, scope=scope)
+            request, response = self.create_request(scope, body_file)
+            if request is not None:
+                response = self.get_response(request)
+            response._handler_class = self.__class__
+            if isinstance(response, FileResponse):
+                response.block_size = self.chunk_size
+            try:
+                if put(response):
+                    if response.streaming:
+                        for part in response:
+                            if not put(part):
+                                break
+                    else:
+                        put(response.content)
+            finally:
+                response.close()
+        finally:
+            put(None)
+
+    @staticmethod
+    def response_headers(response):
+        headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            headers.append((b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+        return headers
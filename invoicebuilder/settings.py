@@ -40,7 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
 
     # Local
-    'invoices',
+    'invoices.apps.InvoicesConfig',
     'users.apps.UsersConfig',
     'phonenumber_field',
 
@@ -56,6 +56,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'invoices.middleware.QueryInstrumentationMiddleware',
 ]
 
 ROOT_URLCONF = 'invoicebuilder.urls'
@@ -71,6 +72,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'invoices.context_processors.currency',
             ],
         },
     },
@@ -82,10 +84,35 @@ WSGI_APPLICATION = 'invoicebuilder.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.0/ref/settings/#databases
 
-DATABASES = {
+# SQLITE_PROFILE picks one of these. 'default' is Django's stock SQLite
+# setup. Opt in to 'concurrent' to let several gunicorn workers share the
+# database: WAL journaling so readers don't wait for writers, a busy timeout
+# instead of immediate "database is locked" errors, and write transactions
+# that take the lock when they BEGIN.
+SQLITE_PROFILES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+    },
+    'concurrent': {
+        'ENGINE': 'invoicebuilder.db.sqlite3',
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA cache_size=-20000;'
+                'PRAGMA mmap_size=134217728;'
+                'PRAGMA temp_store=MEMORY'
+            ),
+        },
+    },
+}
+
+DATABASES = {
+    'default': {
+        **SQLITE_PROFILES[os.environ.get('SQLITE_PROFILE', 'default')],
+        'NAME': os.environ.get('SQLITE_PATH', os.path.join(BASE_DIR, 'db.sqlite3')),
     }
 }
 
@@ -135,3 +162,87 @@ AUTH_USER_MODEL = 'users.CustomUser'
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'home'
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
+
+# Threads that serve requests under invoicebuilder.asgi, None means
+# min(32, CPUs + 4) like any ThreadPoolExecutor
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 0)) or None
+
+# PDF rendering
+# 'weasyprint' lays out templates/pdf/html-invoice.html, 'reportlab' draws
+# the same invoice directly and renders many times faster, see
+# invoices.pdf_reportlab
+PDF_ENGINE = os.environ.get('PDF_ENGINE', 'weasyprint')
+
+# TrueType regular and bold fonts the reportlab engine draws with, file
+# names on ReportLab's TTFSearchPath or paths. Invoices with text they have
+# no glyphs for are rendered with WeasyPrint instead.
+PDF_REPORTLAB_FONTS = ('DejaVuSans.ttf', 'DejaVuSans-Bold.ttf')
+
+# Size of the render pool the export_invoice_pdfs command starts, None
+# means one per CPU
+PDF_EXPORT_WORKERS = None
+
+# Size of a long-lived process pool that generate_pdf_invoice and the ZIP
+# export hand renders to, so a web process runs at most this many at once
+# and its request threads only wait on them. None renders in the request
+# thread.
+PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', 0)) or None
+
+# Rendered invoice PDFs are cached on disk, keyed by a digest of everything
+# the template shows. Set PDF_CACHE_DIR to None to disable the cache.
+PDF_CACHE_DIR = os.path.join(BASE_DIR, 'pdf_cache')
+PDF_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Renders read static and media files from disk instead of fetching them
+# over HTTP, and keep up to this much of them in memory, see invoices.pdf_assets
+PDF_ASSET_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# When True, generate_pdf_invoice queues the render for the process_pdf_jobs
+# worker and answers with the job id. Single requests can opt in with ?mode=job
+PDF_JOB_MODE = False
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# The invoice and client tables are cached per user and page, see
+# invoices.fragments. Any cache backend works, e.g. for a cache shared by
+# several processes on one host:
+# 'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+# 'LOCATION': os.path.join(BASE_DIR, 'fragment_cache'),
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+FRAGMENT_CACHE_ALIAS = 'default'
+FRAGMENT_CACHE_TIMEOUT = 300
+
+# Invoices are issued in their client's currency and totalled in
+# BASE_CURRENCY, with rates loaded by the import_exchange_rates command.
+# Each process rereads the rates once its copy is this many seconds old.
+BASE_CURRENCY = 'USD'
+EXCHANGE_RATE_CACHE_TTL = 300
+
+# Per-request query counts and timings, see invoices.middleware
+QUERY_INSTRUMENTATION = False
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'query_stats': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': os.path.join(BASE_DIR, 'query-stats.log'),
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'invoices.queries': {
+            'handlers': ['query_stats'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "invoicebuilder.settings")
 
 application = get_wsgi_application()
+
+# Parse the invoice stylesheet and load fonts once per worker, before the
+# first PDF request has to pay for it.
+from invoices.pdf import warm_pdf_renderer  # noqa: E402
+
+warm_pdf_renderer()
@@ -4,7 +4,7 @@ from django.contrib.auth.admin import UserAdmin
 
 from users.forms import CustomUserCreationForm, CustomUserChangeForm
 from users.models import CustomUser
-from .models import Invoice, Client, InvoiceItem
+from .models import Invoice, Client, ExchangeRate, InvoiceItem, RecurringInvoice, RecurringInvoiceItem
 
 class CustomUserAdmin(UserAdmin):
     add_form = CustomUserCreationForm
@@ -21,9 +21,25 @@ class InvoiceAdmin(admin.ModelAdmin):
     inlines = [
         InvoiceItemsInline,
     ]
-    readonly_fields = ('invoice_total',)
-    # TODO: Add a custom save method to save invoice totals
+    # Inline item saves and deletes keep the totals up to date
+    readonly_fields = ('net_total', 'tax_total', 'invoice_total', 'currency', 'exchange_rate', 'base_total')
+
+class RecurringInvoiceItemsInline(admin.TabularInline):
+    model = RecurringInvoiceItem
+
+
+class RecurringInvoiceAdmin(admin.ModelAdmin):
+    inlines = [
+        RecurringInvoiceItemsInline,
+    ]
+    list_display = ('title', 'client', 'interval_months', 'next_date', 'active')
+    readonly_fields = ('billed_cycles', 'next_date')
+
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ('currency', 'rate', 'updated_at')
 
 admin.site.register(Invoice, InvoiceAdmin)
+admin.site.register(RecurringInvoice, RecurringInvoiceAdmin)
 admin.site.register(Client)
+admin.site.register(ExchangeRate, ExchangeRateAdmin)
 admin.site.register(InvoiceItem)
@@ -0,0 +1,192 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from .currency import UnknownCurrency, get_rate, to_base
+from .forms import InvoiceApiForm, InvoiceItemApiForm
+from .models import Client, ClientSummary, Invoice, InvoiceItem, RevenueRollup
+
+
+MAX_BULK_INVOICES = 5000
+
+
+def largest_amount(field):
+    return Decimal(10) ** (field.max_digits - field.decimal_places) - Decimal(10) ** -field.decimal_places
+
+
+# Both totals are stored, the base total at the invoice's exchange rate
+MAX_INVOICE_TOTAL = largest_amount(Invoice._meta.get_field('invoice_total'))
+MAX_BASE_TOTAL = largest_amount(Invoice._meta.get_field('base_total'))
+
+
+def validate_invoices(user, records):
+    """
+    Validate a list of invoice dicts with nested ``items`` for ``user``.
+
+    Returns (invoices, errors): the cleaned invoices, each with its resolved
+    ``client_id``, its cleaned ``items`` (None when left out) and, for
+    updates, the ``invoice`` being replaced; and a list of
+    {'index': ..., 'errors': ...} for the records that were rejected,
+    including those whose items add up to more than the totals can hold.
+    Clients and existing invoices are looked up with one query each.
+    """
+    if not isinstance(records, list):
+        return [], [{'index': None, 'errors': {'__all__': [{'message': 'Expected a list of invoices'}]}}]
+    if len(records) > MAX_BULK_INVOICES:
+        return [], [{'index': None, 'errors': {
+            '__all__': [{'message': f'At most {MAX_BULK_INVOICES} invoices per request'}]
+        }}]
+
+    invoices, errors = [], []
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            errors.append({'index': index, 'errors': {'__all__': [{'message': 'Expected an object'}]}})
+            continue
+        form = InvoiceApiForm(record)
+        record_errors = {} if form.is_valid() else form.errors.get_json_data()
+
+        items = record.get('items')
+        cleaned_items = None
+        if items is not None:
+            if not isinstance(items, list):
+                record_errors['items'] = [{'message': 'Expected a list of items'}]
+            else:
+                cleaned_items = []
+                for item_index, item in enumerate(items):
+                    item_form = InvoiceItemApiForm(item if isinstance(item, dict) else {})
+                    if item_form.is_valid():
+                        cleaned_items.append(item_form.cleaned_data)
+                    else:
+                        record_errors.setdefault('items', {})[item_index] = item_form.errors.get_json_data()
+
+        if record_errors:
+            errors.append({'index': index, 'errors': record_errors})
+        else:
+            total = None
+            if cleaned_items is not None:
+                total = sum((InvoiceItem(**item).total() for item in cleaned_items), Decimal('0'))
+            invoices.append(dict(form.cleaned_data, index=index, items=cleaned_items, total=total))
+
+    client_ids = {invoice['client_id'] for invoice in invoices if invoice['client_id']}
+    emails = {invoice['client_email'].lower() for invoice in invoices if invoice['client_email']}
+    client_currencies, clients_by_email = {}, {}
+    clients = Client.objects.filter(created_by=user).annotate(email_lower=Lower('email')).filter(
+        Q(pk__in=client_ids) | Q(email_lower__in=emails)
+    ).order_by('-pk').values_list('pk', 'email_lower', 'currency')
+    for pk, email, currency in clients:
+        client_currencies[pk] = currency
+        clients_by_email[email] = pk
+
+    invoice_ids = [invoice['id'] for invoice in invoices if invoice['id']]
+    existing = Invoice.objects.filter(user=user).in_bulk(invoice_ids)
+
+    valid, seen = [], set()
+    for invoice in invoices:
+        if invoice['client_id']:
+            client_id = invoice['client_id'] if invoice['client_id'] in client_currencies else None
+        else:
+            client_id = clients_by_email.get(invoice['client_email'].lower())
+        if client_id is None:
+            errors.append({'index': invoice['index'], 'errors': {'client': [{'message': 'Unknown client'}]}})
+            continue
+        invoice['client_id'] = client_id
+        if invoice['id']:
+            if invoice['id'] not in existing:
+                errors.append({'index': invoice['index'], 'errors': {'id': [{'message': 'Unknown invoice'}]}})
+                continue
+            if invoice['id'] in seen:
+                errors.append({'index': invoice['index'], 'errors': {'id': [{'message': 'Duplicate invoice'}]}})
+                continue
+            seen.add(invoice['id'])
+            invoice['invoice'] = existing[invoice['id']]
+        if invoice['total'] is not None:
+            total_errors = check_total(invoice, client_currencies[client_id])
+            if total_errors:
+                errors.append({'index': invoice['index'], 'errors': total_errors})
+                continue
+        valid.append(invoice)
+
+    errors.sort(key=lambda error: error['index'])
+    return valid, errors
+
+
+def check_total(invoice, client_currency):
+    # Updated invoices keep the rate they were issued at
+    if invoice['total'] > MAX_INVOICE_TOTAL:
+        return {'items': [{'message': f'The invoice total can be at most {MAX_INVOICE_TOTAL}'}]}
+    if invoice.get('invoice') is not None:
+        rate = invoice['invoice'].exchange_rate
+    else:
+        try:
+            rate = get_rate(client_currency)
+        except UnknownCurrency:
+            return {'client': [{'message': f'No exchange rate for the client currency {client_currency}'}]}
+    if to_base(invoice['total'], rate) > MAX_BASE_TOTAL:
+        return {'items': [{'message': f'The invoice total in the base currency can be at most {MAX_BASE_TOTAL}'}]}
+    return {}
+
+
+def save_invoices(user, invoices):
+    """
+    Save invoices cleaned by validate_invoices in one transaction.
+
+    New invoices and all items are bulk inserted, updated invoices are
+    written with one bulk update and have their items replaced when
+    ``items`` was given. Totals, client summaries and revenue rollups are
+    recalculated once at the end. Returns one result per invoice.
+    """
+    with transaction.atomic():
+        new, updated, replaced, moved_from = [], [], [], set()
+        for data in invoices:
+            invoice = data.get('invoice')
+            data['created'] = invoice is None
+            if invoice is None:
+                invoice = data['invoice'] = Invoice(user=user)
+                new.append(invoice)
+            else:
+                updated.append(invoice)
+                if data['items'] is not None:
+                    replaced.append(invoice.pk)
+                if invoice.client_id != data['client_id']:
+                    moved_from.add(invoice.client_id)
+            invoice.title = data['title']
+            invoice.client_id = data['client_id']
+
+        Invoice.objects.bulk_insert(new)
+        Invoice.objects.bulk_update(updated, ['title', 'client'])
+
+        # create_date is auto_now_add, so given dates are set afterwards
+        by_date = defaultdict(list)
+        for data in invoices:
+            if data['create_date'] is not None:
+                by_date[data['create_date']].append(data['invoice'].pk)
+                data['invoice'].create_date = data['create_date']
+        for create_date, pks in by_date.items():
+            Invoice.objects.filter(pk__in=pks).update(create_date=create_date)
+
+        InvoiceItem.objects.filter(invoice_id__in=replaced).delete(update_totals=False)
+        InvoiceItem.objects.bulk_create([
+            InvoiceItem(invoice=data['invoice'], **dict(item, tax=item['tax'] or 0))
+            for data in invoices
+            for item in data['items'] or []
+        ], update_totals=False)
+
+        invoice_ids = [data['invoice'].pk for data in invoices]
+        Invoice.objects.filter(pk__in=invoice_ids).recalculate_totals()
+        if moved_from:
+            ClientSummary.objects.rebuild(moved_from)
+            RevenueRollup.objects.rebuild(moved_from)
+        totals = dict(Invoice.objects.filter(pk__in=invoice_ids).values_list('pk', 'invoice_total'))
+
+    return [
+        {
+            'index': data['index'],
+            'id': data['invoice'].pk,
+            'status': 'created' if data['created'] else 'updated',
+            'invoice_total': totals[data['invoice'].pk],
+        }
+        for data in invoices
+    ]
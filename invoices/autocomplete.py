@@ -0,0 +1,120 @@
+"""
+Prefix search over a user's clients for the invoice form's client picker.
+
+Each searched expression has an index from migration 0008 on (user,
+expression). A search reads one ordered range of each index, at most a page
+at a time, and merges them, so its cost depends on the page size and not on
+how many clients the user has or how many of them match.
+"""
+import heapq
+import json
+
+from django.db import connection
+
+
+PAGE_SIZE = 20
+
+SEARCH_EXPRESSIONS = [
+    "lower(first_name || ' ' || last_name)", 'lower(last_name)', 'lower(company)', 'lower(email)',
+]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def prefix_range(text):
+    """
+    Bounds of the strings that start with ``text``, lowercased the way
+    SQLite's lower() does, which only folds ASCII letters.
+    """
+    prefix = ''.join(char.lower() if char.isascii() else char for char in text)
+    return prefix, prefix + '\U0010ffff'
+
+
+def encode_cursor(positions):
+    return json.dumps(positions, separators=(',', ':'))
+
+
+def decode_cursor(cursor, branches):
+    """
+    Positions from encode_cursor(), one per expression: [key, id] of the
+    last row listed, [] when nothing was listed yet, None when done.
+    """
+    try:
+        positions = json.loads(cursor)
+    except ValueError:
+        raise InvalidCursor(cursor)
+    if not isinstance(positions, list) or len(positions) != branches or not all(
+        position is None or position == [] or (
+            isinstance(position, list) and len(position) == 2
+            and isinstance(position[0], str) and isinstance(position[1], int)
+        )
+        for position in positions
+    ):
+        raise InvalidCursor(cursor)
+    return positions
+
+
+def fetch_branch(cursor, user, expression, bounds, after, limit):
+    where, params = ['created_by_id = %s'], [user.pk]
+    if bounds is not None:
+        where.append(f'{expression} >= %s AND {expression} < %s')
+        params += bounds
+    if after:
+        where.append(f'({expression}, id) > (%s, %s)')
+        params += after
+    cursor.execute(
+        f'SELECT {expression}, id, first_name, last_name, company, email FROM invoices_client '
+        f'WHERE {" AND ".join(where)} ORDER BY {expression}, id LIMIT %s',
+        params + [limit],
+    )
+    return cursor.fetchall()
+
+
+def autocomplete_clients(user, text='', after=None, page_size=PAGE_SIZE):
+    """
+    One page of the user's clients whose name, last name, company or email
+    starts with ``text`` (case-insensitive), ordered by the matching value.
+    Without ``text`` all clients are listed by name.
+
+    Returns (clients, next_cursor) with clients as dicts and next_cursor, to
+    pass back as ``after``, None on the last page. A client that matches in
+    several ways is listed once per page but may show up again on a later
+    page. Raises InvalidCursor for a malformed ``after``.
+    """
+    text = text.strip()
+    expressions = SEARCH_EXPRESSIONS if text else SEARCH_EXPRESSIONS[:1]
+    bounds = list(prefix_range(text)) if text else None
+    positions = decode_cursor(after, len(expressions)) if after else [[] for _ in expressions]
+
+    branches, remaining, complete = [], [], []
+    with connection.cursor() as cursor:
+        for branch, (expression, position) in enumerate(zip(expressions, positions)):
+            rows = [] if position is None else fetch_branch(
+                cursor, user, expression, bounds, position, page_size + 1,
+            )
+            branches.append([(row[0], row[1], branch, row[2:]) for row in rows])
+            remaining.append(len(rows))
+            complete.append(len(rows) <= page_size)
+
+    clients, seen = [], set()
+    for key, pk, branch, (first_name, last_name, company, email) in heapq.merge(*branches):
+        positions[branch] = [key, pk]
+        remaining[branch] -= 1
+        if pk not in seen:
+            seen.add(pk)
+            clients.append({'id': pk, 'name': f'{first_name} {last_name}', 'company': company, 'email': email})
+        if len(clients) == page_size:
+            break
+        if not remaining[branch] and not complete[branch]:
+            # Rows of this branch that weren't fetched may sort before the
+            # heads of the others
+            break
+
+    for branch in range(len(positions)):
+        if not remaining[branch] and complete[branch]:
+            positions[branch] = None
+    if all(position is None for position in positions):
+        return clients, None
+    return clients, encode_cursor(positions)
@@ -0,0 +1,243 @@
+import json
+import math
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from collections import namedtuple
+
+import django
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client as TestClient, override_settings
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from . import urls
+from .fragments import invalidate_user_fragments
+from .jobs import complete_job, enqueue_pdf_job
+from .middleware import capture_queries
+from .models import Client, Invoice, InvoiceItem
+from .pdf import render_invoice_job
+
+
+BenchmarkRequest = namedtuple('BenchmarkRequest', ['name', 'method', 'path', 'data', 'content_type'])
+
+PERCENTILES = [50, 90, 95, 99]
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    rank = math.ceil(p / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def url_names():
+    """Names of the routes in invoices.urls, in declaration order"""
+    names = []
+    for pattern in urls.urlpatterns:
+        if isinstance(pattern, URLPattern) and pattern.name and pattern.name not in names:
+            names.append(pattern.name)
+    return names
+
+
+class BenchmarkFixtures:
+    """
+    The objects of the benchmarked user that the routes are pointed at.
+
+    The PDF job is created for the run and removed again by cleanup().
+    """
+
+    def __init__(self, user):
+        self.user = user
+        # The busiest invoice and client stand in for the worst case
+        self.invoice = Invoice.objects.filter(user=user).annotate(
+            item_count=Count('items')
+        ).order_by('-item_count', '-pk').first()
+        if self.invoice is None:
+            raise ValueError(f'{user} has no invoices to benchmark with')
+        self.client = self.invoice.client
+        # The PDF export and the statement render every invoice of a client,
+        # use the smallest
+        self.export_client = Client.objects.filter(created_by=user).annotate(
+            invoice_count=Count('invoice')
+        ).filter(invoice_count__gt=0).order_by('invoice_count').first()
+        self.job = enqueue_pdf_job(self.invoice, user)
+        complete_job(self.job, render_invoice_job(self.invoice.pk))
+
+    def cleanup(self):
+        self.job.delete()
+
+    def requests(self):
+        invoice, client, job = self.invoice.pk, self.client.pk, self.job.pk
+        args = {
+            'invoice-detail': [invoice], 'invoice-edit': [invoice], 'invoice-delete': [invoice],
+            'generate_pdf': [invoice], 'invoice-recurring': [invoice],
+            'client-detail': [client], 'client-edit': [client], 'client-statement': [self.export_client.pk],
+            'pdf-job-status': [job], 'pdf-job-download': [job],
+        }
+        query = {
+            'export-pdfs': {'client': self.export_client.pk},
+            'revenue-report': {'period': 'quarter', 'by_client': 'on'},
+            'invoice-search': {'q': self.invoice.title},
+        }
+        items = list(self.invoice.items.values('item', 'quantity', 'rate', 'tax')[:5])
+        bulk_payload = [
+            {'title': f'Benchmark {i}', 'client_id': client,
+             'items': [dict(item, rate=str(item['rate']), tax=str(item['tax'])) for item in items]}
+            for i in range(100)
+        ]
+        import_rows = 'invoice_ref,title,client_id,item,quantity,rate\n' + ''.join(
+            f'B-{i},Benchmark,{client},Work,1,10\n' for i in range(100)
+        )
+
+        for name in url_names():
+            path = reverse(name, args=args.get(name, []))
+            if name == 'invoice-bulk-api':
+                yield BenchmarkRequest(name, 'post', path, json.dumps(bulk_payload), 'application/json')
+            elif name == 'invoice-import':
+                upload = SimpleUploadedFile('benchmark.csv', import_rows.encode(), 'text/csv')
+                yield BenchmarkRequest(name, 'post', path, {'file': upload}, None)
+            elif name == 'invoice-recurring':
+                yield BenchmarkRequest(name, 'post', path, {'interval_months': 1}, None)
+            else:
+                yield BenchmarkRequest(name, 'get', path, query.get(name, {}), None)
+
+
+def perform(client, request):
+    if request.method == 'post':
+        if isinstance(request.data, dict) and 'file' in request.data:
+            request.data['file'].seek(0)
+        kwargs = {'content_type': request.content_type} if request.content_type else {}
+        response = client.post(request.path, request.data, **kwargs)
+    else:
+        response = client.get(request.path, request.data)
+    # Streaming responses do their work while being read
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def run_once(client, request):
+    """Time one request, with writes rolled back so the dataset stays the same"""
+    with capture_queries() as stats:
+        started = time.perf_counter()
+        if request.method == 'get':
+            response = perform(client, request)
+        else:
+            with transaction.atomic():
+                response = perform(client, request)
+                transaction.set_rollback(True)
+        elapsed = time.perf_counter() - started
+    return response.status_code, elapsed, stats
+
+
+def benchmark_request(client, request, iterations, warmup=1, cold=None):
+    for _ in range(warmup):
+        if cold:
+            cold()
+        run_once(client, request)
+
+    timings, queries, db_times, statuses = [], [], [], set()
+    for _ in range(iterations):
+        if cold:
+            cold()
+        status, elapsed, stats = run_once(client, request)
+        statuses.add(status)
+        timings.append(elapsed * 1000)
+        queries.append(stats.count)
+        db_times.append(stats.db_time * 1000)
+
+    # Memory is measured on a separate run, tracemalloc slows everything down
+    if cold:
+        cold()
+    tracemalloc.start()
+    try:
+        run_once(client, request)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    result = {
+        'method': request.method.upper(),
+        'path': request.path,
+        'status': sorted(statuses),
+        'iterations': iterations,
+        'latency_ms': {f'p{p}': round(percentile(timings, p), 3) for p in PERCENTILES},
+        'queries': {'median': statistics.median(queries), 'max': max(queries)},
+        'db_ms_median': round(statistics.median(db_times), 3),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+    result['latency_ms'].update(
+        mean=round(statistics.mean(timings), 3), max=round(timings[-1], 3),
+    )
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(user, iterations=20, warmup=1, names=None, cold=False, on_result=None):
+    """
+    Drive the invoices routes through the test client as ``user``.
+
+    Returns a JSON-serialisable report of latency percentiles, query counts
+    and peak Python memory per route. With ``cold`` the fragment cache is
+    reset before every request and the PDF cache is disabled.
+    """
+    client = TestClient()
+    client.force_login(user)
+    fixtures = BenchmarkFixtures(user)
+
+    reset = (lambda: invalidate_user_fragments(user.pk)) if cold else None
+    settings_override = override_settings(PDF_CACHE_DIR=None) if cold else override_settings()
+    results = {}
+    try:
+        with settings_override:
+            for request in fixtures.requests():
+                if names and request.name not in names:
+                    continue
+                results[request.name] = benchmark_request(client, request, iterations, warmup, reset)
+                if on_result is not None:
+                    on_result(request.name, results[request.name])
+    finally:
+        fixtures.cleanup()
+
+    return {
+        'meta': {
+            'created_at': timezone.now().isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'cold': cold,
+            'user': user.get_username(),
+            'dataset': {
+                'invoices': Invoice.objects.filter(user=user).count(),
+                'items': InvoiceItem.objects.filter(invoice__user=user).count(),
+                'clients': Client.objects.filter(created_by=user).count(),
+                'all_invoices': Invoice.objects.count(),
+            },
+        },
+        'results': results,
+    }
+
+
+def compare_reports(baseline, current):
+    """Yield (route, p50 before, p50 after, queries before, queries after) for routes in both"""
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        yield (name, before['latency_ms']['p50'], result['latency_ms']['p50'],
+               before['queries']['median'], result['queries']['median'])
@@ -0,0 +1,112 @@
+"""
+Billing runs: turn the recurring invoices due on a date into invoices.
+
+Recurring invoices are billed a batch at a time, each batch in its own
+transaction: the invoices and their items are bulk inserted with their
+totals already set, the recurring invoices move on to their next cycle and
+the new invoices are added to the client summaries and revenue rollups. A cycle
+is only ever billed together with the update that moves past it, so a run
+that is interrupted or repeated never bills a cycle twice.
+"""
+import time
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+
+from .fragments import invalidate_user_fragments
+from .models import (
+    NO_TOTALS, ClientSummary, Invoice, InvoiceItem, RecurringInvoice, RecurringInvoiceItem, RevenueRollup,
+)
+
+
+BillingResult = namedtuple('BillingResult', ['recurring', 'invoices', 'items', 'seconds'])
+
+
+def due_cycle_dates(recurring, date):
+    """Dates of the cycles of ``recurring`` that are due by ``date``, oldest first"""
+    last_date = min(date, recurring.end_date) if recurring.end_date else date
+    dates, cycle = [], recurring.billed_cycles
+    while recurring.cycle_date(cycle) <= last_date:
+        dates.append(recurring.cycle_date(cycle))
+        cycle += 1
+    return dates
+
+
+def add_to_aggregates(invoices):
+    """Count new (invoice, date, items) in the client summaries and revenue rollups"""
+    summaries = defaultdict(lambda: (0, Decimal('0'), None))
+    rollups = defaultdict(lambda: (0, Decimal('0')))
+    for invoice, invoice_date, items in invoices:
+        count, total, latest = summaries[invoice.client_id]
+        summaries[invoice.client_id] = (
+            count + 1, total + invoice.base_total, max(latest or invoice_date, invoice_date),
+        )
+        key = (invoice.user_id, invoice.client_id, invoice_date.replace(day=1))
+        count, revenue = rollups[key]
+        rollups[key] = (count + 1, revenue + invoice.base_total)
+    ClientSummary.objects.add_invoices(summaries)
+    RevenueRollup.objects.add_invoices(rollups)
+
+
+def bill_batch(recurring_ids, date):
+    """Bill the cycles due by ``date`` of the given recurring invoices, returns (invoices, items)"""
+    with transaction.atomic():
+        # Checked again under the lock, another run may have billed some
+        recurrings = list(
+            RecurringInvoice.objects.due(date).filter(pk__in=recurring_ids).select_for_update().order_by('pk')
+        )
+        template_items = defaultdict(list)
+        for item in RecurringInvoiceItem.objects.filter(recurring_invoice__in=recurrings).order_by('pk'):
+            template_items[item.recurring_invoice_id].append(item)
+
+        invoices, by_date, advanced = [], defaultdict(list), defaultdict(list)
+        for recurring in recurrings:
+            items = template_items[recurring.pk]
+            totals = sum((item.totals() for item in items), NO_TOTALS)
+            cycle_dates = due_cycle_dates(recurring, date)
+            for cycle_date in cycle_dates:
+                invoice = Invoice(
+                    title=recurring.title, user_id=recurring.user_id, client_id=recurring.client_id,
+                    net_total=totals.net, tax_total=totals.tax, invoice_total=totals.gross,
+                )
+                invoices.append((invoice, cycle_date, items))
+            cycles = recurring.billed_cycles + len(cycle_dates)
+            advanced[cycles, recurring.cycle_date(cycles)].append(recurring.pk)
+
+        Invoice.objects.bulk_insert([invoice for invoice, cycle_date, items in invoices])
+        line_items = []
+        for invoice, cycle_date, items in invoices:
+            by_date[cycle_date].append(invoice.pk)
+            line_items.extend(item.to_invoice_item(invoice.pk) for item in items)
+        # The totals were set on the invoices already
+        InvoiceItem.objects.bulk_create(line_items, update_totals=False)
+
+        # create_date is auto_now_add, so cycle dates are set afterwards
+        for cycle_date, pks in by_date.items():
+            Invoice.objects.filter(pk__in=pks).update(create_date=cycle_date)
+        # Mostly a handful of updates, recurring invoices started on the
+        # same day of the month move to the same next date
+        for (cycles, next_date), pks in advanced.items():
+            RecurringInvoice.objects.filter(pk__in=pks).update(billed_cycles=cycles, next_date=next_date)
+
+        add_to_aggregates(invoices)
+    invalidate_user_fragments(*{recurring.user_id for recurring in recurrings})
+    return len(invoices), len(line_items)
+
+
+def run_billing(date, batch_size=1000, progress=None):
+    """
+    Bill every recurring invoice due by ``date``, calling
+    ``progress(recurring invoices done)`` after each batch
+    """
+    started = time.perf_counter()
+    recurring_ids = list(RecurringInvoice.objects.due(date).order_by('pk').values_list('pk', flat=True))
+    invoice_count = item_count = 0
+    for start in range(0, len(recurring_ids), batch_size):
+        invoices, items = bill_batch(recurring_ids[start:start + batch_size], date)
+        invoice_count += invoices
+        item_count += items
+        if progress is not None:
+            progress(min(start + batch_size, len(recurring_ids)))
+    return BillingResult(len(recurring_ids), invoice_count, item_count, time.perf_counter() - started)
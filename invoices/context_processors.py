@@ -0,0 +1,6 @@
+from django.conf import settings
+
+
+def currency(request):
+    # Converted totals are labelled with the base currency
+    return {'BASE_CURRENCY': settings.BASE_CURRENCY}
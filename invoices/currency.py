@@ -0,0 +1,158 @@
+"""
+Currencies and exchange rates.
+
+Invoices are issued in their client's currency and also store their total
+converted to settings.BASE_CURRENCY, which the client summaries, revenue
+rollups and dashboards add up. The rates come from the ExchangeRate table,
+kept up to date from a file by the import_exchange_rates command. Each process keeps
+the table in memory and reads it again once it is older than
+settings.EXCHANGE_RATE_CACHE_TTL seconds, so an import reaches every process
+within that time.
+"""
+import csv
+import threading
+import time
+from collections import namedtuple
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+
+CENT = Decimal('0.01')
+# Rates are stored with six decimals, see ExchangeRate
+RATE_SCALE = 1000000
+
+RateTable = namedtuple('RateTable', ['rates', 'loaded_at'])
+
+_rate_table = None
+_rate_table_lock = threading.Lock()
+
+
+class UnknownCurrency(ValueError):
+    pass
+
+
+class RateFileError(ValueError):
+    def __init__(self, line, message):
+        super().__init__(f'line {line}: {message}')
+        self.line = line
+
+
+def base_currency():
+    return settings.BASE_CURRENCY
+
+
+def to_base(amount, rate):
+    """``amount`` converted with ``rate``, rounded to the cent like the database does"""
+    return (Decimal(amount) * Decimal(rate)).quantize(CENT, ROUND_HALF_UP)
+
+
+def load_rates():
+    """{currency: rate} from the ExchangeRate table"""
+    from .models import ExchangeRate
+    return dict(ExchangeRate.objects.values_list('currency', 'rate'))
+
+
+def get_rates():
+    """{currency: units of the base currency per unit}, cached per process"""
+    global _rate_table
+    table = _rate_table
+    if table is None or time.monotonic() - table.loaded_at > settings.EXCHANGE_RATE_CACHE_TTL:
+        with _rate_table_lock:
+            if _rate_table is table:
+                _rate_table = RateTable(load_rates(), time.monotonic())
+            table = _rate_table
+    return table.rates
+
+
+def clear_rate_cache():
+    """Read the rates again on next use, e.g. after this process imported new ones"""
+    global _rate_table
+    _rate_table = None
+
+
+def get_rate(currency):
+    """Rate of ``currency`` to the base currency, raises UnknownCurrency"""
+    if currency == settings.BASE_CURRENCY:
+        # Never needs the table
+        return Decimal('1')
+    try:
+        return get_rates()[currency]
+    except KeyError:
+        raise UnknownCurrency(currency)
+
+
+def validate_currency(value):
+    try:
+        get_rate(value)
+    except UnknownCurrency:
+        raise ValidationError(f'{value} is not the base currency or a currency with an exchange rate')
+
+
+def read_rates(fileobj):
+    """
+    {currency: rate} from a CSV file with ``currency`` and ``rate`` columns,
+    the rate being how many units of the base currency one unit is worth.
+    Raises RateFileError for the first bad row.
+    """
+    reader = csv.DictReader(fileobj)
+    if reader.fieldnames is None or not {'currency', 'rate'}.issubset(reader.fieldnames):
+        raise RateFileError(1, 'expected a header row with currency and rate columns')
+    rates = {}
+    for row in reader:
+        currency = (row['currency'] or '').strip().upper()
+        if len(currency) != 3 or not currency.isalpha():
+            raise RateFileError(reader.line_num, f'{currency!r} is not a currency code')
+        try:
+            rate = Decimal((row['rate'] or '').strip()).quantize(Decimal(1) / RATE_SCALE)
+        except InvalidOperation:
+            raise RateFileError(reader.line_num, f'{row["rate"]!r} is not a rate')
+        if rate <= 0:
+            raise RateFileError(reader.line_num, 'the rate must be positive')
+        if currency == settings.BASE_CURRENCY and rate != 1:
+            raise RateFileError(reader.line_num, f'the base currency {currency} can only have a rate of 1')
+        if currency in rates:
+            raise RateFileError(reader.line_num, f'{currency} is listed twice')
+        rates[currency] = rate
+    return rates
+
+
+RateImport = namedtuple('RateImport', ['imported', 'removed', 'kept'])
+
+
+def import_rates(fileobj):
+    """
+    Set the exchange rates to those of a rate file.
+
+    Rates in the file are updated or added. Currencies the file leaves out
+    are removed, except those clients or invoices still use: new invoices
+    for those clients need a rate, so it is kept and reported in ``kept``.
+    """
+    from .models import Client, ExchangeRate, Invoice
+    rates = read_rates(fileobj)
+    rates.pop(settings.BASE_CURRENCY, None)
+    with transaction.atomic():
+        existing = {rate.currency: rate for rate in ExchangeRate.objects.select_for_update()}
+        missing = set(existing) - set(rates)
+        kept = set(Client.objects.filter(currency__in=missing).values_list('currency', flat=True))
+        kept.update(Invoice.objects.filter(currency__in=missing).values_list('currency', flat=True).distinct())
+        removed = missing - kept
+        ExchangeRate.objects.filter(currency__in=removed).delete()
+
+        now = timezone.now()
+        changed = []
+        for currency, rate in rates.items():
+            if currency in existing and existing[currency].rate != rate:
+                existing[currency].rate = rate
+                existing[currency].updated_at = now
+                changed.append(existing[currency])
+        ExchangeRate.objects.bulk_update(changed, ['rate', 'updated_at'])
+        ExchangeRate.objects.bulk_create([
+            ExchangeRate(currency=currency, rate=rate)
+            for currency, rate in sorted(rates.items()) if currency not in existing
+        ])
+    clear_rate_cache()
+    return RateImport(len(rates), sorted(removed), sorted(kept))
@@ -0,0 +1,160 @@
+import bisect
+import datetime
+import itertools
+import random
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .fragments import invalidate_user_fragments
+from .models import Client, ClientSummary, Invoice, InvoiceItem
+
+
+ITEM_NAMES = [
+    'Consulting', 'Design', 'Development', 'Hosting', 'Support', 'Maintenance',
+    'Training', 'Licence', 'Audit', 'Migration', 'Travel', 'Workshop',
+]
+COMPANIES = ['Corp', 'Holdings', 'Accounting', 'Logistics', 'Labs', 'Trading', 'Studio']
+COUNTRIES = ['Zimbabwe', 'South Africa', 'Kenya', 'Nigeria', 'Ghana', 'Botswana']
+
+
+class WeightedChoice:
+    """Draw indexes 0..n-1 with Zipf weights 1/(i+1)**skew, so a few are very popular"""
+
+    def __init__(self, rng, n, skew):
+        self.rng = rng
+        self.cumulative = list(itertools.accumulate(1 / (i + 1) ** skew for i in range(n)))
+
+    def __call__(self):
+        return bisect.bisect(self.cumulative, self.rng.random() * self.cumulative[-1])
+
+
+class DatasetGenerator:
+    """
+    Generate users, clients, invoices and line items with bulk inserts.
+
+    Sizes are skewed the way real accounts are: a few users own most of the
+    clients, a few clients get most of the invoices, most invoices have a
+    handful of items and rates are log-normally distributed. Everything is
+    drawn from ``seed``, so a dataset can be regenerated for comparisons.
+    All usernames start with ``prefix``.
+    """
+
+    def __init__(self, users=10, clients=200, invoices=10000, max_items=20, months=24,
+                 skew=1.1, seed=0, prefix='bench', batch_size=1000):
+        self.users = users
+        self.clients = max(clients, users)
+        self.invoices = invoices
+        self.max_items = max_items
+        self.months = months
+        self.skew = skew
+        self.rng = random.Random(seed)
+        self.prefix = prefix
+        self.batch_size = batch_size
+
+    def run(self, progress=None):
+        """Create the dataset, calling ``progress(invoices done)`` after each batch"""
+        users = self.create_users()
+        clients_by_user = self.create_clients(users)
+        invoice_count, item_count = self.create_invoices(clients_by_user, progress)
+
+        user_ids = [user.pk for user in users]
+        Invoice.objects.filter(user_id__in=user_ids).recalculate_totals()
+        ClientSummary.objects.rebuild(
+            [client_id for client_ids in clients_by_user.values() for client_id in client_ids]
+        )
+        invalidate_user_fragments(*user_ids)
+        return {
+            'users': len(users),
+            'clients': sum(len(ids) for ids in clients_by_user.values()),
+            'invoices': invoice_count,
+            'items': item_count,
+        }
+
+    def create_users(self):
+        User = get_user_model()
+        usernames = [f'{self.prefix}-user-{i}' for i in range(self.users)]
+        password = make_password(None)
+        User.objects.bulk_create([
+            User(username=username, email=f'{username}@example.com', password=password)
+            for username in usernames
+        ])
+        users = {user.username: user for user in User.objects.filter(username__in=usernames)}
+        # Keep the creation order, user 0 gets the most clients
+        return [users[username] for username in usernames]
+
+    def create_clients(self, users):
+        pick_user = WeightedChoice(self.rng, len(users), self.skew)
+        owners = list(range(len(users))) + [pick_user() for _ in range(self.clients - len(users))]
+        Client.objects.bulk_create([
+            Client(
+                first_name=f'Client{i}', last_name=self.rng.choice(ITEM_NAMES),
+                email=f'client{i}@{self.prefix}.example.com',
+                company=f'{self.prefix.title()} {self.rng.choice(COMPANIES)} {i}',
+                address1=f'{self.rng.randint(1, 999)} Main Road', address2='',
+                country=self.rng.choice(COUNTRIES), phone_number='+263771811111',
+                created_by=users[owner],
+            )
+            for i, owner in enumerate(owners)
+        ])
+
+        clients_by_user = defaultdict(list)
+        rows = Client.objects.filter(created_by__in=users).order_by('pk').values_list('created_by_id', 'pk')
+        for user_id, client_id in rows:
+            clients_by_user[user_id].append(client_id)
+        return clients_by_user
+
+    def random_items(self):
+        # Mostly short invoices with a long tail
+        count = min(1 + int(self.rng.expovariate(1 / 3)), self.max_items)
+        items = []
+        for _ in range(count):
+            quantity = min(1 + int(self.rng.expovariate(1 / 2)), 50)
+            rate = Decimal(min(self.rng.lognormvariate(3.5, 1.0), 2000)).quantize(Decimal('0.01'))
+            items.append((self.rng.choice(ITEM_NAMES), quantity, rate))
+        return items
+
+    def create_invoices(self, clients_by_user, progress=None):
+        # Invoices follow clients, so heavy users get heavy invoice counts too
+        pairs = [(user_id, client_id) for user_id, client_ids in clients_by_user.items()
+                 for client_id in client_ids]
+        self.rng.shuffle(pairs)
+        pick_client = WeightedChoice(self.rng, len(pairs), self.skew)
+        today = datetime.date.today()
+
+        invoice_count = item_count = 0
+        while invoice_count < self.invoices:
+            size = min(self.batch_size, self.invoices - invoice_count)
+            with transaction.atomic():
+                invoices = []
+                for i in range(size):
+                    user_id, client_id = pairs[pick_client()]
+                    invoices.append(Invoice(
+                        title=f'Invoice {invoice_count + i}', user_id=user_id, client_id=client_id,
+                    ))
+                Invoice.objects.bulk_insert(invoices)
+
+                # create_date is auto_now_add, so the dates are set afterwards,
+                # a week apart to keep the number of UPDATEs down. Recent
+                # weeks are busier.
+                by_date = defaultdict(list)
+                for invoice in invoices:
+                    weeks = int(self.rng.triangular(0, self.months * 4.35, 0))
+                    by_date[today - datetime.timedelta(weeks=weeks)].append(invoice.pk)
+                for create_date, pks in by_date.items():
+                    Invoice.objects.filter(pk__in=pks).update(create_date=create_date)
+
+                items = [
+                    InvoiceItem(invoice_id=invoice.pk, item=name, quantity=quantity, rate=rate)
+                    for invoice in invoices
+                    for name, quantity, rate in self.random_items()
+                ]
+                InvoiceItem.objects.bulk_create(items, update_totals=False)
+            invoice_count += size
+            item_count += len(items)
+            if progress is not None:
+                progress(invoice_count)
+        return invoice_count, item_count
@@ -0,0 +1,93 @@
+import csv
+import json
+from collections import defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import InvoiceItem
+
+
+# Same columns the importer reads, so an export can be imported again
+EXPORT_FIELDS = [
+    'invoice_ref', 'title', 'create_date', 'invoice_total', 'currency',
+    'client_id', 'client_email', 'client_name', 'client_company',
+    'item', 'quantity', 'rate', 'tax',
+]
+ITEM_FIELDS = ['item', 'quantity', 'rate', 'tax']
+NO_ITEMS = dict.fromkeys(ITEM_FIELDS)
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def iter_invoice_rows(queryset, batch_size=1000):
+    """
+    Yield one flat dict per line item of the invoices in ``queryset``, in
+    invoice id order. Invoices without items get a single row.
+
+    Invoices are read in keyset batches of ``batch_size`` with their client,
+    and the items of each batch are fetched with one query, so only one batch
+    is held in memory and nothing is read ahead of what has been yielded.
+    """
+    invoices = queryset.order_by('pk').values(
+        'pk', 'title', 'create_date', 'invoice_total', 'currency', 'client_id',
+        'client__email', 'client__first_name', 'client__last_name', 'client__company',
+    )
+    last_pk = None
+    while True:
+        batch = invoices if last_pk is None else invoices.filter(pk__gt=last_pk)
+        batch = list(batch[:batch_size])
+        if not batch:
+            return
+        last_pk = batch[-1]['pk']
+
+        items = defaultdict(list)
+        item_rows = InvoiceItem.objects.filter(
+            invoice_id__in=[invoice['pk'] for invoice in batch]
+        ).order_by('invoice_id', 'pk').values('invoice_id', *ITEM_FIELDS)
+        for item in item_rows:
+            items[item.pop('invoice_id')].append(item)
+
+        for invoice in batch:
+            row = {
+                'invoice_ref': invoice['pk'],
+                'title': invoice['title'],
+                'create_date': invoice['create_date'],
+                'invoice_total': invoice['invoice_total'],
+                'currency': invoice['currency'],
+                'client_id': invoice['client_id'],
+                'client_email': invoice['client__email'],
+                'client_name': f"{invoice['client__first_name']} {invoice['client__last_name']}",
+                'client_company': invoice['client__company'],
+            }
+            for item in items.pop(invoice['pk'], None) or [NO_ITEMS]:
+                yield {**row, **item}
+
+
+class _LineBuffer:
+    # csv.writer target that hands each formatted line back instead of storing it
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.DictWriter(_LineBuffer(), fieldnames=EXPORT_FIELDS)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+def stream_invoice_export(queryset, export_format='csv', batch_size=1000):
+    """Lines of a CSV or JSONL export of the invoices, see iter_invoice_rows"""
+    rows = iter_invoice_rows(queryset, batch_size=batch_size)
+    if export_format == 'jsonl':
+        return stream_jsonl(rows)
+    return stream_csv(rows)
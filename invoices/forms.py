@@ -1,20 +1,170 @@
+from django import forms
+from django.core.exceptions import ValidationError
 from django.forms import ModelForm
-from .models import Invoice, InvoiceItem, Client
+from django.urls import reverse_lazy
+from .models import Invoice, InvoiceItem, Client, RecurringInvoice
 
 
 class InvoiceItemsForm(ModelForm):
+    tax = forms.DecimalField(max_digits=6, decimal_places=2, required=False, initial=0, label='Tax (%)')
+
     class Meta:
         model = InvoiceItem
         fields = '__all__'
 
+    def clean_tax(self):
+        return self.cleaned_data['tax'] or 0
+
+
+class ClientAutocompleteSelect(forms.Select):
+    """
+    Select that renders only the chosen client. The other options are
+    fetched from the client-autocomplete endpoint as the user types, see
+    static/js/client-autocomplete.js, so the form costs the same to render
+    however many clients there are.
+    """
+    def __init__(self, attrs=None):
+        attrs = {'data-autocomplete-url': reverse_lazy('client-autocomplete'), **(attrs or {})}
+        super().__init__(attrs)
+
+    def optgroups(self, name, value, attrs=None):
+        iterator = self.choices
+        field = iterator.field
+        selected = [choice for choice in value if choice]
+        choices = [] if field.empty_label is None else [('', field.empty_label)]
+        if selected:
+            try:
+                clients = list(iterator.queryset.filter(pk__in=selected))
+            except (ValueError, ValidationError):
+                clients = []
+            choices += [(client.pk, field.label_from_instance(client)) for client in clients]
+        self.choices = choices
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = iterator
+
 
 class InvoiceCreateForm(ModelForm):
     class Meta:
         model = Invoice
         fields = ['title', 'client']
+        widgets = {'client': ClientAutocompleteSelect}
 
     def __init__(self, *args, **kwargs):
         user = kwargs.pop('user')
         super(InvoiceCreateForm, self).__init__(*args, **kwargs)
         self.fields['client'].queryset = Client.objects.filter(created_by=user)
 
+
+
+class RecurringInvoiceForm(ModelForm):
+    start_date = forms.DateField(required=False, help_text='Defaults to one interval after the invoice')
+
+    class Meta:
+        model = RecurringInvoice
+        fields = ['interval_months', 'start_date', 'end_date']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date, end_date = cleaned_data.get('start_date'), cleaned_data.get('end_date')
+        if start_date and end_date and end_date < start_date:
+            raise ValidationError('The end date is before the start date')
+        return cleaned_data
+
+
+class StatementForm(forms.Form):
+    start_date = forms.DateField(required=False)
+    end_date = forms.DateField(required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date, end_date = cleaned_data.get('start_date'), cleaned_data.get('end_date')
+        if start_date and end_date and end_date < start_date:
+            raise ValidationError('The end date is before the start date')
+        return cleaned_data
+
+
+class InvoiceExportForm(forms.Form):
+    client = forms.ModelChoiceField(queryset=Client.objects.none(), required=False)
+    start_date = forms.DateField(required=False)
+    end_date = forms.DateField(required=False)
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user')
+        super(InvoiceExportForm, self).__init__(*args, **kwargs)
+        # user is None for admin exports (e.g. the management command)
+        if user is None:
+            self.fields['client'].queryset = Client.objects.all()
+        else:
+            self.fields['client'].queryset = Client.objects.filter(created_by=user)
+
+
+class InvoiceDataExportForm(InvoiceExportForm):
+    format = forms.ChoiceField(choices=[('csv', 'CSV'), ('jsonl', 'JSON Lines')], required=False)
+
+    def clean_format(self):
+        return self.cleaned_data['format'] or 'csv'
+
+
+class InvoiceImportRowForm(forms.Form):
+    # One line item of an imported invoice, see invoices.importer. A row
+    # without item, quantity and rate is an invoice without items.
+    invoice_ref = forms.CharField(max_length=100)
+    title = forms.CharField(max_length=200)
+    client_id = forms.IntegerField(required=False)
+    client_email = forms.EmailField(required=False)
+    create_date = forms.DateField(required=False)
+    item = forms.CharField(max_length=200, required=False)
+    quantity = forms.IntegerField(required=False)
+    rate = forms.DecimalField(max_digits=6, decimal_places=2, required=False)
+    tax = forms.DecimalField(max_digits=6, decimal_places=2, required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('client_id') and not cleaned_data.get('client_email'):
+            raise forms.ValidationError('Either client_id or client_email is required')
+        item_fields = ['item', 'quantity', 'rate']
+        if any(cleaned_data.get(name) not in (None, '') for name in item_fields):
+            for name in item_fields:
+                if cleaned_data.get(name) in (None, '') and name not in self.errors:
+                    self.add_error(name, forms.Field.default_error_messages['required'])
+        return cleaned_data
+
+
+class InvoiceImportForm(forms.Form):
+    file = forms.FileField(help_text='CSV with a header row, or JSONL (.jsonl)')
+    batch_size = forms.IntegerField(required=False, min_value=1, max_value=10000)
+
+
+class InvoiceApiForm(forms.Form):
+    # One invoice of a bulk API request, see invoices.api
+    id = forms.IntegerField(required=False, help_text='Update this invoice instead of creating one')
+    title = forms.CharField(max_length=200)
+    client_id = forms.IntegerField(required=False)
+    client_email = forms.EmailField(required=False)
+    create_date = forms.DateField(required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('client_id') and not cleaned_data.get('client_email'):
+            raise forms.ValidationError('Either client_id or client_email is required')
+        return cleaned_data
+
+
+class InvoiceItemApiForm(ModelForm):
+    tax = forms.DecimalField(max_digits=6, decimal_places=2, required=False)
+
+    class Meta:
+        model = InvoiceItem
+        fields = ['item', 'quantity', 'rate', 'tax']
+
+
+class RevenueReportForm(forms.Form):
+    start_date = forms.DateField(required=False)
+    end_date = forms.DateField(required=False)
+    period = forms.ChoiceField(choices=[('month', 'Month'), ('quarter', 'Quarter')], required=False)
+    by_client = forms.BooleanField(required=False)
+
+    def clean_period(self):
+        return self.cleaned_data['period'] or 'month'
@@ -0,0 +1,78 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+
+def get_fragment_cache():
+    return caches[getattr(settings, 'FRAGMENT_CACHE_ALIAS', 'default')]
+
+
+def _namespace_key(user_id):
+    return f'invoices:fragments:{user_id}:namespace'
+
+
+def get_fragment_namespace(user_id):
+    """
+    Current cache namespace of a user's fragments.
+
+    Invalidating replaces the namespace rather than deleting keys, which
+    works on every cache backend; the orphaned fragments simply expire.
+    """
+    cache = get_fragment_cache()
+    key = _namespace_key(user_id)
+    namespace = cache.get(key)
+    if namespace is None:
+        # add() so that concurrent requests settle on the same namespace
+        cache.add(key, uuid.uuid4().hex, None)
+        namespace = cache.get(key)
+    return namespace
+
+
+def invalidate_user_fragments(*user_ids):
+    """Drop every cached fragment of these users"""
+    get_fragment_cache().set_many(
+        {_namespace_key(user_id): uuid.uuid4().hex for user_id in user_ids}, None
+    )
+
+
+def fragment_key(user_id, name, params=''):
+    params_digest = hashlib.md5(params.encode()).hexdigest()
+    return f'invoices:fragments:{user_id}:{get_fragment_namespace(user_id)}:{name}:{params_digest}'
+
+
+class FragmentCacheMixin:
+    """
+    ListView mixin that caches the rendered object table per user and page.
+
+    The table is rendered from ``fragment_template_name`` with the usual
+    ListView context and handed to the page template as ``fragment``. On a
+    cache hit neither the queryset nor the table template are evaluated.
+    Fragments are invalidated by the signal handlers in invoices.signals,
+    by the bulk operations of InvoiceItemQuerySet, which send no signals,
+    and by InvoiceQuerySet.recalculate_totals().
+    """
+    fragment_template_name = None
+
+    def get_fragment_key(self):
+        params = '&'.join(sorted(self.request.GET.urlencode().split('&')))
+        return fragment_key(self.request.user.pk, self.fragment_template_name, params)
+
+    def render_fragment(self):
+        self.object_list = self.get_queryset()
+        context = self.get_context_data()
+        return render_to_string(self.fragment_template_name, context, request=self.request)
+
+    def get(self, request, *args, **kwargs):
+        cache = get_fragment_cache()
+        key = self.get_fragment_key()
+        fragment = cache.get(key)
+        # Only the fragment template sees the objects
+        self.object_list = []
+        if fragment is None:
+            fragment = self.render_fragment()
+            cache.set(key, fragment, getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 300))
+        return self.render_to_response({'view': self, 'fragment': mark_safe(fragment)})
@@ -0,0 +1,154 @@
+import csv
+import io
+import json
+from collections import defaultdict, namedtuple
+from itertools import islice
+
+from django.db import transaction
+
+from .forms import InvoiceImportRowForm
+from .models import Client, Invoice, InvoiceItem
+
+
+# kind is 'error' (line, message), 'progress' or 'done' (counts)
+ImportEvent = namedtuple('ImportEvent', ['kind', 'line', 'message', 'rows', 'invoices', 'items', 'errors'])
+
+
+def read_csv_rows(fileobj):
+    """Yield (line number, row dict) from a CSV file with a header row"""
+    reader = csv.DictReader(fileobj)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_jsonl_rows(fileobj):
+    """Yield (line number, row dict) from a file with one JSON object per line"""
+    for line_number, line in enumerate(fileobj, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            row = e
+        yield line_number, row
+
+
+def open_rows(fileobj, filename):
+    """Pick the row reader from the file extension, reading the file as UTF-8 text"""
+    if not isinstance(fileobj, io.TextIOBase):
+        fileobj = io.TextIOWrapper(fileobj, encoding='utf-8', newline='')
+    if filename.endswith('.jsonl') or filename.endswith('.ndjson'):
+        return read_jsonl_rows(fileobj)
+    return read_csv_rows(fileobj)
+
+
+class InvoiceImporter:
+    """
+    Import invoices and their items for one user from a stream of rows.
+
+    Each row is one line item; rows sharing an ``invoice_ref`` belong to the
+    same invoice, and a row without an item stands for an invoice that has
+    none, as exported by invoices.exporter. Rows are validated and written a
+    batch at a time, each batch in its own transaction together with the
+    totals of the invoices it touched, so an import that stops early leaves
+    consistent invoices behind. Only the batch, the client lookup and a map
+    of invoice refs to ids are held in memory.
+    """
+
+    def __init__(self, user, batch_size=1000):
+        self.user = user
+        self.batch_size = batch_size
+        self.clients_by_email = {}
+        self.client_ids = set()
+        for pk, email in Client.objects.filter(created_by=user).order_by('-pk').values_list('pk', 'email'):
+            self.clients_by_email[email.lower()] = pk
+            self.client_ids.add(pk)
+        self.invoice_ids = {}
+        self.rows = self.invoices = self.items = self.errors = 0
+
+    def event(self, kind, line=None, message=''):
+        return ImportEvent(kind, line, message, self.rows, self.invoices, self.items, self.errors)
+
+    def error(self, line, message):
+        self.errors += 1
+        return self.event('error', line, message)
+
+    def resolve_client(self, data):
+        if data.get('client_id'):
+            return data['client_id'] if data['client_id'] in self.client_ids else None
+        if data.get('client_email'):
+            return self.clients_by_email.get(data['client_email'].lower())
+        return None
+
+    def run(self, rows):
+        """Import the (line number, row) pairs, yielding ImportEvents as it goes"""
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            yield from self.import_batch(batch)
+            yield self.event('progress')
+        yield self.event('done')
+
+    def import_batch(self, batch):
+        valid = []
+        for line, row in batch:
+            self.rows += 1
+            if not isinstance(row, dict):
+                yield self.error(line, f'Invalid row: {row}')
+                continue
+            form = InvoiceImportRowForm(row)
+            if not form.is_valid():
+                yield self.error(line, form.errors.as_text().replace('\n', ' '))
+                continue
+            data = form.cleaned_data
+            client_id = self.resolve_client(data)
+            if client_id is None:
+                yield self.error(line, 'Unknown client')
+                continue
+            valid.append((data, client_id))
+
+        with transaction.atomic():
+            new_invoices = {}
+            for data, client_id in valid:
+                ref = data['invoice_ref']
+                if ref not in self.invoice_ids and ref not in new_invoices:
+                    new_invoices[ref] = (Invoice(
+                        title=data['title'], user=self.user, client_id=client_id,
+                    ), data['create_date'])
+            self.create_invoices(new_invoices)
+
+            items = [
+                InvoiceItem(
+                    invoice_id=self.invoice_ids[data['invoice_ref']],
+                    item=data['item'],
+                    quantity=data['quantity'],
+                    rate=data['rate'],
+                    tax=data['tax'] or 0,
+                )
+                for data, client_id in valid
+                if data['item']
+            ]
+            InvoiceItem.objects.bulk_create(items, update_totals=False)
+            self.items += len(items)
+
+            # Invoices continued from an earlier batch are recalculated again
+            invoice_ids = {self.invoice_ids[data['invoice_ref']] for data, client_id in valid}
+            if invoice_ids:
+                Invoice.objects.filter(pk__in=invoice_ids).recalculate_totals()
+
+    def create_invoices(self, new_invoices):
+        # Added to the billing aggregates by recalculate_totals() in import_batch()
+        invoices = Invoice.objects.bulk_insert(invoice for invoice, create_date in new_invoices.values())
+
+        # create_date is auto_now_add, so imported dates are set afterwards
+        by_date = defaultdict(list)
+        for ref, (invoice, create_date) in new_invoices.items():
+            self.invoice_ids[ref] = invoice.pk
+            if create_date is not None:
+                by_date[create_date].append(invoice.pk)
+        for create_date, pks in by_date.items():
+            Invoice.objects.filter(pk__in=pks).update(create_date=create_date)
+        self.invoices += len(invoices)
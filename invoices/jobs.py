@@ -0,0 +1,161 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.db import connections
+from django.utils import timezone
+
+from .models import PdfJob
+from .pdf import ExportResult, init_render_worker, invoice_pdf_filename, render_invoice_job
+
+
+# How often a polling worker looks for finished jobs to expire, in seconds
+EXPIRE_INTERVAL = 300
+
+
+def enqueue_pdf_job(invoice, user):
+    """Queue a render of the invoice, reusing a job that is still queued or running"""
+    job = PdfJob.objects.filter(
+        invoice=invoice, user=user, status__in=[PdfJob.PENDING, PdfJob.RUNNING],
+    ).first()
+    if job is None:
+        job = PdfJob.objects.create(invoice=invoice, user=user)
+    return job
+
+
+def claim_next_job():
+    """
+    Mark the oldest pending job as running and return it.
+
+    The conditional UPDATE makes the claim atomic, so several workers can
+    poll the same queue without a broker or row locks.
+    """
+    while True:
+        job = PdfJob.objects.filter(status=PdfJob.PENDING).order_by('created_at', 'id').first()
+        if job is None:
+            return None
+        started_at = timezone.now()
+        claimed = PdfJob.objects.filter(pk=job.pk, status=PdfJob.PENDING).update(
+            status=PdfJob.RUNNING, started_at=started_at,
+        )
+        if claimed:
+            job.status = PdfJob.RUNNING
+            job.started_at = started_at
+            return job
+
+
+def complete_job(job, result):
+    """Store the outcome of a render (an ExportResult) on its job"""
+    if result.error:
+        job.status = PdfJob.FAILED
+        job.error = result.error
+    else:
+        job.pdf.save(result.filename, ContentFile(result.pdf), save=False)
+        job.status = PdfJob.DONE
+    job.finished_at = timezone.now()
+    job.save()
+
+
+def requeue_stale_jobs(stale_after):
+    """Put back jobs left running by a worker that died mid-render"""
+    return PdfJob.objects.filter(
+        status=PdfJob.RUNNING, started_at__lt=timezone.now() - timedelta(seconds=stale_after),
+    ).update(status=PdfJob.PENDING, started_at=None)
+
+
+def expire_finished_jobs(max_age):
+    """
+    Delete jobs that finished more than ``max_age`` seconds ago, and with
+    them their PDFs (see invoices.signals). Returns how many were deleted.
+    """
+    expired = PdfJob.objects.filter(
+        status__in=[PdfJob.DONE, PdfJob.FAILED],
+        finished_at__lt=timezone.now() - timedelta(seconds=max_age),
+    )
+    deleted, _ = expired.delete()
+    return deleted
+
+
+def broken_pool_result(job):
+    return ExportResult(job.invoice_id, invoice_pdf_filename(job.invoice_id), None, 0,
+                        'The render process exited unexpectedly')
+
+
+def run_pdf_worker(concurrency=1, once=False, poll_interval=1.0, stale_after=600,
+                   max_age=None, on_complete=None):
+    """
+    Process queued PDF jobs with at most ``concurrency`` renders in flight.
+
+    Renders run in a process pool when concurrency is above one. When a
+    render process dies the jobs it had in flight fail and the pool is
+    started again. With ``max_age`` (seconds), finished jobs older than
+    that are deleted whenever the queue is empty. With ``once`` the worker
+    returns as soon as the queue is empty.
+    """
+    requeue_stale_jobs(stale_after)
+    next_expiry = 0
+
+    def finish(job, result):
+        complete_job(job, result)
+        if on_complete is not None:
+            on_complete(job, result)
+
+    def idle():
+        # Returns whether to stop, waits for new jobs otherwise
+        nonlocal next_expiry
+        if max_age is not None and time.monotonic() >= next_expiry:
+            expire_finished_jobs(max_age)
+            next_expiry = time.monotonic() + EXPIRE_INTERVAL
+        if once:
+            return True
+        time.sleep(poll_interval)
+        return False
+
+    if concurrency <= 1:
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if idle():
+                    return
+                continue
+            finish(job, render_invoice_job(job.invoice_id))
+
+    connections.close_all()
+    while True:
+        with ProcessPoolExecutor(max_workers=concurrency,
+                                 initializer=init_render_worker) as executor:
+            running, broken = {}, False
+            while not broken:
+                while len(running) < concurrency:
+                    job = claim_next_job()
+                    if job is None:
+                        break
+                    try:
+                        running[executor.submit(render_invoice_job, job.invoice_id)] = job
+                    except BrokenProcessPool:
+                        # Back in the queue for the next pool
+                        PdfJob.objects.filter(pk=job.pk).update(status=PdfJob.PENDING, started_at=None)
+                        broken = True
+                        break
+                if not running and not broken:
+                    if idle():
+                        return
+                    continue
+                done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        result = broken_pool_result(job)
+                        broken = True
+                    finish(job, result)
+            # A broken pool fails every render still in flight
+            for future, job in running.items():
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    result = broken_pool_result(job)
+                finish(job, result)
@@ -0,0 +1,186 @@
+"""
+In-process load test of the WSGI and ASGI entry points.
+
+Both interfaces get the same mixed workload of page views and invoice PDFs
+from ``concurrency`` simultaneous clients: WSGI as threads calling the WSGI
+handler the way a threaded server does, ASGI as coroutines on one event loop
+calling invoicebuilder.handlers.ThreadedASGIHandler. No sockets are involved,
+so the numbers compare the request handling, not the servers in front of it.
+"""
+import asyncio
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import Client as TestClient, RequestFactory
+from django.urls import reverse
+
+from invoicebuilder.handlers import ThreadedASGIHandler
+
+from .benchmarks import percentile
+from .models import Invoice
+
+LoadRequest = namedtuple('LoadRequest', ['kind', 'path'])
+Sample = namedtuple('Sample', ['kind', 'status', 'seconds'])
+
+SERVER_NAME = 'testserver'
+
+
+class Workload:
+    """
+    Page views of the user's lists and invoices, with ``pdf_ratio`` of the
+    requests asking for an invoice PDF. PDFs cycle through the user's
+    invoices so most renders miss the PDF cache.
+    """
+
+    def __init__(self, user, pdf_ratio=0.2, seed=0):
+        client = TestClient()
+        client.force_login(user)
+        self.cookie = f"sessionid={client.cookies['sessionid'].value}"
+        self.pdf_ratio = pdf_ratio
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+        invoice_ids = list(Invoice.objects.filter(user=user).order_by('-pk').values_list('pk', flat=True))
+        if not invoice_ids:
+            raise ValueError(f'{user} has no invoices to load test with')
+        self.pages = [reverse('home'), reverse('invoice-list'), reverse('client-list')] + [
+            reverse('invoice-detail', args=[pk]) for pk in invoice_ids[:20]
+        ]
+        self.pdfs = [reverse('generate_pdf', args=[pk]) for pk in invoice_ids]
+        self.next_pdf = 0
+
+    def next_request(self):
+        with self.lock:
+            if self.rng.random() < self.pdf_ratio:
+                path = self.pdfs[self.next_pdf % len(self.pdfs)]
+                self.next_pdf += 1
+                return LoadRequest('pdf', path)
+            return LoadRequest('page', self.rng.choice(self.pages))
+
+
+def run_wsgi(workload, concurrency, seconds):
+    handler = WSGIHandler()
+    factory = RequestFactory()
+    samples = []
+
+    def call(path):
+        environ = factory.get(path, HTTP_COOKIE=workload.cookie).environ
+        statuses = []
+        body = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            for _ in body:
+                pass
+        finally:
+            body.close()
+        return int(statuses[0].split()[0])
+
+    def client(deadline):
+        while time.monotonic() < deadline:
+            request = workload.next_request()
+            started = time.perf_counter()
+            status = call(request.path)
+            samples.append(Sample(request.kind, status, time.perf_counter() - started))
+
+    deadline = time.monotonic() + seconds
+    threads = [threading.Thread(target=client, args=(deadline,)) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, None
+
+
+async def _run_asgi(workload, concurrency, seconds):
+    app = ThreadedASGIHandler()
+    samples = []
+
+    async def call(path):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': path, 'root_path': '', 'query_string': b'',
+            'headers': [(b'host', SERVER_NAME.encode()), (b'cookie', workload.cookie.encode())],
+            'server': (SERVER_NAME, 80), 'client': ('127.0.0.1', 0),
+        }
+        status = None
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # Like a server, nothing more until the client disconnects
+            await asyncio.Event().wait()
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        await app(scope, receive, send)
+        return status
+
+    async def client(deadline):
+        while time.monotonic() < deadline:
+            request = workload.next_request()
+            started = time.perf_counter()
+            status = await call(request.path)
+            samples.append(Sample(request.kind, status, time.perf_counter() - started))
+
+    lags = []
+
+    async def watch_loop(deadline, interval=0.01):
+        # How late the loop wakes us up, i.e. how long something blocked it
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - started - interval)
+
+    deadline = time.monotonic() + seconds
+    await asyncio.gather(watch_loop(deadline), *(client(deadline) for _ in range(concurrency)))
+    app.executor.shutdown()
+    return samples, max(lags, default=0)
+
+
+def run_asgi(workload, concurrency, seconds):
+    return asyncio.run(_run_asgi(workload, concurrency, seconds))
+
+
+INTERFACES = {'wsgi': run_wsgi, 'asgi': run_asgi}
+
+
+def summarize(samples, seconds):
+    by_kind = defaultdict(list)
+    for sample in samples:
+        by_kind[sample.kind].append(sample)
+    summary = {
+        'requests': len(samples),
+        'requests_per_second': round(len(samples) / seconds, 1),
+    }
+    for kind, kind_samples in sorted(by_kind.items()):
+        timings = sorted(sample.seconds * 1000 for sample in kind_samples)
+        summary[kind] = {
+            'requests': len(kind_samples),
+            'errors': sum(1 for sample in kind_samples if sample.status != 200),
+            'p50_ms': round(percentile(timings, 50), 1),
+            'p95_ms': round(percentile(timings, 95), 1),
+            'mean_ms': round(statistics.mean(timings), 1),
+        }
+    return summary
+
+
+def run_load_test(user, interfaces=('wsgi', 'asgi'), concurrency=16, seconds=10, pdf_ratio=0.2):
+    """Drive each interface with the same workload and return a summary per interface"""
+    # Shared, so each interface renders invoices the other has not cached
+    workload = Workload(user, pdf_ratio)
+    results = {}
+    for interface in interfaces:
+        samples, loop_lag = INTERFACES[interface](workload, concurrency, seconds)
+        results[interface] = summarize(samples, seconds)
+        if loop_lag is not None:
+            results[interface]['max_loop_lag_ms'] = round(loop_lag * 1000, 1)
+    return results
@@ -0,0 +1,52 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.models import Invoice
+from invoices.pdf import REPORTLAB, WEASYPRINT, get_render_resources, load_render_resources, render_invoice_pdf
+
+
+class Command(BaseCommand):
+    help = 'Compare cold and warm invoice PDF render latency, and the two PDF engines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('invoice_id', type=int, help='Invoice to render')
+        parser.add_argument('--iterations', type=int, default=10)
+
+    def handle(self, *args, **options):
+        try:
+            invoice = Invoice.objects.select_related('client', 'user').get(pk=options['invoice_id'])
+        except Invoice.DoesNotExist:
+            raise CommandError(f"Invoice {options['invoice_id']} does not exist")
+        invoice_items = list(invoice.items.order_by('id'))
+
+        def cold():
+            # What every render used to pay: stylesheet parse and font setup
+            render_invoice_pdf(invoice, invoice_items=invoice_items,
+                               resources=load_render_resources(), engine=WEASYPRINT)
+
+        def warm():
+            render_invoice_pdf(invoice, invoice_items=invoice_items,
+                               resources=get_render_resources(), engine=WEASYPRINT)
+
+        def reportlab():
+            render_invoice_pdf(invoice, invoice_items=invoice_items, engine=REPORTLAB)
+
+        get_render_resources()
+        medians = {}
+        for name, render in (('cold', cold), ('warm', warm), ('reportlab', reportlab)):
+            timings = []
+            for _ in range(options['iterations']):
+                started = time.perf_counter()
+                render()
+                timings.append((time.perf_counter() - started) * 1000)
+            medians[name] = statistics.median(timings)
+            self.stdout.write(
+                f'{name}: median {medians[name]:.1f}ms '
+                f'min {min(timings):.1f}ms max {max(timings):.1f}ms '
+                f'over {len(timings)} renders'
+            )
+        self.stdout.write(
+            f'reportlab renders {medians["warm"] / medians["reportlab"]:.1f}x as fast as warm weasyprint'
+        )
@@ -0,0 +1,115 @@
+import datetime
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+from invoices.models import ITEM_TOTAL, Client, Invoice, InvoiceItem
+from invoices.reports import revenue_report
+
+
+BENCHMARK_USERNAME = 'revenue-benchmark'
+
+
+class Command(BaseCommand):
+    help = 'Compare revenue report latency from the rollups against aggregating the line items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=1000000,
+                            help='Line items to generate (default 1,000,000)')
+        parser.add_argument('--items-per-invoice', type=int, default=10)
+        parser.add_argument('--clients', type=int, default=50)
+        parser.add_argument('--months', type=int, default=24)
+        parser.add_argument('--iterations', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--cleanup', action='store_true',
+                            help='Delete the benchmark data afterwards')
+
+    def handle(self, *args, **options):
+        user, created = get_user_model().objects.get_or_create(username=BENCHMARK_USERNAME)
+        if not created and Invoice.objects.filter(user=user).exists():
+            self.stdout.write('Reusing the existing benchmark dataset')
+        else:
+            self.generate(user, options)
+
+        item_count = InvoiceItem.objects.filter(invoice__user=user).count()
+        self.stdout.write(f'{item_count} line items')
+
+        def raw():
+            return list(
+                InvoiceItem.objects.filter(invoice__user=user).order_by()
+                .annotate(period=TruncMonth('invoice__create_date'))
+                .values('period', 'invoice__client_id')
+                .annotate(revenue=Sum(ITEM_TOTAL))
+            )
+
+        def rollups():
+            return revenue_report(user, by_client=True)
+
+        for name, report in (('line items', raw), ('rollups', rollups)):
+            timings = []
+            for _ in range(options['iterations']):
+                started = time.perf_counter()
+                report()
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f'{name}: median {statistics.median(timings):.1f}ms '
+                f'min {min(timings):.1f}ms max {max(timings):.1f}ms '
+                f'over {len(timings)} reports'
+            )
+
+        if options['cleanup']:
+            self.cleanup(user, options['batch_size'])
+
+    def generate(self, user, options):
+        clients = Client.objects.bulk_create([
+            Client(
+                first_name='Benchmark', last_name=f'Client {i}', email=f'client{i}@example.com',
+                company=f'Benchmark {i}', address1='1 Benchmark Road', country='Zimbabwe',
+                phone_number='+263771811111', created_by=user,
+            )
+            for i in range(options['clients'])
+        ])
+        client_ids = list(Client.objects.filter(created_by=user).values_list('pk', flat=True))
+        months = [datetime.date.today().replace(day=1)]
+        while len(months) < options['months']:
+            months.append((months[-1] - datetime.timedelta(days=1)).replace(day=1))
+
+        per_invoice = options['items_per_invoice']
+        invoice_count = -(-options['items'] // per_invoice)
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+        for start in range(0, invoice_count, batch_size):
+            with transaction.atomic():
+                size = min(batch_size, invoice_count - start)
+                last_pk = Invoice.objects.filter(user=user).order_by('-pk').values_list('pk', flat=True).first() or 0
+                Invoice.objects.bulk_create([
+                    Invoice(title=f'Benchmark {start + i}', user=user,
+                            client_id=client_ids[(start + i) % len(client_ids)])
+                    for i in range(size)
+                ])
+                # Not every backend returns bulk inserted ids, read them back
+                pks = list(Invoice.objects.filter(user=user, pk__gt=last_pk).order_by('pk').values_list('pk', flat=True))
+                for i, month in enumerate(months):
+                    Invoice.objects.filter(pk__in=pks[i::len(months)]).update(create_date=month)
+                InvoiceItem.objects.bulk_create([
+                    InvoiceItem(invoice_id=pk, item=f'Item {n}', quantity=n + 1, rate=10)
+                    for pk in pks
+                    for n in range(per_invoice)
+                ], update_totals=False)
+            self.stdout.write(f'{start + size}/{invoice_count} invoices', ending='\r')
+
+        Invoice.objects.filter(user=user).recalculate_totals()
+        self.stdout.write(f'\nGenerated {len(clients)} clients and {invoice_count} invoices '
+                          f'in {time.perf_counter() - started:.1f}s')
+
+    def cleanup(self, user, batch_size):
+        pks = list(Invoice.objects.filter(user=user).values_list('pk', flat=True))
+        for start in range(0, len(pks), batch_size):
+            Invoice.objects.filter(pk__in=pks[start:start + batch_size]).delete()
+        user.delete()
+        self.stdout.write('Deleted the benchmark data')
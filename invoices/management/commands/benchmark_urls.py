@@ -0,0 +1,58 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.benchmarks import compare_reports, run_benchmarks, url_names
+
+
+class Command(BaseCommand):
+    help = ('Benchmark every invoices route through the test client and write latency '
+            'percentiles, query counts and peak memory to a JSON report')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default='bench-user-0',
+                            help='User to benchmark as, see generate_invoice_data')
+        parser.add_argument('--output', default='benchmark.json', help='JSON report to write')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=1)
+        parser.add_argument('--only', nargs='*', choices=url_names(), help='Only these routes')
+        parser.add_argument('--cold', action='store_true',
+                            help='Reset the fragment cache before each request and disable the PDF cache')
+        parser.add_argument('--compare', help='Earlier JSON report to compare the p50 latencies with')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist")
+
+        def report(name, result):
+            latency = result['latency_ms']
+            self.stdout.write(
+                f"{name:<22} {result['method']:<4} status {','.join(map(str, result['status']))}  "
+                f"p50 {latency['p50']:>9.1f}ms  p95 {latency['p95']:>9.1f}ms  "
+                f"queries {result['queries']['median']:>5}  peak {result['peak_memory_kb']:>9.1f}KB"
+            )
+
+        try:
+            results = run_benchmarks(
+                user, iterations=options['iterations'], warmup=options['warmup'],
+                names=options['only'], cold=options['cold'], on_result=report,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        with open(options['output'], 'w') as f:
+            json.dump(results, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            for name, before, after, queries_before, queries_after in compare_reports(baseline, results):
+                change = (after - before) / before * 100 if before else 0
+                self.stdout.write(
+                    f'{name:<22} p50 {before:>9.1f}ms -> {after:>9.1f}ms ({change:+.0f}%)  '
+                    f'queries {queries_before} -> {queries_after}'
+                )
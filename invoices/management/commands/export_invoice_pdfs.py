@@ -0,0 +1,64 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.forms import InvoiceExportForm
+from invoices.models import Invoice
+from invoices.pdf import filter_invoices, get_export_workers, stream_invoices_zip
+
+
+class Command(BaseCommand):
+    help = 'Render matching invoices to PDF in parallel and write them to a ZIP archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Path of the ZIP archive to write')
+        parser.add_argument('--user', help='Only export invoices issued by this username')
+        parser.add_argument('--client', type=int, help='Only export invoices billed to this client id')
+        parser.add_argument('--start-date', help='Only export invoices created on or after YYYY-MM-DD')
+        parser.add_argument('--end-date', help='Only export invoices created on or before YYYY-MM-DD')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Size of the render process pool (default: PDF_EXPORT_WORKERS or CPU count)')
+        parser.add_argument('--base-url', default=None,
+                            help='Base URL used to resolve static assets in the template')
+
+    def handle(self, *args, **options):
+        queryset = Invoice.objects.all()
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist")
+            queryset = queryset.filter(user=user)
+
+        form = InvoiceExportForm({
+            'client': options['client'],
+            'start_date': options['start_date'],
+            'end_date': options['end_date'],
+        }, user=user)
+        if not form.is_valid():
+            raise CommandError(form.errors.as_text())
+
+        invoice_ids = list(
+            filter_invoices(queryset, **form.cleaned_data).order_by('id').values_list('id', flat=True)
+        )
+        workers = options['workers'] if options['workers'] is not None else get_export_workers()
+        self.stdout.write(f'Rendering {len(invoice_ids)} invoices with {workers} workers')
+
+        failures = []
+
+        def report(result):
+            if result.error:
+                failures.append(result)
+                self.stderr.write(f'invoice {result.invoice_id}: FAILED after {result.seconds:.3f}s: {result.error}')
+            elif options['verbosity'] > 1:
+                self.stdout.write(f'invoice {result.invoice_id}: {result.seconds:.3f}s')
+
+        with open(options['output'], 'wb') as output:
+            for chunk in stream_invoices_zip(invoice_ids, base_url=options['base_url'],
+                                             workers=workers, on_result=report):
+                output.write(chunk)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {len(invoice_ids) - len(failures)} invoices to {options['output']} "
+            f"({len(failures)} failed)"
+        ))
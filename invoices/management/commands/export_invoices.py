@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.exporter import stream_invoice_export
+from invoices.forms import InvoiceDataExportForm
+from invoices.models import Invoice
+from invoices.pdf import filter_invoices
+
+
+class Command(BaseCommand):
+    help = 'Write invoices and their line items to a CSV or JSONL file, one row per line item'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='File to write, .csv or .jsonl, or - for stdout')
+        parser.add_argument('--user', help='Only export invoices issued by this username')
+        parser.add_argument('--client', type=int, help='Only export invoices billed to this client id')
+        parser.add_argument('--start-date', help='Only export invoices created on or after YYYY-MM-DD')
+        parser.add_argument('--end-date', help='Only export invoices created on or before YYYY-MM-DD')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Output format (default: from the file extension, else csv)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        queryset = Invoice.objects.all()
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist")
+            queryset = queryset.filter(user=user)
+
+        output = options['output']
+        export_format = options['format']
+        if export_format is None:
+            export_format = 'jsonl' if output.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+        form = InvoiceDataExportForm({
+            'client': options['client'],
+            'start_date': options['start_date'],
+            'end_date': options['end_date'],
+            'format': export_format,
+        }, user=user)
+        if not form.is_valid():
+            raise CommandError(form.errors.as_text())
+        form.cleaned_data.pop('format')
+
+        lines = stream_invoice_export(
+            filter_invoices(queryset, **form.cleaned_data), export_format,
+            batch_size=options['batch_size'],
+        )
+        if output == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(output, 'w', encoding='utf-8', newline='') as f:
+            f.writelines(lines)
+        self.stdout.write(self.style.SUCCESS(f'Exported invoices to {output}'))
@@ -0,0 +1,45 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.datagen import DatasetGenerator
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic dataset of users, clients, invoices and line items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--clients', type=int, default=200, help='Clients across all users')
+        parser.add_argument('--invoices', type=int, default=10000, help='Invoices across all users')
+        parser.add_argument('--max-items', type=int, default=20, help='Most line items on one invoice')
+        parser.add_argument('--months', type=int, default=24, help='How far back invoice dates go')
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help='Zipf exponent of the user and client popularity')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='bench', help='Username prefix of the generated users')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if get_user_model().objects.filter(username__startswith=f'{prefix}-user-').exists():
+            raise CommandError(f'Users named {prefix}-user-* already exist, pick another --prefix')
+
+        generator = DatasetGenerator(
+            users=options['users'], clients=options['clients'], invoices=options['invoices'],
+            max_items=options['max_items'], months=options['months'], skew=options['skew'],
+            seed=options['seed'], prefix=prefix, batch_size=options['batch_size'],
+        )
+
+        def progress(done):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{done}/{options['invoices']} invoices")
+
+        started = time.perf_counter()
+        counts = generator.run(progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {counts['users']} users, {counts['clients']} clients, "
+            f"{counts['invoices']} invoices and {counts['items']} line items "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.currency import RateFileError, import_rates
+
+
+class Command(BaseCommand):
+    help = 'Update the exchange rates from a CSV file, removing the currencies it leaves out'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='CSV file with currency and rate columns, the rate in units of the base currency',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], encoding='utf-8', newline='') as f:
+                result = import_rates(f)
+        except (OSError, RateFileError) as e:
+            raise CommandError(e)
+        if result.kept:
+            self.stderr.write(self.style.WARNING(
+                f'Kept the rates of {", ".join(result.kept)}, which the file leaves out '
+                f'but clients or invoices still use'
+            ))
+        if result.removed:
+            self.stdout.write(f'Removed the rates of {", ".join(result.removed)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.imported} exchange rates to {settings.BASE_CURRENCY}, '
+            f'other processes use them within {settings.EXCHANGE_RATE_CACHE_TTL} seconds'
+        ))
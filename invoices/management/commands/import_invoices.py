@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.importer import InvoiceImporter, open_rows
+
+
+class Command(BaseCommand):
+    help = 'Import invoices and line items for a user from a CSV or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header row, or a .jsonl file')
+        parser.add_argument('--user', required=True, help='Username the invoices are issued by')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist")
+
+        importer = InvoiceImporter(user, batch_size=options['batch_size'])
+        with open(options['path'], encoding='utf-8', newline='') as f:
+            for event in importer.run(open_rows(f, options['path'])):
+                if event.kind == 'error':
+                    self.stderr.write(f'line {event.line}: {event.message}')
+                elif event.kind == 'progress' and options['verbosity'] > 1:
+                    self.stdout.write(f'{event.rows} rows read, {event.invoices} invoices, '
+                                      f'{event.items} items, {event.errors} errors')
+                elif event.kind == 'done':
+                    self.stdout.write(self.style.SUCCESS(
+                        f'Imported {event.invoices} invoices with {event.items} items '
+                        f'from {event.rows} rows ({event.errors} rejected)'
+                    ))
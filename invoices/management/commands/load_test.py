@@ -0,0 +1,57 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.loadtest import INTERFACES, run_load_test
+from invoices.pdf import shutdown_render_pool
+
+
+class Command(BaseCommand):
+    help = ('Compare WSGI and ASGI throughput and latency under a mixed workload of '
+            'page views and invoice PDFs')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default='bench-user-0',
+                            help='User to load test as, see generate_invoice_data')
+        parser.add_argument('--interfaces', nargs='+', choices=list(INTERFACES), default=list(INTERFACES))
+        parser.add_argument('--concurrency', type=int, default=16, help='Simultaneous clients')
+        parser.add_argument('--seconds', type=float, default=10, help='Duration per interface')
+        parser.add_argument('--pdf-ratio', type=float, default=0.2,
+                            help='Share of the requests that ask for an invoice PDF')
+        parser.add_argument('--output', help='JSON file to write the results to')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist")
+
+        self.stdout.write(
+            f"ASGI_THREADS={settings.ASGI_THREADS} PDF_RENDER_WORKERS={settings.PDF_RENDER_WORKERS}"
+        )
+        try:
+            results = run_load_test(
+                user, interfaces=options['interfaces'], concurrency=options['concurrency'],
+                seconds=options['seconds'], pdf_ratio=options['pdf_ratio'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            shutdown_render_pool()
+
+        for interface, summary in results.items():
+            line = f"{interface}  {summary['requests_per_second']:>7.1f} req/s"
+            for kind in ('page', 'pdf'):
+                if kind in summary:
+                    result = summary[kind]
+                    line += (f"  {kind} p50 {result['p50_ms']:>7.1f}ms p95 {result['p95_ms']:>7.1f}ms"
+                             f" errors {result['errors']}")
+            if 'max_loop_lag_ms' in summary:
+                line += f"  max loop lag {summary['max_loop_lag_ms']}ms"
+            self.stdout.write(line)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
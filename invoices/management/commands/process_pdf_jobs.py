@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from invoices.jobs import run_pdf_worker
+
+
+class Command(BaseCommand):
+    help = 'Render queued invoice PDF jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Maximum number of renders running at once')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when the queue is empty instead of polling for new jobs')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait between polls of an empty queue')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='Requeue jobs left running for longer than this many seconds')
+        parser.add_argument('--max-age', type=int, default=86400,
+                            help='Delete finished jobs and their PDFs after this many seconds, 0 keeps them')
+
+    def handle(self, *args, **options):
+        def report(job, result):
+            if result.error:
+                self.stderr.write(f'job {job.pk} (invoice {job.invoice_id}): FAILED: {result.error}')
+            else:
+                self.stdout.write(f'job {job.pk} (invoice {job.invoice_id}): {result.seconds:.3f}s')
+
+        run_pdf_worker(
+            concurrency=options['concurrency'],
+            once=options['once'],
+            poll_interval=options['poll_interval'],
+            stale_after=options['stale_after'],
+            max_age=options['max_age'] or None,
+            on_complete=report,
+        )
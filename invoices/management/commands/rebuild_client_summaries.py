@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from invoices.models import ClientSummary
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-client billing summaries from the invoices'
+
+    def add_arguments(self, parser):
+        parser.add_argument('client_ids', nargs='*', type=int,
+                            help='Only rebuild these clients (default: all)')
+
+    def handle(self, *args, **options):
+        rebuilt = ClientSummary.objects.rebuild(options['client_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} client summaries'))
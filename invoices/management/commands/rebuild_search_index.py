@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.search import has_search_index, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Repopulate the invoice full-text search index'
+
+    def handle(self, *args, **options):
+        if not has_search_index():
+            raise CommandError('The search index needs SQLite with FTS5')
+        indexed = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} invoices'))
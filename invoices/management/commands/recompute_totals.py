@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from invoices.models import Invoice
+
+
+class Command(BaseCommand):
+    help = 'Recompute the net, tax and gross totals of every invoice from its items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Only recompute the invoices of this user id')
+        parser.add_argument('--dry-run', action='store_true', help='Only report drifted totals')
+
+    def handle(self, *args, **options):
+        invoices = Invoice.objects.all()
+        if options['user'] is not None:
+            invoices = invoices.filter(user_id=options['user'])
+
+        with transaction.atomic():
+            drifted = invoices.drifted().count()
+            if options['dry_run']:
+                self.stdout.write(f'{drifted} invoice totals have drifted')
+                return
+            # One UPDATE for the invoices, then the client summaries and
+            # revenue rollups are rebuilt from them
+            recomputed = invoices.recalculate_totals()
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed {recomputed} invoices, {drifted} totals had drifted'
+        ))
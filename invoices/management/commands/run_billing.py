@@ -0,0 +1,28 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from invoices.billing import run_billing
+
+
+class Command(BaseCommand):
+    help = 'Create the invoices of every recurring invoice due on a date'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=datetime.date.fromisoformat,
+                            help='Bill the cycles due on or before this date, YYYY-MM-DD (default: today)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        date = options['date'] or timezone.localdate()
+
+        def progress(done):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{done} recurring invoices billed')
+
+        result = run_billing(date, batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'Billed {result.recurring} recurring invoices due by {date}: '
+            f'{result.invoices} invoices and {result.items} line items in {result.seconds:.1f}s'
+        ))
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from invoices.stress import run_profile
+
+
+class Command(BaseCommand):
+    help = ('Run parallel writer and reader processes against a scratch SQLite database '
+            'for each settings profile and report throughput and lock errors')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', choices=sorted(settings.SQLITE_PROFILES),
+                            default=sorted(settings.SQLITE_PROFILES))
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--invoices', type=int, default=500,
+                            help='Invoices to seed each scratch database with')
+
+    def handle(self, *args, **options):
+        for profile in options['profiles']:
+            summary = run_profile(
+                profile, writers=options['writers'], readers=options['readers'],
+                seconds=options['seconds'], invoices=options['invoices'],
+            )
+            for role in ('writers', 'readers'):
+                result = summary[role]
+                self.stdout.write(
+                    f"{profile:<12} {result['processes']} {role:<8} "
+                    f"{result['ops_per_second']:>8.1f} ops/s  "
+                    f"lock errors {result['lock_errors']:>5}  other errors {len(result['errors'])}"
+                )
+                for error in result['errors'][:3]:
+                    self.stdout.write(self.style.WARNING(f'  {error}'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from invoices.models import Invoice
+
+
+class Command(BaseCommand):
+    help = 'Check stored invoice totals against their items and optionally repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Rewrite drifted totals')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        # Compared in SQL, net, tax, gross and base totals alike
+        drifted = Invoice.objects.drifted().order_by('pk').values_list(
+            'pk', 'net_total', 'tax_total', 'invoice_total', 'base_total',
+            'item_net', 'item_tax', 'item_total', 'item_base',
+        )
+        drifted_ids = []
+        for pk, *totals in drifted.iterator(chunk_size=options['batch_size']):
+            drifted_ids.append(pk)
+            if options['verbosity'] > 1:
+                self.stdout.write(f'invoice {pk}: stored {totals[:4]}, items add up to {totals[4:]}')
+
+        if drifted_ids and options['fix']:
+            for start in range(0, len(drifted_ids), options['batch_size']):
+                Invoice.objects.filter(
+                    pk__in=drifted_ids[start:start + options['batch_size']]
+                ).recalculate_totals()
+            self.stdout.write(self.style.SUCCESS(f'Repaired {len(drifted_ids)} drifted invoice totals'))
+        elif drifted_ids:
+            self.stdout.write(self.style.WARNING(
+                f'{len(drifted_ids)} invoice totals have drifted, run with --fix to repair them'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('All invoice totals match their items'))
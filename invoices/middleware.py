@@ -0,0 +1,92 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+logger = logging.getLogger('invoices.queries')
+
+
+class QueryStats:
+    """
+    Database execute wrapper that counts and times the queries it sees.
+
+    Unlike connection.queries this works with DEBUG off, so it can be used
+    in production.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.count += 1
+            self.statements[(sql, repr(params))] += 1
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.statements.values())
+
+    def most_duplicated(self, n=5):
+        return [(sql, count) for (sql, _), count in self.statements.most_common(n) if count > 1]
+
+
+@contextmanager
+def capture_queries(stats=None):
+    """Record the queries run on every database connection into a QueryStats"""
+    if stats is None:
+        stats = QueryStats()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+        yield stats
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Report the query count, DB time, duplicate queries and wall time of each
+    request, labelled with the resolved URL name.
+
+    The figures are sent in the X-Query-Stats response header and logged as
+    JSON to the ``invoices.queries`` logger. Enable with
+    QUERY_INSTRUMENTATION = True. Queries run while a streaming response is
+    iterated are not included.
+    """
+
+    header = 'X-Query-Stats'
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with capture_queries() as stats:
+            response = self.get_response(request)
+        wall_time = time.perf_counter() - started
+
+        match = request.resolver_match
+        record = {
+            'view': match.url_name if match else None,
+            'method': request.method,
+            'status': response.status_code,
+            'queries': stats.count,
+            'db_ms': round(stats.db_time * 1000, 2),
+            'duplicates': stats.duplicates,
+            'wall_ms': round(wall_time * 1000, 2),
+        }
+        response[self.header] = '; '.join(f'{key}={value}' for key, value in record.items())
+        logger.info(json.dumps(record))
+        return response
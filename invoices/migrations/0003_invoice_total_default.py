@@ -0,0 +1,18 @@
+# Generated by Django 3.0.2 on 2026-10-18 18:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0002_pdfjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invoice',
+            name='invoice_total',
+            field=models.DecimalField(blank=True, decimal_places=2, default=0, editable=False, max_digits=6),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.0.2 on 2026-10-18 18:20
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+import django.db.models.deletion
+
+
+def build_client_summaries(apps, schema_editor):
+    Client = apps.get_model('invoices', 'Client')
+    ClientSummary = apps.get_model('invoices', 'ClientSummary')
+    Invoice = apps.get_model('invoices', 'Invoice')
+
+    figures = {
+        row['client']: row
+        for row in Invoice.objects.order_by().values('client').annotate(
+            invoice_count=Count('pk'), total_billed=Sum('invoice_total'),
+            last_invoice_date=Max('create_date'),
+        )
+    }
+    summaries = []
+    for client_id in Client.objects.values_list('pk', flat=True).iterator():
+        row = figures.get(client_id, {})
+        summaries.append(ClientSummary(
+            client_id=client_id,
+            invoice_count=row.get('invoice_count', 0),
+            total_billed=row.get('total_billed') or 0,
+            last_invoice_date=row.get('last_invoice_date'),
+        ))
+    ClientSummary.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0003_invoice_total_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientSummary',
+            fields=[
+                ('client', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='invoices.Client')),
+                ('invoice_count', models.IntegerField(default=0)),
+                ('total_billed', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('last_invoice_date', models.DateField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(build_client_summaries, migrations.RunPython.noop),
+    ]
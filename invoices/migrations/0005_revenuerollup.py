@@ -0,0 +1,48 @@
+# Generated by Django 3.0.2 on 2026-10-18 18:22
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+import django.db.models.deletion
+
+
+def build_revenue_rollups(apps, schema_editor):
+    Invoice = apps.get_model('invoices', 'Invoice')
+    RevenueRollup = apps.get_model('invoices', 'RevenueRollup')
+
+    totals = Invoice.objects.order_by().annotate(period=TruncMonth('create_date')).values(
+        'user_id', 'client_id', 'period',
+    ).annotate(invoice_count=Count('pk'), revenue=Sum('invoice_total'))
+    RevenueRollup.objects.bulk_create([RevenueRollup(**row) for row in totals], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('invoices', '0004_clientsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(help_text='First day of the month')),
+                ('invoice_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='invoices.Client')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='revenuerollup',
+            index=models.Index(fields=['user', 'period'], name='invoices_re_user_id_605dfd_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='revenuerollup',
+            unique_together={('user', 'client', 'period')},
+        ),
+        migrations.RunPython(build_revenue_rollups, migrations.RunPython.noop),
+    ]
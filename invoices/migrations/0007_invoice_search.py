@@ -0,0 +1,122 @@
+from django.db import migrations
+
+
+# One row per invoice, rowid = invoice id. ``owner`` holds u<user id> so a
+# search is scoped with an index lookup rather than a filter over matches.
+CREATE_TABLE = """
+CREATE VIRTUAL TABLE invoices_search USING fts5(
+    owner, title, client_name, client_company, client_email, items,
+    tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+)
+"""
+
+CLIENT_COLUMNS = """
+    (SELECT first_name || ' ' || last_name FROM invoices_client WHERE id = {invoice}.client_id),
+    (SELECT company FROM invoices_client WHERE id = {invoice}.client_id),
+    (SELECT email FROM invoices_client WHERE id = {invoice}.client_id)
+"""
+
+ITEMS = "(SELECT group_concat(item, ' ') FROM invoices_invoiceitem WHERE invoice_id = {invoice_id})"
+
+TRIGGERS = [
+    f"""
+    CREATE TRIGGER invoices_search_invoice_insert AFTER INSERT ON invoices_invoice BEGIN
+        INSERT INTO invoices_search (rowid, owner, title, client_name, client_company, client_email, items)
+        VALUES (NEW.id, 'u' || NEW.user_id, NEW.title, {CLIENT_COLUMNS.format(invoice='NEW')},
+                {ITEMS.format(invoice_id='NEW.id')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER invoices_search_invoice_update AFTER UPDATE OF title, client_id, user_id ON invoices_invoice
+    WHEN OLD.title IS NOT NEW.title OR OLD.client_id IS NOT NEW.client_id OR OLD.user_id IS NOT NEW.user_id
+    BEGIN
+        UPDATE invoices_search SET
+            owner = 'u' || NEW.user_id, title = NEW.title,
+            (client_name, client_company, client_email) = ({CLIENT_COLUMNS.format(invoice='NEW')})
+        WHERE rowid = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER invoices_search_invoice_delete AFTER DELETE ON invoices_invoice BEGIN
+        DELETE FROM invoices_search WHERE rowid = OLD.id;
+    END
+    """,
+    """
+    CREATE TRIGGER invoices_search_client_update AFTER UPDATE OF first_name, last_name, company, email
+    ON invoices_client
+    WHEN OLD.first_name IS NOT NEW.first_name OR OLD.last_name IS NOT NEW.last_name
+        OR OLD.company IS NOT NEW.company OR OLD.email IS NOT NEW.email
+    BEGIN
+        UPDATE invoices_search SET
+            client_name = NEW.first_name || ' ' || NEW.last_name,
+            client_company = NEW.company, client_email = NEW.email
+        WHERE rowid IN (SELECT id FROM invoices_invoice WHERE client_id = NEW.id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER invoices_search_item_insert AFTER INSERT ON invoices_invoiceitem BEGIN
+        UPDATE invoices_search SET items = {ITEMS.format(invoice_id='NEW.invoice_id')}
+        WHERE rowid = NEW.invoice_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER invoices_search_item_update AFTER UPDATE OF item, invoice_id ON invoices_invoiceitem
+    WHEN OLD.item IS NOT NEW.item OR OLD.invoice_id IS NOT NEW.invoice_id
+    BEGIN
+        UPDATE invoices_search SET items = {ITEMS.format(invoice_id='OLD.invoice_id')}
+        WHERE rowid = OLD.invoice_id;
+        UPDATE invoices_search SET items = {ITEMS.format(invoice_id='NEW.invoice_id')}
+        WHERE rowid = NEW.invoice_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER invoices_search_item_delete AFTER DELETE ON invoices_invoiceitem BEGIN
+        UPDATE invoices_search SET items = {ITEMS.format(invoice_id='OLD.invoice_id')}
+        WHERE rowid = OLD.invoice_id;
+    END
+    """,
+]
+
+POPULATE = f"""
+INSERT INTO invoices_search (rowid, owner, title, client_name, client_company, client_email, items)
+SELECT invoice.id, 'u' || invoice.user_id, invoice.title, {CLIENT_COLUMNS.format(invoice='invoice')},
+       {ITEMS.format(invoice_id='invoice.id')}
+FROM invoices_invoice AS invoice
+"""
+
+DROP = [
+    'DROP TRIGGER IF EXISTS invoices_search_invoice_insert',
+    'DROP TRIGGER IF EXISTS invoices_search_invoice_update',
+    'DROP TRIGGER IF EXISTS invoices_search_invoice_delete',
+    'DROP TRIGGER IF EXISTS invoices_search_client_update',
+    'DROP TRIGGER IF EXISTS invoices_search_item_insert',
+    'DROP TRIGGER IF EXISTS invoices_search_item_update',
+    'DROP TRIGGER IF EXISTS invoices_search_item_delete',
+    'DROP TABLE IF EXISTS invoices_search',
+]
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite only, other databases search without an index
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in [CREATE_TABLE, *TRIGGERS, POPULATE]:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0006_invoice_revision'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
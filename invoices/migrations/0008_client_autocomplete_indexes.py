@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+# Expression indexes for the case-insensitive prefix searches of
+# invoices.autocomplete, which compare these exact expressions. Django 3.0
+# can't declare expression indexes on the model.
+INDEXES = {
+    'invoices_client_name_lower': "created_by_id, lower(first_name || ' ' || last_name)",
+    'invoices_client_last_name_lower': 'created_by_id, lower(last_name)',
+    'invoices_client_company_lower': 'created_by_id, lower(company)',
+    'invoices_client_email_lower': 'created_by_id, lower(email)',
+}
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0007_invoice_search'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            f'CREATE INDEX {name} ON invoices_client ({columns})',
+            f'DROP INDEX {name}',
+        )
+        for name, columns in INDEXES.items()
+    ]
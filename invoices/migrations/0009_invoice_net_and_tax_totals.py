@@ -0,0 +1,95 @@
+# Generated by Django 3.0.2 on 2026-10-19 09:10
+
+import importlib
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+
+
+search_index = importlib.import_module('invoices.migrations.0007_invoice_search')
+client_summaries = importlib.import_module('invoices.migrations.0004_clientsummary')
+revenue_rollups = importlib.import_module('invoices.migrations.0005_revenuerollup')
+
+AMOUNT_FIELD = models.DecimalField(max_digits=12, decimal_places=2)
+
+
+def drop_search_triggers(apps, schema_editor):
+    # SQLite adds the fields by copying invoices_invoice into a new table,
+    # which the search triggers from 0007 would break, or be dropped with
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in search_index.DROP:
+        if statement.startswith('DROP TRIGGER'):
+            schema_editor.execute(statement)
+
+
+def create_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in search_index.TRIGGERS:
+        schema_editor.execute(statement)
+
+
+def hundredths(name):
+    return Round(ExpressionWrapper(F(name) * Value(100), output_field=AMOUNT_FIELD))
+
+
+def compute_totals(apps, schema_editor):
+    # Item taxes used to be ignored, so the totals are computed from the
+    # items as InvoiceQuerySet.recalculate_totals() does, and the client
+    # summaries and revenue rollups rebuilt from them
+    Invoice = apps.get_model('invoices', 'Invoice')
+    InvoiceItem = apps.get_model('invoices', 'InvoiceItem')
+    ClientSummary = apps.get_model('invoices', 'ClientSummary')
+    RevenueRollup = apps.get_model('invoices', 'RevenueRollup')
+
+    subtotal = ExpressionWrapper(F('quantity') * F('rate'), output_field=AMOUNT_FIELD)
+    tax = ExpressionWrapper(
+        Round(ExpressionWrapper(
+            F('quantity') * hundredths('rate') * hundredths('tax') / Value(Decimal('10000')),
+            output_field=AMOUNT_FIELD,
+        )) / Value(Decimal('100')),
+        output_field=AMOUNT_FIELD,
+    )
+
+    def item_totals(expression):
+        items = InvoiceItem.objects.filter(invoice=OuterRef('pk')).order_by().values('invoice')
+        return Coalesce(
+            Subquery(items.annotate(total=Sum(expression)).values('total'), output_field=AMOUNT_FIELD),
+            Value(Decimal('0')),
+        )
+
+    Invoice.objects.update(
+        net_total=item_totals(subtotal),
+        tax_total=item_totals(tax),
+        invoice_total=item_totals(ExpressionWrapper(subtotal + tax, output_field=AMOUNT_FIELD)),
+    )
+    ClientSummary.objects.all().delete()
+    client_summaries.build_client_summaries(apps, schema_editor)
+    RevenueRollup.objects.all().delete()
+    revenue_rollups.build_revenue_rollups(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0008_client_autocomplete_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_search_triggers, create_search_triggers),
+        migrations.AddField(
+            model_name='invoice',
+            name='net_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='tax_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(compute_totals, migrations.RunPython.noop),
+        migrations.RunPython(create_search_triggers, drop_search_triggers),
+    ]
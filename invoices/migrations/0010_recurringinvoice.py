@@ -0,0 +1,47 @@
+# Generated by Django 3.0.2 on 2026-10-18 19:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('invoices', '0009_invoice_net_and_tax_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringInvoice',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('interval_months', models.PositiveSmallIntegerField(choices=[(1, 'Monthly'), (3, 'Quarterly'), (12, 'Yearly')], default=1)),
+                ('start_date', models.DateField(help_text='Date of the first invoice')),
+                ('end_date', models.DateField(blank=True, help_text='No invoices after this date', null=True)),
+                ('active', models.BooleanField(default=True)),
+                ('billed_cycles', models.PositiveIntegerField(default=0, editable=False)),
+                ('next_date', models.DateField(editable=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_invoices', to='invoices.Client')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecurringInvoiceItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item', models.CharField(max_length=200)),
+                ('quantity', models.IntegerField(default=0)),
+                ('rate', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('tax', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+                ('recurring_invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='invoices.RecurringInvoice')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recurringinvoice',
+            index=models.Index(fields=['active', 'next_date'], name='invoices_re_active_cdab89_idx'),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 3.0.2 on 2026-10-18 19:31
+
+import importlib
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F
+
+import invoices.currency
+
+
+search_index = importlib.import_module('invoices.migrations.0007_invoice_search')
+autocomplete_indexes = importlib.import_module('invoices.migrations.0008_client_autocomplete_indexes')
+
+
+def drop_search_triggers(apps, schema_editor):
+    # As in 0009, SQLite adds the fields by copying invoices_invoice and
+    # invoices_client into new tables, which the search triggers would break
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in search_index.DROP:
+        if statement.startswith('DROP TRIGGER'):
+            schema_editor.execute(statement)
+
+
+def create_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in search_index.TRIGGERS:
+        schema_editor.execute(statement)
+
+
+def copy_base_totals(apps, schema_editor):
+    # Existing invoices were all in the base currency
+    Invoice = apps.get_model('invoices', 'Invoice')
+    Invoice.objects.update(base_total=F('invoice_total'))
+
+
+# The copied invoices_client also loses the expression indexes of 0008
+DROP_AUTOCOMPLETE_INDEXES = [f'DROP INDEX {name}' for name in autocomplete_indexes.INDEXES]
+CREATE_AUTOCOMPLETE_INDEXES = [
+    f'CREATE INDEX {name} ON invoices_client ({columns})'
+    for name, columns in autocomplete_indexes.INDEXES.items()
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0010_recurringinvoice'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_search_triggers, create_search_triggers),
+        migrations.RunSQL(DROP_AUTOCOMPLETE_INDEXES, CREATE_AUTOCOMPLETE_INDEXES),
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3, unique=True)),
+                ('rate', models.DecimalField(decimal_places=6, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='currency',
+            field=models.CharField(default=invoices.currency.base_currency, max_length=3, validators=[invoices.currency.validate_currency]),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='currency',
+            field=models.CharField(default=invoices.currency.base_currency, editable=False, max_length=3),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='exchange_rate',
+            field=models.DecimalField(decimal_places=6, default=Decimal('1'), editable=False, max_digits=14),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='base_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(copy_base_totals, migrations.RunPython.noop),
+        migrations.RunSQL(CREATE_AUTOCOMPLETE_INDEXES, DROP_AUTOCOMPLETE_INDEXES),
+        migrations.RunPython(create_search_triggers, drop_search_triggers),
+    ]
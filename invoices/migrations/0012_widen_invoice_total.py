@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+from invoices.operations import PreserveSQLObjects
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0011_currencies'),
+    ]
+
+    operations = [
+        # invoice_total became the gross total in 0009 but kept the six digits
+        # of the net total, so invoices of 10,000 or more couldn't be read back
+        PreserveSQLObjects(
+            migrations.AlterField(
+                model_name='invoice',
+                name='invoice_total',
+                field=models.DecimalField(blank=True, decimal_places=2, default=0, editable=False, max_digits=12),
+            ),
+        ),
+    ]
@@ -1,14 +1,351 @@
-from decimal import Decimal
+import calendar
+from collections import defaultdict, namedtuple
+from decimal import ROUND_HALF_UP, Decimal
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import Case, Count, ExpressionWrapper, F, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.deletion import Collector
+from django.db.models.functions import Coalesce, Round, TruncMonth
 from django.urls import reverse
+from django.utils import timezone
 
 from phonenumber_field.modelfields import PhoneNumberField
 
+from .currency import CENT, RATE_SCALE, base_currency, get_rate, to_base, validate_currency
+from .fragments import invalidate_user_fragments
 
-# class InvoiceManager(models.Manager):
-#     def get_invoice_items(self):
-#         return self.items.all()
+
+AMOUNT_FIELD = models.DecimalField(max_digits=12, decimal_places=2)
+
+
+def scaled(expression, factor):
+    # An exact whole number even on SQLite, which stores decimals as floats
+    return Round(ExpressionWrapper(expression * Value(factor), output_field=AMOUNT_FIELD))
+
+
+def hundredths(name):
+    return scaled(F(name), 100)
+
+
+def base_amount(total):
+    """
+    SQL for ``total`` converted at the invoice's exchange rate, rounded to
+    the cent from whole numbers like currency.to_base()
+    """
+    return ExpressionWrapper(
+        Round(ExpressionWrapper(
+            scaled(total, 100) * scaled(F('exchange_rate'), RATE_SCALE) / Value(RATE_SCALE),
+            output_field=AMOUNT_FIELD,
+        )) / Value(Decimal('100')),
+        output_field=AMOUNT_FIELD,
+    )
+
+
+# Net, tax and gross amounts of an InvoiceItem row, for database-side
+# totals. The tax is a percentage of the net amount, rounded to the cent
+# per item the same way as InvoiceItem.tax_amount(). It is worked out in
+# whole numbers so halves round up rather than falling either side of .5.
+ITEM_SUBTOTAL = ExpressionWrapper(F('quantity') * F('rate'), output_field=AMOUNT_FIELD)
+ITEM_TAX = ExpressionWrapper(
+    Round(ExpressionWrapper(
+        F('quantity') * hundredths('rate') * hundredths('tax') / Value(Decimal('10000')),
+        output_field=AMOUNT_FIELD,
+    )) / Value(Decimal('100')),
+    output_field=AMOUNT_FIELD,
+)
+ITEM_TOTAL = ExpressionWrapper(ITEM_SUBTOTAL + ITEM_TAX, output_field=AMOUNT_FIELD)
+
+# Fields of an InvoiceItem that feed into its invoice's totals
+TOTAL_FIELDS = {'invoice', 'invoice_id', 'quantity', 'rate', 'tax'}
+
+
+class Totals(namedtuple('Totals', ['net', 'tax'])):
+    """Net and tax amounts of an item, or a change to an invoice's totals"""
+    __slots__ = ()
+
+    @property
+    def gross(self):
+        return self.net + self.tax
+
+    def __add__(self, other):
+        return Totals(self.net + other.net, self.tax + other.tax)
+
+    def __neg__(self):
+        return Totals(-self.net, -self.tax)
+
+    def __sub__(self, other):
+        return self + -other
+
+    def __bool__(self):
+        return bool(self.net or self.tax)
+
+
+NO_TOTALS = Totals(Decimal('0'), Decimal('0'))
+
+
+def apply_invoice_total_deltas(deltas):
+    """
+    Adjust stored invoice totals by {invoice_id: Totals}, one UPDATE per
+    invoice. Every invoice passed in gets a new revision, even with a zero
+    delta, since its items changed.
+    """
+    if not deltas:
+        return
+    # The base currency total is rounded per invoice, so the change to it
+    # is worked out from the locked row rather than converted from the delta
+    invoices = {
+        row[0]: row for row in Invoice.objects.select_for_update().filter(
+            pk__in=[invoice_id for invoice_id, delta in deltas.items() if delta.gross]
+        ).values_list('pk', 'user_id', 'client_id', 'create_date', 'invoice_total', 'exchange_rate', 'base_total')
+    }
+    modified_at = timezone.now()
+    base_deltas = {}
+    for invoice_id, delta in deltas.items():
+        changes = {}
+        if invoice_id in invoices:
+            invoice_total, exchange_rate, base_total = invoices[invoice_id][4:]
+            changes['base_total'] = to_base(invoice_total + delta.gross, exchange_rate)
+            base_deltas[invoice_id] = changes['base_total'] - base_total
+        Invoice.objects.filter(pk=invoice_id).update(
+            net_total=F('net_total') + delta.net,
+            tax_total=F('tax_total') + delta.tax,
+            invoice_total=F('invoice_total') + delta.gross,
+            revision=F('revision') + 1,
+            modified_at=modified_at,
+            **changes
+        )
+    # Carry the change over to the per-client and per-period aggregates,
+    # which count what was billed in the base currency, taxes included
+    for invoice_id, base_delta in base_deltas.items():
+        if base_delta:
+            user_id, client_id, create_date = invoices[invoice_id][1:4]
+            ClientSummary.objects.add_invoice(client_id, base_delta, None, count=0)
+            RevenueRollup.objects.add_invoice(user_id, client_id, create_date, base_delta, count=0)
+
+
+def item_totals(expression):
+    """Sum of ``expression`` over the items of the outer query's invoice"""
+    items = InvoiceItem.objects.filter(invoice=OuterRef('pk')).order_by().values('invoice')
+    return Coalesce(
+        Subquery(items.annotate(total=Sum(expression)).values('total'), output_field=AMOUNT_FIELD),
+        Value(Decimal('0')),
+    )
+
+
+class InvoiceQuerySet(models.QuerySet):
+
+    def set_currencies(self, objs):
+        # Bulk inserts bypass Invoice.save(), so set the currencies here,
+        # with one query for the clients that aren't loaded
+        client_ids = {obj.client_id for obj in objs if not obj.currency and not Invoice.client.is_cached(obj)}
+        currencies = dict(Client.objects.filter(pk__in=client_ids).values_list('pk', 'currency')) if client_ids else {}
+        for obj in objs:
+            obj.set_currency(currencies.get(obj.client_id))
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        self.set_currencies(objs)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_insert(self, objs):
+        """
+        Insert new invoices in bulk and set their ids, which bulk_create()
+        leaves unset on backends that can't return them, SQLite among them.
+        Like bulk_create() no signals are sent, callers bring the invoices
+        into the billing aggregates once per batch (see recalculate_totals()
+        and billing.add_to_aggregates()).
+        """
+        objs = list(objs)
+        if not objs:
+            return objs
+        connection = connections[self.db]
+        with transaction.atomic(using=self.db):
+            if connection.features.can_return_rows_from_bulk_insert:
+                return self.bulk_create(objs)
+            if connection.vendor == 'sqlite':
+                # SQLite hands out increasing ids and the transaction holds
+                # the write lock from the insert on, so the newest rows are ours
+                self.bulk_create(objs)
+                pks = list(self.model._default_manager.using(self.db).order_by('-pk').values_list(
+                    'pk', flat=True
+                )[:len(objs)])
+                pks.reverse()
+            else:
+                # One INSERT per invoice, still without the per-row signals
+                self.set_currencies(objs)
+                fields = [field for field in self.model._meta.concrete_fields if not field.primary_key]
+                pks = [self._insert([obj], fields, returning_fields=[self.model._meta.pk])[0] for obj in objs]
+            for obj, pk in zip(objs, pks):
+                obj.pk = pk
+                obj._state.adding = False
+                obj._state.db = self.db
+        return objs
+
+    bulk_insert.alters_data = True
+
+    def with_item_totals(self):
+        """
+        Annotate each invoice with the totals of its items as `item_net`,
+        `item_tax` and `item_total`, and `item_base` for the base currency,
+        computed by the database, so lists can show correct totals without
+        loading the items
+        """
+        return self.annotate(
+            item_net=item_totals(ITEM_SUBTOTAL),
+            item_tax=item_totals(ITEM_TAX),
+            item_total=item_totals(ITEM_TOTAL),
+        ).annotate(item_base=base_amount(F('item_total')))
+
+    def drifted(self):
+        """These invoices whose stored totals don't match their items"""
+        def cents_apart(stored, expected):
+            # In whole cents, as the database may hand back more precision
+            # than the fields store
+            return Round(
+                ExpressionWrapper((F(stored) - F(expected)) * Value(100), output_field=AMOUNT_FIELD),
+                output_field=models.IntegerField(),
+            )
+
+        return self.with_item_totals().annotate(
+            net_drift=cents_apart('net_total', 'item_net'),
+            tax_drift=cents_apart('tax_total', 'item_tax'),
+            total_drift=cents_apart('invoice_total', 'item_total'),
+            base_drift=cents_apart('base_total', 'item_base'),
+        ).exclude(net_drift=0, tax_drift=0, total_drift=0, base_drift=0)
+
+    def touch(self):
+        """Give these invoices a new revision, e.g. after their client changed"""
+        return self.update(revision=F('revision') + 1, modified_at=timezone.now())
+
+    touch.alters_data = True
+
+    def recalculate_totals(self):
+        """
+        Recompute the stored totals of these invoices in a single UPDATE,
+        along with the aggregates and cached tables that show them
+        """
+        # All invoices rebuild every aggregate, rather than a list of
+        # client ids too long for a query
+        if self.query.has_filters():
+            owners = set(self.values_list('client_id', 'user_id'))
+            client_ids = {client_id for client_id, user_id in owners}
+            user_ids = {user_id for client_id, user_id in owners}
+        else:
+            client_ids = None
+            user_ids = set(Invoice.objects.values_list('user_id', flat=True).distinct())
+        rows = self.update(
+            net_total=item_totals(ITEM_SUBTOTAL),
+            tax_total=item_totals(ITEM_TAX),
+            invoice_total=item_totals(ITEM_TOTAL),
+            base_total=base_amount(item_totals(ITEM_TOTAL)),
+            revision=F('revision') + 1,
+            modified_at=timezone.now(),
+        )
+        ClientSummary.objects.rebuild(client_ids)
+        RevenueRollup.objects.rebuild(client_ids)
+        if user_ids:
+            invalidate_user_fragments(*user_ids)
+        return rows
+
+
+def invalidate_invoice_user_fragments(invoice_ids):
+    """Drop the cached tables of the users these invoices belong to"""
+    user_ids = set(Invoice.objects.filter(pk__in=invoice_ids).values_list('user_id', flat=True))
+    if user_ids:
+        invalidate_user_fragments(*user_ids)
+
+
+class InvoiceItemQuerySet(models.QuerySet):
+    # Bulk operations bypass InvoiceItem.save() and delete(), so they keep
+    # the invoice totals and the users' cached tables up to date themselves.
+
+    def bulk_create(self, objs, *args, update_totals=True, **kwargs):
+        # Pass update_totals=False when the caller recalculates the totals
+        # itself once it is done, e.g. when importing many batches
+        if not update_totals:
+            return super().bulk_create(objs, *args, **kwargs)
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            if kwargs.get('ignore_conflicts'):
+                # Ignored rows weren't inserted, so deltas can't be trusted
+                invoice_ids = {obj.invoice_id for obj in objs}
+                Invoice.objects.filter(pk__in=invoice_ids).recalculate_totals()
+            else:
+                deltas = defaultdict(lambda: NO_TOTALS)
+                for obj in objs:
+                    deltas[obj.invoice_id] += obj.totals()
+                apply_invoice_total_deltas(deltas)
+            invalidate_invoice_user_fragments({obj.invoice_id for obj in objs})
+        for obj in objs:
+            obj._loaded_total = (obj.invoice_id, obj.totals())
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        if not TOTAL_FIELDS.intersection(fields):
+            with transaction.atomic(using=self.db):
+                result = super().bulk_update(objs, fields, *args, **kwargs)
+                invoice_ids = {obj.invoice_id for obj in objs}
+                Invoice.objects.filter(pk__in=invoice_ids).touch()
+                invalidate_invoice_user_fragments(invoice_ids)
+            return result
+        with transaction.atomic(using=self.db):
+            invoice_ids = set(self.model.objects.filter(
+                pk__in=[obj.pk for obj in objs]
+            ).values_list('invoice_id', flat=True))
+            invoice_ids.update(obj.invoice_id for obj in objs)
+            result = super().bulk_update(objs, fields, *args, **kwargs)
+            Invoice.objects.filter(pk__in=invoice_ids).recalculate_totals()
+        for obj in objs:
+            obj._loaded_total = (obj.invoice_id, obj.totals())
+        return result
+
+    def update(self, **kwargs):
+        if not TOTAL_FIELDS.intersection(kwargs):
+            with transaction.atomic(using=self.db):
+                invoice_ids = set(self.values_list('invoice_id', flat=True))
+                rows = super().update(**kwargs)
+                Invoice.objects.filter(pk__in=invoice_ids).touch()
+                invalidate_invoice_user_fragments(invoice_ids)
+            return rows
+        with transaction.atomic(using=self.db):
+            invoice_ids = set(self.values_list('invoice_id', flat=True))
+            new_invoice = kwargs.get('invoice', kwargs.get('invoice_id'))
+            if new_invoice is not None:
+                invoice_ids.add(getattr(new_invoice, 'pk', new_invoice))
+            rows = super().update(**kwargs)
+            Invoice.objects.filter(pk__in=invoice_ids).recalculate_totals()
+        return rows
+
+    update.alters_data = True
+
+    def _delete_items(self):
+        # QuerySet.delete() loads the items without their invoice, so each
+        # post_delete receiver would look up the invoice's user on its own
+        items = self._chain().select_related('invoice').only('invoice', 'invoice__user_id')
+        collector = Collector(using=self.db)
+        collector.collect(list(items.order_by()))
+        self._result_cache = None
+        return collector.delete()
+
+    def delete(self, update_totals=True):
+        # As with bulk_create, update_totals=False leaves the totals to the caller
+        if not update_totals:
+            return self._delete_items()
+        with transaction.atomic(using=self.db):
+            deltas = {
+                row['invoice_id']: -Totals(row['net'], row['tax'])
+                for row in self.order_by().values('invoice_id').annotate(
+                    net=Sum(ITEM_SUBTOTAL), tax=Sum(ITEM_TAX),
+                )
+            }
+            result = self._delete_items()
+            apply_invoice_total_deltas(deltas)
+            invalidate_invoice_user_fragments(deltas)
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
 
 class Client(models.Model):
     first_name = models.CharField(max_length=200)
@@ -19,6 +356,8 @@ class Client(models.Model):
     address2 = models.CharField(max_length=100)
     country = models.CharField(max_length=100)
     phone_number = PhoneNumberField(blank=True)
+    # New invoices are issued in this currency
+    currency = models.CharField(max_length=3, default=base_currency, validators=[validate_currency])
 
     created_by = models.ForeignKey(
         get_user_model(),
@@ -44,8 +383,24 @@ class Invoice(models.Model):
     )
     client = models.ForeignKey(Client, on_delete=models.CASCADE)
     # description = models.TextField()
-    invoice_total = models.DecimalField(max_digits=6, decimal_places=2, blank=True, editable=False)
+    # Maintained by InvoiceItem saves and deletes, see apply_invoice_total_deltas.
+    # invoice_total is the gross amount, net_total plus tax_total.
+    invoice_total = models.DecimalField(max_digits=12, decimal_places=2, blank=True, editable=False, default=0)
+    net_total = models.DecimalField(max_digits=12, decimal_places=2, editable=False, default=0)
+    tax_total = models.DecimalField(max_digits=12, decimal_places=2, editable=False, default=0)
+    # The client's currency when the invoice was created, and the rate to
+    # the base currency it was issued at. base_total is invoice_total at
+    # that rate, for the aggregates and dashboards, see invoices.currency.
+    currency = models.CharField(max_length=3, editable=False)
+    exchange_rate = models.DecimalField(max_digits=14, decimal_places=6, editable=False)
+    base_total = models.DecimalField(max_digits=12, decimal_places=2, editable=False, default=0)
     create_date = models.DateField(auto_now_add=True)
+    # Bumped whenever the invoice, its items or its client change, and used
+    # as the ETag and Last-Modified of the invoice views
+    revision = models.PositiveIntegerField(default=1, editable=False)
+    modified_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    objects = InvoiceQuerySet.as_manager()
 
     class Meta:
         verbose_name: "Invoice"
@@ -60,27 +415,78 @@ class Invoice(models.Model):
     def __repr__(self):
         return f'<Invoice: {self.client} - {self.title}>'
 
-    # @property
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the client summaries notice invoices moving between clients
+        if 'client_id' in field_names:
+            instance._loaded_client_id = instance.client_id
+        return instance
+
     def get_invoice_total(self):
-        # return f'${self.invoice_total}'
-        total = 0
-        total = sum([item.subtotal() for item in self.items.all()])
-        # self.invoice_total = total
-        return total
+        # Gross sum of the items, computed by the database
+        return self.items.aggregate(total=Sum(ITEM_TOTAL))['total'] or 0
 
+    def get_totals(self):
+        totals = self.items.aggregate(net=Sum(ITEM_SUBTOTAL), tax=Sum(ITEM_TAX))
+        return Totals(totals['net'] or Decimal('0'), totals['tax'] or Decimal('0'))
+
+    def set_currency(self, client_currency=None):
+        """Issue a new invoice in its client's currency at the current rate"""
+        if not self.currency:
+            self.currency = client_currency or self.client.currency
+        if self.exchange_rate is None:
+            self.exchange_rate = get_rate(self.currency)
+        self.base_total = to_base(self.invoice_total or 0, self.exchange_rate)
 
     def save(self, *args, **kwargs):
-        #  TODO: Figure out why this doesn't always work
-        self.invoice_total = self.get_invoice_total()
+        # The stored total is kept up to date by atomic updates from the
+        # items, so never write back a copy that may be stale in memory.
+        # Every update starts a new revision.
+        updating = not self._state.adding and not kwargs.get('force_insert')
+        if not updating:
+            self.set_currency()
+        if updating:
+            if kwargs.get('update_fields') is None:
+                kwargs['update_fields'] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in STORED_TOTAL_FIELDS
+                ]
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'revision', 'modified_at'}
+            self.revision = F('revision') + 1
+            self.modified_at = timezone.now()
         super().save(*args, **kwargs)
+        if updating:
+            self.refresh_from_db(fields=['revision'])
+
+STORED_TOTAL_FIELDS = {'invoice_total', 'net_total', 'tax_total', 'base_total'}
+
+
+class ItemAmountsMixin:
+    # Amounts of a line item with quantity, rate and tax (a percentage)
 
-class InvoiceItem(models.Model):
+    def subtotal(self):
+        return self.quantity * self.rate
+
+    def tax_amount(self):
+        return (Decimal(self.subtotal()) * Decimal(self.tax or 0) / 100).quantize(CENT, ROUND_HALF_UP)
+
+    def total(self):
+        return self.subtotal() + self.tax_amount()
+
+    def totals(self):
+        return Totals(Decimal(self.subtotal()), self.tax_amount())
+
+
+class InvoiceItem(ItemAmountsMixin, models.Model):
     # Invoice Line Items
     invoice = models.ForeignKey(Invoice, related_name='items', on_delete=models.CASCADE)
     item = models.CharField(max_length=200)
     quantity = models.IntegerField(default=0)
     rate = models.DecimalField(max_digits=6, decimal_places=2)
-    tax = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    tax = models.DecimalField(max_digits=6, decimal_places=2, default=0)  # Percentage of the subtotal
+
+    objects = InvoiceItemQuerySet.as_manager()
 
     class Meta:
         verbose_name: "Invoice Item"
@@ -93,18 +499,381 @@ class InvoiceItem(models.Model):
     def __repr__(self):
         return f'<Invoice Line Item: {self.item} - {self.subtotal()}>'
 
-    def subtotal(self):
-        return self.quantity * self.rate
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what this row contributed to its invoice's totals so that
+        # save() and delete() only have to apply the difference
+        if {'invoice_id', 'quantity', 'rate', 'tax'}.issubset(field_names):
+            instance._loaded_total = (instance.invoice_id, instance.totals())
+        return instance
+
+    def _get_loaded_total(self):
+        if self._state.adding:
+            return None
+        if not hasattr(self, '_loaded_total'):
+            row = InvoiceItem.objects.filter(pk=self.pk).only('invoice', 'quantity', 'rate', 'tax').first()
+            self._loaded_total = (row.invoice_id, row.totals()) if row else None
+        return self._loaded_total
+
+    def _apply_total_delta(self, deltas):
+        apply_invoice_total_deltas(deltas)
+        if InvoiceItem.invoice.is_cached(self) and self.invoice_id in deltas:
+            invoice, delta = self.invoice, deltas[self.invoice_id]
+            invoice.net_total = (invoice.net_total or 0) + delta.net
+            invoice.tax_total = (invoice.tax_total or 0) + delta.tax
+            invoice.invoice_total = (invoice.invoice_total or 0) + delta.gross
+            if invoice.exchange_rate is not None:
+                invoice.base_total = to_base(invoice.invoice_total, invoice.exchange_rate)
 
     def save(self, *args, **kwargs):
-        # Add a call to update invoice total here
-        # When creating new invoices in the django admin, invoice totals are not calculated
-        # super().save(*args, **kwargs)
-        # self.invoice.get_invoice_total()
+        deltas = defaultdict(lambda: NO_TOTALS)
+        with transaction.atomic(using=kwargs.get('using')):
+            loaded_total = self._get_loaded_total()
+            super().save(*args, **kwargs)
+            if loaded_total is not None:
+                deltas[loaded_total[0]] -= loaded_total[1]
+            deltas[self.invoice_id] += self.totals()
+            self._apply_total_delta(deltas)
+        self._loaded_total = (self.invoice_id, self.totals())
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            loaded_total = self._get_loaded_total()
+            result = super().delete(*args, **kwargs)
+            if loaded_total is not None:
+                self._apply_total_delta({loaded_total[0]: -loaded_total[1]})
+        self.__dict__.pop('_loaded_total', None)
+        return result
+
+
+class PdfJob(models.Model):
+    # Queued PDF render, processed by the process_pdf_jobs command
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    invoice = models.ForeignKey(Invoice, related_name='pdf_jobs', on_delete=models.CASCADE)
+    user = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.CASCADE,
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    pdf = models.FileField(upload_to='pdf_jobs/', blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f'PDF job {self.pk} for invoice {self.invoice_id} - {self.status}'
+
+    def __repr__(self):
+        return f'<PdfJob: {self.invoice_id} - {self.status}>'
+
+
+class ClientSummaryManager(models.Manager):
+    # Summaries are adjusted by deltas as invoices change, see
+    # invoices.signals, and only rebuilt from the invoices in bulk.
+
+    def add_invoice(self, client_id, total, invoice_date, count=1):
+        last_invoice_date = F('last_invoice_date')
+        if invoice_date is not None and count > 0:
+            last_invoice_date = Case(
+                When(Q(last_invoice_date__isnull=True) | Q(last_invoice_date__lt=invoice_date),
+                     then=Value(invoice_date)),
+                default=F('last_invoice_date'),
+            )
+        return self.filter(client_id=client_id).update(
+            invoice_count=F('invoice_count') + count,
+            total_billed=F('total_billed') + total,
+            last_invoice_date=last_invoice_date,
+        )
+
+    def add_invoices(self, figures):
+        """
+        Add new invoices to many summaries at once, from {client_id: (count,
+        total, latest invoice date)}. The summaries are read, deleted and
+        inserted again, bulk_update() takes longer to build its query than
+        these three statements take to run.
+        """
+        with transaction.atomic(using=self.db):
+            summaries = list(self.select_for_update().filter(client_id__in=figures))
+            for summary in summaries:
+                count, total, latest = figures[summary.client_id]
+                summary.invoice_count += count
+                summary.total_billed += total
+                if summary.last_invoice_date is None or summary.last_invoice_date < latest:
+                    summary.last_invoice_date = latest
+            self.filter(client_id__in=figures).delete()
+            self.bulk_create(summaries)
+
+    def remove_invoice(self, client_id, total, invoice_date):
+        self.add_invoice(client_id, -total, None, count=-1)
+        # Only look for the new latest date if the latest invoice went away
+        latest = self.filter(client_id=client_id, last_invoice_date__lte=invoice_date)
+        latest.update(last_invoice_date=Subquery(
+            Invoice.objects.filter(client_id=client_id).order_by().values('client').annotate(
+                latest=Max('create_date')
+            ).values('latest')
+        ))
+
+    def rebuild(self, client_ids=None):
+        """Recompute summaries from the invoices, for all clients or the given ones"""
+        clients = Client.objects.all()
+        if client_ids is not None:
+            clients = clients.filter(pk__in=client_ids)
+        self.bulk_create(
+            [ClientSummary(client_id=pk) for pk in clients.filter(summary__isnull=True).values_list('pk', flat=True)],
+            ignore_conflicts=True,
+        )
+
+        invoices = Invoice.objects.filter(client=OuterRef('client')).order_by().values('client')
+        summaries = self.all()
+        if client_ids is not None:
+            summaries = summaries.filter(client_id__in=client_ids)
+        return summaries.update(
+            invoice_count=Coalesce(Subquery(
+                invoices.annotate(count=Count('pk')).values('count'),
+                output_field=models.IntegerField(),
+            ), Value(0)),
+            total_billed=Coalesce(Subquery(
+                invoices.annotate(total=Sum('base_total')).values('total'),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ), Value(Decimal('0'))),
+            last_invoice_date=Subquery(
+                invoices.annotate(latest=Max('create_date')).values('latest'),
+                output_field=models.DateField(),
+            ),
+        )
+
+
+class ClientSummary(models.Model):
+    # Billing figures per client, denormalized so client pages don't have
+    # to aggregate over the client's invoices
+    client = models.OneToOneField(Client, related_name='summary', on_delete=models.CASCADE, primary_key=True)
+    invoice_count = models.IntegerField(default=0)
+    total_billed = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    last_invoice_date = models.DateField(null=True, blank=True)
 
-        # super().save(*args, **kwargs)
-        self.invoice.save()
+    objects = ClientSummaryManager()
+
+    def __str__(self):
+        return f'{self.client}: {self.invoice_count} invoices, {self.total_billed} billed'
+
+
+class RevenueRollupManager(models.Manager):
+    # Like ClientSummary, kept up to date with deltas and rebuilt in bulk
+
+    def add_invoice(self, user_id, client_id, invoice_date, revenue, count=1):
+        period = invoice_date.replace(day=1)
+        rollups = self.filter(user_id=user_id, client_id=client_id, period=period)
+        updated = rollups.update(
+            invoice_count=F('invoice_count') + count,
+            revenue=F('revenue') + revenue,
+        )
+        if updated or count < 0:
+            return
+        try:
+            with transaction.atomic():
+                self.create(user_id=user_id, client_id=client_id, period=period,
+                            invoice_count=count, revenue=revenue)
+        except IntegrityError:
+            # Created by a concurrent save in the meantime
+            rollups.update(
+                invoice_count=F('invoice_count') + count,
+                revenue=F('revenue') + revenue,
+            )
+
+    def add_invoices(self, figures):
+        """
+        Add new invoices to many rollups at once, from {(user_id, client_id,
+        period): (count, revenue)}. Like ClientSummary.objects.add_invoices(),
+        the affected rollups are replaced rather than updated row by row.
+        """
+        with transaction.atomic(using=self.db):
+            existing = self.select_for_update().filter(
+                client_id__in={client_id for user_id, client_id, period in figures},
+                period__in={period for user_id, client_id, period in figures},
+            )
+            rollups = {(rollup.user_id, rollup.client_id, rollup.period): rollup for rollup in existing}
+            for (user_id, client_id, period), (count, revenue) in figures.items():
+                rollup = rollups.get((user_id, client_id, period))
+                if rollup is None:
+                    rollups[user_id, client_id, period] = RevenueRollup(
+                        user_id=user_id, client_id=client_id, period=period, invoice_count=count, revenue=revenue,
+                    )
+                else:
+                    rollup.invoice_count += count
+                    rollup.revenue += revenue
+            self.filter(pk__in=[rollup.pk for rollup in existing]).delete()
+            self.bulk_create([
+                RevenueRollup(user_id=user_id, client_id=client_id, period=period,
+                              invoice_count=rollup.invoice_count, revenue=rollup.revenue)
+                for (user_id, client_id, period), rollup in rollups.items()
+            ])
+
+    def remove_invoice(self, user_id, client_id, invoice_date, revenue):
+        self.add_invoice(user_id, client_id, invoice_date, -revenue, count=-1)
+        # Don't leave empty months behind
+        self.filter(user_id=user_id, client_id=client_id, period=invoice_date.replace(day=1),
+                    invoice_count__lte=0).delete()
+
+    def rebuild(self, client_ids=None):
+        """Recompute the rollups from the invoices, for all clients or the given ones"""
+        invoices = Invoice.objects.all()
+        rollups = self.all()
+        if client_ids is not None:
+            invoices = invoices.filter(client_id__in=client_ids)
+            rollups = rollups.filter(client_id__in=client_ids)
+        totals = invoices.order_by().annotate(period=TruncMonth('create_date')).values(
+            'user_id', 'client_id', 'period',
+        ).annotate(invoice_count=Count('pk'), revenue=Sum('base_total'))
+        with transaction.atomic():
+            rollups.delete()
+            created = self.bulk_create([RevenueRollup(**row) for row in totals])
+        return len(created)
+
+
+class RevenueRollup(models.Model):
+    # Revenue per user, client and month. Reports read these instead of
+    # scanning invoices, see invoices.reports
+    user = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.CASCADE,
+    )
+    client = models.ForeignKey(Client, on_delete=models.CASCADE)
+    period = models.DateField(help_text='First day of the month')
+    invoice_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    objects = RevenueRollupManager()
+
+    class Meta:
+        unique_together = [('user', 'client', 'period')]
+        indexes = [
+            models.Index(fields=['user', 'period']),
+        ]
+
+    def __str__(self):
+        return f'{self.client} {self.period:%Y-%m}: {self.revenue}'
+
+
+class ExchangeRate(models.Model):
+    # Units of the base currency one unit of ``currency`` is worth, replaced
+    # by the import_exchange_rates command, see invoices.currency
+    currency = models.CharField(max_length=3, unique=True)
+    rate = models.DecimalField(max_digits=14, decimal_places=6)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.currency} {self.rate}'
+
+
+def add_months(date, months):
+    """``date`` moved by ``months``, to the month's last day if it is shorter"""
+    month = date.month - 1 + months
+    year, month = date.year + month // 12, month % 12 + 1
+    return date.replace(year=year, month=month, day=min(date.day, calendar.monthrange(year, month)[1]))
+
+
+class RecurringInvoiceQuerySet(models.QuerySet):
+
+    def due(self, date):
+        """Active recurring invoices with a cycle to bill on or before ``date``"""
+        return self.filter(active=True, next_date__lte=date).filter(
+            Q(end_date__isnull=True) | Q(next_date__lte=F('end_date'))
+        )
+
+    def create_from_invoice(self, invoice, interval_months, start_date=None, end_date=None):
+        """
+        Bill ``invoice``'s client for the same items every ``interval_months``,
+        from ``start_date`` or one interval after the invoice by default
+        """
+        with transaction.atomic(using=self.db):
+            recurring = self.create(
+                user_id=invoice.user_id, client_id=invoice.client_id, title=invoice.title,
+                interval_months=interval_months, end_date=end_date,
+                start_date=start_date or add_months(invoice.create_date, interval_months),
+            )
+            RecurringInvoiceItem.objects.bulk_create([
+                RecurringInvoiceItem(recurring_invoice=recurring, item=item.item, quantity=item.quantity,
+                                     rate=item.rate, tax=item.tax)
+                for item in invoice.items.order_by('pk')
+            ])
+        return recurring
+
+
+class RecurringInvoice(models.Model):
+    # Invoice template billed every interval, see invoices.billing
+    MONTHLY = 1
+    QUARTERLY = 3
+    YEARLY = 12
+    INTERVAL_CHOICES = [
+        (MONTHLY, 'Monthly'),
+        (QUARTERLY, 'Quarterly'),
+        (YEARLY, 'Yearly'),
+    ]
+
+    user = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.CASCADE,
+    )
+    client = models.ForeignKey(Client, related_name='recurring_invoices', on_delete=models.CASCADE)
+    title = models.CharField(max_length=200)
+    interval_months = models.PositiveSmallIntegerField(choices=INTERVAL_CHOICES, default=MONTHLY)
+    start_date = models.DateField(help_text='Date of the first invoice')
+    end_date = models.DateField(null=True, blank=True, help_text='No invoices after this date')
+    active = models.BooleanField(default=True)
+    # Cycles invoiced so far, the next one is due on next_date
+    billed_cycles = models.PositiveIntegerField(default=0, editable=False)
+    next_date = models.DateField(editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = RecurringInvoiceQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['active', 'next_date']),
+        ]
+
+    def __str__(self):
+        return f'{self.title} - {self.get_interval_months_display()} from {self.start_date}'
+
+    def __repr__(self):
+        return f'<RecurringInvoice: {self.client} - {self.title}>'
+
+    def cycle_date(self, cycle):
+        # Counted from the start date so short months don't shift later cycles
+        return add_months(self.start_date, cycle * self.interval_months)
+
+    def save(self, *args, **kwargs):
+        self.next_date = self.cycle_date(self.billed_cycles)
         super().save(*args, **kwargs)
 
 
+class RecurringInvoiceItem(ItemAmountsMixin, models.Model):
+    # Line item copied onto every invoice of its recurring invoice
+    recurring_invoice = models.ForeignKey(RecurringInvoice, related_name='items', on_delete=models.CASCADE)
+    item = models.CharField(max_length=200)
+    quantity = models.IntegerField(default=0)
+    rate = models.DecimalField(max_digits=6, decimal_places=2)
+    tax = models.DecimalField(max_digits=6, decimal_places=2, default=0)  # Percentage of the subtotal
+
+    def __str__(self):
+        return f'{self.item} - {self.quantity} x {self.rate}'
 
+    def to_invoice_item(self, invoice_id=None):
+        return InvoiceItem(invoice_id=invoice_id, item=self.item, quantity=self.quantity, rate=self.rate, tax=self.tax)
@@ -0,0 +1,84 @@
+"""
+Migration operations for the SQL objects the models don't declare.
+
+Migration 0007 attaches the search triggers to invoices_invoice,
+invoices_client and invoices_invoiceitem, and 0008 adds expression indexes
+to invoices_client. SQLite applies most AddField and every AlterField by
+copying the table into a new one, which silently drops both. Wrap such
+operations in PreserveSQLObjects so they are dropped first and created
+again afterwards:
+
+    operations = [
+        PreserveSQLObjects(
+            migrations.AlterField(...),
+        ),
+    ]
+"""
+import importlib
+
+from django.db.migrations.operations.base import Operation
+
+
+search_index = importlib.import_module('invoices.migrations.0007_invoice_search')
+autocomplete_indexes = importlib.import_module('invoices.migrations.0008_client_autocomplete_indexes')
+
+SEARCH_TRIGGERS = [statement.split()[2] for statement in search_index.TRIGGERS]
+
+DROP_SQL = [
+    *(f'DROP TRIGGER IF EXISTS {name}' for name in SEARCH_TRIGGERS),
+    *(f'DROP INDEX IF EXISTS {name}' for name in autocomplete_indexes.INDEXES),
+]
+CREATE_SQL = [
+    *search_index.TRIGGERS,
+    *(f'CREATE INDEX {name} ON invoices_client ({columns})'
+      for name, columns in autocomplete_indexes.INDEXES.items()),
+]
+
+
+class PreserveSQLObjects(Operation):
+    """Runs ``operations`` without the search triggers and autocomplete indexes"""
+
+    reduces_to_sql = True
+    reversible = True
+
+    def __init__(self, *operations):
+        self.operations = operations
+
+    def deconstruct(self):
+        return self.__class__.__name__, self.operations, {}
+
+    def state_forwards(self, app_label, state):
+        for operation in self.operations:
+            operation.state_forwards(app_label, state)
+
+    def execute(self, schema_editor, statements):
+        if schema_editor.connection.vendor == 'sqlite':
+            for statement in statements:
+                schema_editor.execute(statement)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        self.execute(schema_editor, DROP_SQL)
+        for operation in self.operations:
+            to_state = from_state.clone()
+            operation.state_forwards(app_label, to_state)
+            operation.database_forwards(app_label, schema_editor, from_state, to_state)
+            from_state = to_state
+        self.execute(schema_editor, CREATE_SQL)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        # The state before each operation, as in SeparateDatabaseAndState
+        states = []
+        for operation in self.operations:
+            states.append(to_state)
+            to_state = to_state.clone()
+            operation.state_forwards(app_label, to_state)
+        self.execute(schema_editor, DROP_SQL)
+        for operation, before in zip(reversed(self.operations), reversed(states)):
+            operation.database_backwards(app_label, schema_editor, to_state, before)
+            to_state = before
+        self.execute(schema_editor, CREATE_SQL)
+
+    def describe(self):
+        return 'Keep the search triggers and autocomplete indexes across: ' + '; '.join(
+            operation.describe() for operation in self.operations
+        )
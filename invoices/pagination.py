@@ -0,0 +1,70 @@
+class KeysetPage:
+    """One page of rows ordered by descending id, addressed by id cursors"""
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def is_first(self):
+        return not self.has_previous
+
+    @property
+    def next_cursor(self):
+        return self.object_list[-1].pk if self.has_next else None
+
+    @property
+    def previous_cursor(self):
+        return self.object_list[0].pk if self.has_previous else None
+
+
+def keyset_paginate(queryset, page_size, after=None, before=None):
+    """
+    Fetch the page of ``queryset`` after (older than) or before (newer than)
+    the given ids, newest first.
+
+    Unlike offset pagination this neither counts the rows nor skips over
+    them, so every page costs one indexed range query of page_size + 1 rows.
+    """
+    if before is not None:
+        rows = list(queryset.filter(pk__gt=before).order_by('pk')[:page_size + 1])
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        return KeysetPage(rows, has_next=bool(rows), has_previous=has_previous)
+
+    queryset = queryset.order_by('-pk')
+    if after is not None:
+        queryset = queryset.filter(pk__lt=after)
+    rows = list(queryset[:page_size + 1])
+    return KeysetPage(rows[:page_size], has_next=len(rows) > page_size,
+                      has_previous=after is not None)
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin that replaces offset pagination with keyset pagination.
+
+    Pages are addressed with ``?after=<id>`` and ``?before=<id>``; the
+    template gets the KeysetPage as ``page_obj``.
+    """
+    paginate_by = 25
+
+    def get_cursor(self, name):
+        try:
+            return int(self.request.GET[name])
+        except (KeyError, ValueError):
+            return None
+
+    def paginate_queryset(self, queryset, page_size):
+        page = keyset_paginate(
+            queryset, page_size,
+            after=self.get_cursor('after'), before=self.get_cursor('before'),
+        )
+        return (None, page, page.object_list, page.has_next or page.has_previous)
@@ -0,0 +1,335 @@
+import csv
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+import time
+import zipfile
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.template.loader import render_to_string
+
+from weasyprint import CSS, HTML
+from weasyprint.fonts import FontConfiguration
+
+from .models import Invoice, InvoiceItem
+from .pdf_assets import fetch_local_url
+from .pdf_cache import get_pdf_cache, invoice_digest, template_version
+from .pdf_reportlab import UnsupportedText, draw_invoice_pdf, layout_version
+
+
+INVOICE_TEMPLATE = 'pdf/html-invoice.html'
+INVOICE_STYLESHEET = 'css/invoice-pdf.css'
+
+# Values of settings.PDF_ENGINE
+WEASYPRINT = 'weasyprint'
+REPORTLAB = 'reportlab'
+PDF_ENGINES = [WEASYPRINT, REPORTLAB]
+
+ExportResult = namedtuple(
+    'ExportResult', ['invoice_id', 'filename', 'pdf', 'seconds', 'error'],
+)
+
+
+def get_pdf_engine():
+    """
+    How invoices are rendered: 'weasyprint' lays out the HTML template,
+    'reportlab' draws the same page directly, which is much faster
+    """
+    engine = getattr(settings, 'PDF_ENGINE', WEASYPRINT)
+    if engine not in PDF_ENGINES:
+        raise ImproperlyConfigured(f'PDF_ENGINE must be one of {", ".join(PDF_ENGINES)}, not {engine!r}')
+    return engine
+
+
+def invoice_pdf_filename(invoice_id):
+    return f'invoice_{invoice_id}.pdf'
+
+
+def get_invoice_context(invoice, invoice_items=None):
+    """Template context shared by the single and bulk PDF renders"""
+    if invoice_items is None:
+        invoice_items = InvoiceItem.objects.filter(invoice=invoice)
+    return {
+        "invoice": invoice,
+        "client": invoice.client,
+        "user": invoice.user,
+        "invoice_items": invoice_items,
+    }
+
+
+RenderResources = namedtuple('RenderResources', ['stylesheets', 'font_config', 'version'])
+
+_render_resources = None
+_render_resources_lock = threading.Lock()
+
+
+def load_render_resources():
+    """
+    Parse the invoice stylesheet against a fresh font configuration.
+
+    This is the expensive, invoice-independent part of a render. Use
+    get_render_resources() to share one copy across the renders of a worker.
+    """
+    path = finders.find(INVOICE_STYLESHEET)
+    if path is None:
+        raise ImproperlyConfigured(f'Invoice stylesheet {INVOICE_STYLESHEET} not found')
+    with open(path) as f:
+        source = f.read()
+    font_config = FontConfiguration()
+    stylesheet = CSS(string=source, font_config=font_config)
+    version = hashlib.sha256(source.encode()).hexdigest()
+    return RenderResources([stylesheet], font_config, version)
+
+
+def get_render_resources():
+    global _render_resources
+    if _render_resources is None:
+        with _render_resources_lock:
+            if _render_resources is None:
+                _render_resources = load_render_resources()
+    return _render_resources
+
+
+def warm_pdf_renderer():
+    """Load the shared render resources and lay out a page to warm the font caches"""
+    if get_pdf_engine() == REPORTLAB:
+        return
+    resources = get_render_resources()
+    HTML(string='<p>warm-up</p>', url_fetcher=fetch_local_url).write_pdf(
+        stylesheets=resources.stylesheets, font_config=resources.font_config,
+    )
+
+
+def render_invoice_pdf(invoice, base_url=None, invoice_items=None, resources=None, engine=None):
+    """Render a single invoice to PDF bytes, with the PDF_ENGINE unless ``engine`` is given"""
+    context = get_invoice_context(invoice, invoice_items)
+    if (engine or get_pdf_engine()) == REPORTLAB:
+        try:
+            return draw_invoice_pdf(context)
+        except UnsupportedText:
+            # WeasyPrint finds a font for every script the system has one for
+            pass
+    if resources is None:
+        resources = get_render_resources()
+    html_template = render_to_string(INVOICE_TEMPLATE, context)
+    return HTML(string=html_template, base_url=base_url, url_fetcher=fetch_local_url).write_pdf(
+        stylesheets=resources.stylesheets, font_config=resources.font_config,
+    )
+
+
+def render_version():
+    """Digest of the engine and layout every invoice PDF is rendered with"""
+    if get_pdf_engine() == REPORTLAB:
+        parts = REPORTLAB + layout_version()
+    else:
+        parts = template_version(INVOICE_TEMPLATE) + get_render_resources().version
+    return hashlib.sha256(parts.encode()).hexdigest()
+
+
+def get_invoice_pdf(invoice, base_url=None, invoice_items=None):
+    """
+    Return the invoice PDF, reusing the cached render if nothing changed.
+    ``invoice_items``, in id order, saves the query when already loaded.
+    """
+    cache = get_pdf_cache()
+    if cache is None:
+        return render_invoice_pdf(invoice, base_url=base_url, invoice_items=invoice_items)
+
+    if invoice_items is None:
+        invoice_items = list(InvoiceItem.objects.filter(invoice=invoice).order_by('id'))
+    key = invoice_digest(invoice, invoice_items, INVOICE_TEMPLATE, extra=[render_version()])
+    pdf = cache.get(invoice.pk, key)
+    if pdf is None:
+        pdf = render_invoice_pdf(invoice, base_url=base_url, invoice_items=invoice_items)
+        cache.set(invoice.pk, key, pdf)
+    return pdf
+
+
+def filter_invoices(queryset, client=None, start_date=None, end_date=None):
+    if client is not None:
+        queryset = queryset.filter(client=client)
+    if start_date is not None:
+        queryset = queryset.filter(create_date__gte=start_date)
+    if end_date is not None:
+        queryset = queryset.filter(create_date__lte=end_date)
+    return queryset
+
+
+def get_export_workers():
+    workers = getattr(settings, 'PDF_EXPORT_WORKERS', None)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def init_render_worker():
+    # Forked workers must not share the parent's database connections,
+    # spawned ones need the app registry set up first.
+    django.setup()
+    connections.close_all()
+    warm_pdf_renderer()
+
+
+def render_invoice_job(invoice_id, base_url=None):
+    started = time.perf_counter()
+    filename = invoice_pdf_filename(invoice_id)
+    try:
+        invoice = Invoice.objects.select_related('client', 'user').get(pk=invoice_id)
+        pdf = get_invoice_pdf(invoice, base_url=base_url)
+    except Exception as e:
+        return ExportResult(invoice_id, filename, None,
+                            time.perf_counter() - started, repr(e))
+    return ExportResult(invoice_id, filename, pdf,
+                        time.perf_counter() - started, None)
+
+
+_render_pool = None
+_render_pool_size = 0
+_render_pool_lock = threading.Lock()
+
+
+def get_render_pool(workers=None):
+    """
+    The shared process pool renders are handed to, or None when they run
+    in-process. It has PDF_RENDER_WORKERS processes, or ``workers`` when a
+    command starts it before anything else has.
+    """
+    global _render_pool, _render_pool_size
+    if _render_pool is None:
+        workers = workers or getattr(settings, 'PDF_RENDER_WORKERS', None)
+        if not workers:
+            return None
+        with _render_pool_lock:
+            if _render_pool is None:
+                # Spawned, forking a server full of threads is not safe. The
+                # initializer can't live in this module, which a fresh
+                # process can only import once Django is set up.
+                _render_pool = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                    initializer=django.setup,
+                )
+                _render_pool_size = workers
+                for _ in range(workers):
+                    _render_pool.submit(warm_pdf_renderer)
+    return _render_pool
+
+
+def shutdown_render_pool():
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is not None:
+            _render_pool.shutdown()
+            _render_pool = None
+
+
+def get_invoice_pdf_pooled(invoice, base_url=None):
+    """
+    get_invoice_pdf(), run in the render pool when there is one.
+
+    The calling thread only waits for the result, the render itself happens
+    in another process so it neither holds the GIL nor counts against the
+    web server's threads.
+    """
+    pool = get_render_pool()
+    if pool is None:
+        return get_invoice_pdf(invoice, base_url=base_url)
+    try:
+        result = pool.submit(render_invoice_job, invoice.pk, base_url).result()
+    except BrokenProcessPool:
+        # A worker died, start over with a fresh pool next time
+        shutdown_render_pool()
+        raise
+    if result.error is not None:
+        raise RuntimeError(f'Rendering invoice {invoice.pk} failed: {result.error}')
+    return result.pdf
+
+
+def render_invoices(invoice_ids, base_url=None, workers=None):
+    """
+    Render invoices, yielding an ExportResult per invoice in the given order.
+
+    The renders are handed to the shared render pool (see get_render_pool())
+    when there is one, otherwise, or with ``workers=1``, they run in the
+    current process. At most two renders per pool process are in flight, so
+    finished PDFs don't pile up in memory ahead of a slow consumer.
+    """
+    invoice_ids = list(invoice_ids)
+    in_process = (workers is not None and workers <= 1) or len(invoice_ids) <= 1
+    pool = None if in_process else get_render_pool(workers)
+    if pool is None:
+        for invoice_id in invoice_ids:
+            yield render_invoice_job(invoice_id, base_url)
+        return
+
+    window = 2 * _render_pool_size
+    pending = deque()
+    try:
+        for invoice_id in invoice_ids:
+            pending.append(pool.submit(render_invoice_job, invoice_id, base_url))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    except BrokenProcessPool:
+        # A worker died, start over with a fresh pool next time
+        shutdown_render_pool()
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+class _ZipStream:
+    """Write-only file object that hands back whatever was written to it"""
+
+    def __init__(self):
+        self._buffer = io.BytesIO()
+
+    def write(self, data):
+        return self._buffer.write(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+
+EXPORT_REPORT_FILENAME = 'export-report.csv'
+
+
+def stream_invoices_zip(invoice_ids, base_url=None, workers=None, on_result=None):
+    """
+    Yield a ZIP archive of invoice PDFs chunk by chunk as renders complete.
+
+    The archive ends with a CSV report of per-invoice render times and
+    failures. ``on_result`` is called with every ExportResult.
+    """
+    stream = _ZipStream()
+    report = io.StringIO()
+    writer = csv.writer(report)
+    writer.writerow(['invoice_id', 'filename', 'seconds', 'error'])
+
+    with zipfile.ZipFile(stream, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for result in render_invoices(invoice_ids, base_url=base_url, workers=workers):
+            if on_result is not None:
+                on_result(result)
+            writer.writerow([result.invoice_id, result.filename,
+                             f'{result.seconds:.3f}', result.error or ''])
+            if result.pdf is not None:
+                archive.writestr(result.filename, result.pdf)
+                yield stream.pop()
+        archive.writestr(EXPORT_REPORT_FILENAME, report.getvalue())
+    yield stream.pop()
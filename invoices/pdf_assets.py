@@ -0,0 +1,132 @@
+"""
+URL fetcher for WeasyPrint renders.
+
+Invoice templates link their images and stylesheets with {% static %} and
+media URLs, which WeasyPrint would otherwise download from this very server
+in the middle of a render. fetch_local_url() reads them from the static
+files finders (STATICFILES_DIRS and the apps' static directories) and from
+the media storage instead, whatever host the URL names, and refuses every
+other URL so a render never goes out to the network.
+
+Assets are kept in memory once read, up to PDF_ASSET_CACHE_MAX_BYTES per
+process. Media files are cached along with their modification time, so a
+replaced upload is read again.
+"""
+import mimetypes
+import posixpath
+import threading
+from collections import OrderedDict, namedtuple
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+
+from weasyprint import default_url_fetcher
+
+
+Asset = namedtuple('Asset', ['data', 'mime_type', 'version'])
+
+
+class AssetNotFound(ValueError):
+    # WeasyPrint logs fetcher errors and renders without the asset
+    pass
+
+
+class AssetCache:
+    """Assets by URL path, least recently used evicted past ``max_bytes``"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._assets = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        with self._lock:
+            asset = self._assets.get(path)
+            if asset is not None:
+                self._assets.move_to_end(path)
+            return asset
+
+    def set(self, path, asset):
+        if len(asset.data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._assets.pop(path, None)
+            if previous is not None:
+                self._bytes -= len(previous.data)
+            self._assets[path] = asset
+            self._bytes += len(asset.data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._assets.popitem(last=False)
+                self._bytes -= len(evicted.data)
+
+    def clear(self):
+        with self._lock:
+            self._assets.clear()
+            self._bytes = 0
+
+
+asset_cache = AssetCache(getattr(settings, 'PDF_ASSET_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+
+def relative_path(path, prefix):
+    """``path`` below the URL ``prefix``, or None when it isn't under it"""
+    if not prefix or not path.startswith(prefix):
+        return None
+    name = posixpath.normpath(unquote(path[len(prefix):]))
+    if name.startswith(('..', '/')) or name == '.':
+        raise AssetNotFound(path)
+    return name
+
+
+def read_static(name):
+    location = finders.find(name)
+    if location is None:
+        raise AssetNotFound(name)
+    with open(location, 'rb') as f:
+        return f.read()
+
+
+def media_version(name):
+    try:
+        return default_storage.get_modified_time(name)
+    except (OSError, NotImplementedError):
+        raise AssetNotFound(name)
+
+
+def read_media(name):
+    try:
+        with default_storage.open(name) as f:
+            return f.read()
+    except OSError:
+        raise AssetNotFound(name)
+
+
+def fetch_local_url(url, timeout=10, ssl_context=None):
+    """WeasyPrint url_fetcher that serves static and media URLs from disk"""
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https', 'file', ''):
+        if parts.scheme == 'data':
+            # Inline data, nothing to fetch
+            return default_url_fetcher(url)
+        raise AssetNotFound(url)
+
+    try:
+        static_name = relative_path(parts.path, settings.STATIC_URL)
+        media_name = None if static_name is not None else relative_path(parts.path, settings.MEDIA_URL)
+        if static_name is None and media_name is None:
+            raise AssetNotFound(f'Refusing to fetch {url}, only static and media files are available to renders')
+
+        version = None if media_name is None else media_version(media_name)
+        asset = asset_cache.get(parts.path)
+        if asset is None or asset.version != version:
+            data = read_static(static_name) if media_name is None else read_media(media_name)
+            mime_type = mimetypes.guess_type(parts.path)[0] or 'application/octet-stream'
+            asset = Asset(data, mime_type, version)
+            asset_cache.set(parts.path, asset)
+    except SuspiciousFileOperation:
+        raise AssetNotFound(url)
+    return {'string': asset.data, 'mime_type': asset.mime_type, 'redirected_url': url}
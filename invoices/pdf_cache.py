@@ -0,0 +1,187 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.template.loader import get_template
+
+
+@lru_cache(maxsize=None)
+def template_version(template_name):
+    """Digest of a template's source, so template edits invalidate cached PDFs"""
+    source = get_template(template_name).template.source
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def issuer_parts(user):
+    """The issuing user's details an invoice PDF shows"""
+    return [user.pk, user.username, user.email, user.first_name, user.last_name]
+
+
+def invoice_digest(invoice, invoice_items, template_name, extra=()):
+    """
+    Content address of a rendered invoice.
+
+    Covers every value the PDF template can show: the invoice, its items,
+    the client, the issuing user and the template itself.
+    """
+    client = invoice.client
+    parts = [
+        template_version(template_name),
+        invoice.pk, invoice.title, invoice.create_date,
+        invoice.currency, invoice.net_total, invoice.tax_total, invoice.invoice_total,
+        client.pk, client.first_name, client.last_name, client.email,
+        client.company, client.address1, client.address2, client.country,
+        client.phone_number,
+        *issuer_parts(invoice.user),
+    ]
+    for item in invoice_items:
+        parts.extend([item.pk, item.item, item.quantity, item.rate, item.tax])
+    parts.extend(extra)
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+class PdfCache:
+    """
+    Size-bounded on-disk cache of rendered invoice PDFs.
+
+    Entries live at ``<directory>/<invoice id>/<digest>.pdf`` so that all the
+    renders of one invoice can be dropped together. A file's mtime is bumped
+    on every hit and the least recently used files are evicted first.
+
+    The cache keeps a running total of its size rather than listing the
+    directory on every write. Other processes write to the same directory,
+    so the total is recounted when it goes over ``max_bytes``, before
+    anything is evicted, and at least every ``rescan_interval`` seconds.
+    """
+    rescan_interval = 60
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total = None
+        self._scanned_at = 0
+
+    def path(self, invoice_id, key):
+        return os.path.join(self.directory, str(invoice_id), f'{key}.pdf')
+
+    def get(self, invoice_id, key):
+        path = self.path(invoice_id, key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def set(self, invoice_id, key, data):
+        path = self.path(invoice_id, key)
+        invoice_dir = os.path.dirname(path)
+        while True:
+            os.makedirs(invoice_dir, exist_ok=True)
+            try:
+                # Write to a temporary file first so readers never see partial PDFs
+                fd, tmp_path = tempfile.mkstemp(dir=invoice_dir, suffix='.tmp')
+                break
+            except FileNotFoundError:
+                # Removed as empty by an eviction in between
+                continue
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        replaced = self._size(path)
+        os.replace(tmp_path, path)
+        self._grow(len(data) - replaced)
+
+    def invalidate(self, invoice_ids):
+        for invoice_id in invoice_ids:
+            invoice_dir = os.path.join(self.directory, str(invoice_id))
+            try:
+                entries = list(os.scandir(invoice_dir))
+            except FileNotFoundError:
+                continue
+            freed = 0
+            for entry in entries:
+                freed += self._size(entry.path)
+                self._remove(entry.path)
+            self._remove_dir(invoice_dir)
+            self._grow(-freed)
+
+    def entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for invoice_dir in os.scandir(self.directory):
+            if not invoice_dir.is_dir():
+                continue
+            for entry in os.scandir(invoice_dir.path):
+                if entry.name.endswith('.pdf'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _grow(self, delta):
+        with self._lock:
+            if self._total is not None:
+                self._total += delta
+            if delta <= 0:
+                return
+            stale = self._total is None or time.monotonic() - self._scanned_at > self.rescan_interval
+            if stale or self._total > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """Recount the cache and drop the least recently used entries over ``max_bytes``"""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            self._remove_dir(os.path.dirname(path))
+            total -= size
+        self._total = total
+        self._scanned_at = time.monotonic()
+
+    def _size(self, path):
+        try:
+            return os.stat(path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _remove_dir(self, path):
+        # Only succeeds once the invoice's last entry is gone
+        try:
+            os.rmdir(path)
+        except OSError:
+            pass
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_pdf_cache():
+    """The configured PDF cache, or None when PDF_CACHE_DIR is unset"""
+    directory = getattr(settings, 'PDF_CACHE_DIR', None)
+    if not directory:
+        return None
+    # One per process, so its running total is shared
+    options = (directory, getattr(settings, 'PDF_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    with _caches_lock:
+        if options not in _caches:
+            _caches[options] = PdfCache(*options)
+        return _caches[options]
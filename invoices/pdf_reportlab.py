@@ -0,0 +1,314 @@
+"""
+Invoice PDFs drawn directly with ReportLab.
+
+An alternative to laying out pdf/html-invoice.html with WeasyPrint, chosen
+with settings.PDF_ENGINE. The page follows the template and its stylesheet:
+the dark header bar, the issuer and logo, the client and invoice details,
+the item table, the totals and the terms. Every value is formatted the way
+the template formats it, from the same context (see pdf.get_invoice_context),
+so both engines show the same text. Item rows that don't fit continue on the
+next page under a repeated table header.
+
+The TrueType fonts of settings.PDF_REPORTLAB_FONTS stand in for the
+stylesheet's Georgia and Helvetica, or the standard PDF fonts, which cover
+Latin-1 only, when they can't be found. Text the fonts have no glyphs for
+raises UnsupportedText rather than being drawn as the wrong characters, and
+pdf.render_invoice_pdf() hands such invoices to WeasyPrint instead.
+"""
+import hashlib
+import io
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.formats import localize
+
+from reportlab.lib.colors import HexColor, black, white
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader, simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+from reportlab.pdfgen.canvas import Canvas
+
+from .pdf_assets import AssetNotFound, fetch_local_url
+
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 1 * cm
+LEFT, RIGHT = MARGIN, PAGE_WIDTH - MARGIN
+TOP, BOTTOM = PAGE_HEIGHT - MARGIN, MARGIN
+
+# The stylesheet's sizes in CSS pixels, 0.75pt each
+FONT_SIZE = 10.5
+LEADING = FONT_SIZE * 1.4
+PADDING = 3.75
+ROW_HEIGHT = LEADING + 2 * PADDING
+GREY = HexColor('#eeeeee')
+HEADER_GREY = HexColor('#222222')
+
+LOGO = 'img/logo2.png'
+LOGO_HEIGHT = 60
+
+# Item table columns: item name, rate, quantity, total
+COLUMNS = [0.40, 0.20, 0.20, 0.20]
+COLUMN_X = [LEFT + (RIGHT - LEFT) * sum(COLUMNS[:i]) for i in range(len(COLUMNS) + 1)]
+
+
+# body, bold and heading are font names, covers(text) tells whether they
+# have a glyph for every character of the text
+Fonts = namedtuple('Fonts', ['body', 'bold', 'heading', 'covers'])
+
+
+class UnsupportedText(Exception):
+    """Text the fonts have no glyphs for"""
+
+
+def covers_win_ansi(text):
+    # The encoding ReportLab uses for the standard fonts
+    try:
+        text.encode('cp1252')
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+STANDARD_FONTS = Fonts('Times-Roman', 'Times-Bold', 'Helvetica-Bold', covers_win_ansi)
+
+
+@lru_cache(maxsize=None)
+def load_fonts(regular, bold):
+    """
+    Register the TrueType files, names or paths on ReportLab's TTFSearchPath,
+    falling back to the standard fonts when either can't be loaded
+    """
+    try:
+        faces = [TTFont(os.path.splitext(os.path.basename(path))[0], path) for path in (regular, bold)]
+    except TTFError:
+        return STANDARD_FONTS
+    for face in faces:
+        pdfmetrics.registerFont(face)
+    glyphs = set(faces[0].face.charToGlyph).intersection(faces[1].face.charToGlyph)
+
+    def covers(text):
+        return all(ord(char) in glyphs for char in text)
+
+    return Fonts(faces[0].fontName, faces[1].fontName, faces[1].fontName, covers)
+
+
+def get_fonts():
+    return load_fonts(*getattr(settings, 'PDF_REPORTLAB_FONTS', ('DejaVuSans.ttf', 'DejaVuSans-Bold.ttf')))
+
+
+@lru_cache(maxsize=None)
+def module_digest():
+    with open(__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def layout_version():
+    """Digest of this module and its fonts, so layout changes invalidate cached PDFs"""
+    fonts = get_fonts()
+    return hashlib.sha256(f'{module_digest()}:{fonts.body}:{fonts.bold}'.encode()).hexdigest()
+
+
+@lru_cache(maxsize=8)
+def decode_image(data):
+    return ImageReader(io.BytesIO(data))
+
+
+def load_logo():
+    try:
+        return decode_image(fetch_local_url(static(LOGO))['string'])
+    except (AssetNotFound, OSError):
+        return None
+
+
+class InvoiceCanvas:
+    """Draws one invoice top to bottom, ``y`` being the top of what comes next"""
+
+    def __init__(self, target, context):
+        self.canvas = Canvas(target, pagesize=A4)
+        self.canvas.setTitle('Invoice')
+        self.context = context
+        self.fonts = get_fonts()
+        self.currency = context['invoice'].currency
+        self.y = TOP
+        # Where the item table starts on the current page
+        self.table_top = TOP
+
+    def text(self, x, y, value, font=None, size=FONT_SIZE, align='left', color=black):
+        if not self.fonts.covers(value):
+            raise UnsupportedText(value)
+        self.canvas.setFont(font or self.fonts.body, size)
+        self.canvas.setFillColor(color)
+        if align == 'center':
+            self.canvas.drawCentredString(x, y, value)
+        elif align == 'right':
+            self.canvas.drawRightString(x, y, value)
+        else:
+            self.canvas.drawString(x, y, value)
+
+    def spaced_heading(self, y, value, size, spacing, color):
+        # letter-spacing as in the stylesheet, centred on the page
+        width = self.canvas.stringWidth(value, self.fonts.heading, size) + spacing * len(value)
+        text = self.canvas.beginText((PAGE_WIDTH - width) / 2 + spacing / 2, y)
+        text.setFont(self.fonts.heading, size)
+        text.setCharSpace(spacing)
+        text.setFillColor(color)
+        text.textOut(value)
+        self.canvas.drawText(text)
+
+    def money(self, amount):
+        return f'{self.currency} {localize(amount)}'
+
+    def new_page(self):
+        self.canvas.showPage()
+        self.y = TOP
+
+    def draw(self):
+        self.draw_header()
+        self.draw_identity()
+        self.draw_customer()
+        self.draw_items()
+        self.draw_totals()
+        self.draw_terms()
+        self.canvas.save()
+
+    def draw_header(self):
+        top = self.y - 15
+        height = 11.25 + 12
+        self.canvas.setFillColor(HEADER_GREY)
+        self.canvas.rect(LEFT, top - height, RIGHT - LEFT, height, stroke=0, fill=1)
+        self.spaced_heading(top - height + 8, 'INVOICE', 11.25, 15, white)
+        self.y = top - height - 15
+
+    def draw_identity(self):
+        lines = [str(self.context['user']), '123 Appleville Street', 'Appleville', '', 'Phone: 123-456-789']
+        for i, line in enumerate(lines):
+            self.text(LEFT, self.y - LEADING * (i + 1) + 3, line)
+        height = LEADING * len(lines)
+        logo = load_logo()
+        if logo is not None:
+            width, image_height = logo.getSize()
+            logo_width = LOGO_HEIGHT * width / image_height
+            self.canvas.drawImage(logo, RIGHT - logo_width, self.y - 7.5 - LOGO_HEIGHT,
+                                  logo_width, LOGO_HEIGHT, mask='auto')
+            height = max(height, 7.5 + LOGO_HEIGHT)
+        self.y -= height
+
+    def draw_customer(self):
+        client, invoice = self.context['client'], self.context['invoice']
+        top = self.y - 2 * LEADING
+        title = [client.company, f'c/o {client.first_name} {client.last_name}']
+        for i, line in enumerate(title):
+            self.text(LEFT, top - 18.75 * (i + 1) + 4, line, font=self.fonts.bold, size=15)
+
+        meta = [
+            ('Invoice #', str(invoice.pk)),
+            ('Date', localize(invoice.create_date)),
+            ('Amount Due', self.money(invoice.invoice_total)),
+        ]
+        meta_left, label_width = RIGHT - 225, 90
+        for i, (label, value) in enumerate(meta):
+            row_top = top - i * ROW_HEIGHT
+            self.canvas.setFillColor(GREY)
+            self.canvas.rect(meta_left, row_top - ROW_HEIGHT, label_width, ROW_HEIGHT, stroke=0, fill=1)
+            self.canvas.setStrokeColor(black)
+            self.canvas.rect(meta_left, row_top - ROW_HEIGHT, label_width, ROW_HEIGHT)
+            self.canvas.rect(meta_left + label_width, row_top - ROW_HEIGHT, 225 - label_width, ROW_HEIGHT)
+            baseline = row_top - PADDING - FONT_SIZE
+            self.text(meta_left + PADDING, baseline, label)
+            self.text((meta_left + label_width + RIGHT) / 2, baseline, value, align='center')
+        self.y = top - max(2 * 18.75, len(meta) * ROW_HEIGHT)
+
+    def draw_table_header(self):
+        self.canvas.setFillColor(GREY)
+        self.canvas.rect(LEFT, self.y - ROW_HEIGHT, RIGHT - LEFT, ROW_HEIGHT, stroke=0, fill=1)
+        for x in COLUMN_X:
+            self.canvas.line(x, self.y, x, self.y - ROW_HEIGHT)
+        self.canvas.line(LEFT, self.y - ROW_HEIGHT, RIGHT, self.y - ROW_HEIGHT)
+        for i, heading in enumerate(['Item', 'Rate', 'Qty/Hours', 'Total']):
+            self.text((COLUMN_X[i] + COLUMN_X[i + 1]) / 2, self.y - PADDING - FONT_SIZE, heading,
+                      font=self.fonts.bold, align='center')
+        self.y -= ROW_HEIGHT
+
+    def close_table(self, top):
+        self.canvas.setStrokeColor(black)
+        self.canvas.rect(LEFT, self.y, RIGHT - LEFT, top - self.y)
+
+    def draw_items(self):
+        self.y -= 22.5
+        self.table_top = self.y
+        self.draw_table_header()
+        name_width = COLUMN_X[1] - COLUMN_X[0] - 2 * PADDING
+        for item in self.context['invoice_items']:
+            lines = simpleSplit(str(item.item), self.fonts.body, FONT_SIZE, name_width) or ['']
+            height = LEADING * len(lines) + 2 * PADDING
+            if self.y - height < BOTTOM:
+                self.close_table(self.table_top)
+                self.new_page()
+                self.table_top = self.y
+                self.draw_table_header()
+            baseline = self.y - PADDING - FONT_SIZE
+            for i, line in enumerate(lines):
+                self.text(COLUMN_X[0] + PADDING, baseline - i * LEADING, line)
+            values = [self.money(item.rate), localize(item.quantity), self.money(item.subtotal())]
+            for i, value in enumerate(values, start=1):
+                self.text((COLUMN_X[i] + COLUMN_X[i + 1]) / 2, baseline, value, align='center')
+            self.y -= height
+
+    def draw_totals(self):
+        invoice = self.context['invoice']
+        totals = [
+            ('Subtotal', invoice.net_total, False),
+            ('Tax', invoice.tax_total, False),
+            ('Balance Due', invoice.invoice_total, True),
+        ]
+        row_height = ROW_HEIGHT + 2 * PADDING
+        if self.y - 15 - len(totals) * row_height < BOTTOM:
+            self.close_table(self.table_top)
+            self.new_page()
+            self.table_top = self.y
+        self.y -= 15
+        for label, amount, balance in totals:
+            bottom = self.y - row_height
+            if balance:
+                self.canvas.setFillColor(GREY)
+                self.canvas.rect(COLUMN_X[2], bottom, RIGHT - COLUMN_X[2], row_height, stroke=0, fill=1)
+            self.canvas.setStrokeColor(black)
+            self.canvas.line(COLUMN_X[2], self.y, RIGHT, self.y)
+            self.canvas.line(COLUMN_X[2], bottom, RIGHT, bottom)
+            self.canvas.line(COLUMN_X[2], self.y, COLUMN_X[2], bottom)
+            baseline = self.y - row_height / 2 - FONT_SIZE / 3
+            self.text(COLUMN_X[2] + PADDING, baseline, label)
+            self.text((COLUMN_X[3] + RIGHT) / 2, baseline, self.money(amount), align='center')
+            self.y = bottom
+        self.close_table(self.table_top)
+
+    def draw_terms(self):
+        height = 15 + 9.75 + 12 + LEADING
+        if self.y - height < BOTTOM:
+            self.new_page()
+        self.y -= 15
+        self.spaced_heading(self.y - 9.75, 'TERMS', 9.75, 7.5, black)
+        self.y -= 9.75 + 6
+        self.canvas.setStrokeColor(black)
+        self.canvas.line(LEFT, self.y, RIGHT, self.y)
+        self.y -= 6
+        self.text(PAGE_WIDTH / 2, self.y - FONT_SIZE,
+                  'NET 30 Days. Finance Charge of 1.5% will be made on unpaid balances after 30 days.',
+                  align='center')
+        self.y -= LEADING
+
+
+def draw_invoice_pdf(context):
+    """
+    Invoice PDF bytes, from the context pdf/html-invoice.html is rendered
+    with. Raises UnsupportedText when the fonts can't show the invoice.
+    """
+    output = io.BytesIO()
+    InvoiceCanvas(output, context).draw()
+    return output.getvalue()
@@ -0,0 +1,53 @@
+from decimal import Decimal
+
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth, TruncQuarter
+
+from .models import RevenueRollup
+
+
+PERIODS = {
+    'month': TruncMonth,
+    'quarter': TruncQuarter,
+}
+
+CENTS = Decimal('0.01')
+
+
+def revenue_report(user, start_date=None, end_date=None, period='month', by_client=False):
+    """
+    Revenue and invoice counts of a user per month or quarter, optionally
+    broken down by client.
+
+    Answered from the monthly RevenueRollup rows, so the cost depends on the
+    number of months and clients in range, not on the number of invoices.
+    Ranges are widened to whole months.
+    """
+    rollups = RevenueRollup.objects.filter(user=user)
+    if start_date is not None:
+        rollups = rollups.filter(period__gte=start_date.replace(day=1))
+    if end_date is not None:
+        rollups = rollups.filter(period__lte=end_date)
+
+    fields = ['period_start']
+    if by_client:
+        fields += ['client_id', 'client__first_name', 'client__last_name', 'client__company']
+    rows = rollups.order_by().annotate(period_start=PERIODS[period]('period')).values(*fields).annotate(
+        invoice_count=Sum('invoice_count'), revenue=Sum('revenue'),
+    ).order_by(*fields[:2])
+
+    return [
+        {
+            'period': row['period_start'],
+            'invoice_count': row['invoice_count'],
+            'revenue': row['revenue'].quantize(CENTS),
+            **({
+                'client': {
+                    'id': row['client_id'],
+                    'name': f"{row['client__first_name']} {row['client__last_name']}",
+                    'company': row['client__company'],
+                },
+            } if by_client else {}),
+        }
+        for row in rows
+    ]
@@ -0,0 +1,117 @@
+"""
+Full-text search over invoices, backed by the invoices_search FTS5 table.
+
+The table holds one row per invoice with its title, client name, company,
+email and line items, and is kept in sync by the triggers created in
+migration 0007. Migrations that rebuild the tables the triggers are on
+must keep them with invoices.operations.PreserveSQLObjects.
+rebuild_search_index() repopulates the table from scratch.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import Invoice
+
+
+SEARCH_TABLE = 'invoices_search'
+MAX_RESULTS = 50
+
+# bm25() weight of a match in each column, in the table's column order. The
+# owner column only scopes the search to a user, so it doesn't count.
+COLUMN_WEIGHTS = {'owner': 0, 'title': 10, 'client_name': 5, 'client_company': 5, 'client_email': 3, 'items': 1}
+
+TOKEN_RE = re.compile(r'\w+')
+
+REBUILD_SQL = [
+    f'DELETE FROM {SEARCH_TABLE}',
+    f"""
+    INSERT INTO {SEARCH_TABLE} (rowid, owner, title, client_name, client_company, client_email, items)
+    SELECT invoice.id, 'u' || invoice.user_id, invoice.title,
+           client.first_name || ' ' || client.last_name, client.company, client.email,
+           (SELECT group_concat(item, ' ') FROM invoices_invoiceitem WHERE invoice_id = invoice.id)
+    FROM invoices_invoice AS invoice
+    JOIN invoices_client AS client ON client.id = invoice.client_id
+    """,
+    f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')",
+]
+
+
+def has_search_index():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(user_id, words):
+    """
+    FTS5 MATCH expression for ``words`` within the invoices of ``user_id``.
+
+    Every word must match in full except the last, which is matched as a
+    prefix so results show up while it is being typed. Prefix lookups are
+    only cheap up to three characters (the table's prefix indexes), longer
+    ones read every matching entry, so they are kept to one word.
+    Only word characters reach the expression, so user input can't use (or
+    break) the FTS5 query syntax.
+    """
+    phrases = [f'"{word}"' for word in words[:-1]] + [f'"{words[-1]}"*']
+    return f'owner : "u{user_id}" AND ' + ' AND '.join(phrases)
+
+
+def search_invoice_ids(user, text, limit=MAX_RESULTS):
+    """
+    Ids of the user's invoices matching every word of ``text``, best match
+    first as ranked by SQLite's bm25(): words in the title count most, then
+    the client, then the items. Equal ranks are ordered newest first.
+    """
+    words = TOKEN_RE.findall(text.lower())
+    if not words:
+        return []
+    weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS.values())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+            f'ORDER BY bm25({SEARCH_TABLE}, {weights}), rowid DESC LIMIT %s',
+            [match_expression(user.pk, words), limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+SEARCH_RESULT_FIELDS = [
+    'pk', 'title', 'invoice_total', 'currency', 'create_date',
+    'client__first_name', 'client__last_name', 'client__company',
+]
+
+
+def search_invoices(user, text, limit=MAX_RESULTS):
+    """
+    The user's invoices matching every word of ``text``, best match first,
+    as dicts of SEARCH_RESULT_FIELDS. Dicts because building model instances
+    would cost more than the search itself.
+    """
+    words = TOKEN_RE.findall(text)
+    if not words:
+        return []
+    queryset = Invoice.objects.filter(user=user).values(*SEARCH_RESULT_FIELDS)
+    if not has_search_index():
+        # Unindexed fallback for databases without FTS5
+        for word in words:
+            queryset = queryset.filter(
+                Q(title__icontains=word) | Q(client__first_name__icontains=word)
+                | Q(client__last_name__icontains=word) | Q(client__company__icontains=word)
+                | Q(client__email__icontains=word) | Q(items__item__icontains=word)
+            )
+        return list(queryset.distinct().order_by('-pk')[:limit])
+
+    ids = search_invoice_ids(user, text, limit)
+    invoices = {invoice['pk']: invoice for invoice in queryset.filter(pk__in=ids)}
+    return [invoices[pk] for pk in ids if pk in invoices]
+
+
+def rebuild_search_index():
+    """Repopulate the search table from the invoices, clients and items"""
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for statement in REBUILD_SQL:
+                cursor.execute(statement)
+            cursor.execute(f'SELECT count(*) FROM {SEARCH_TABLE}')
+            return cursor.fetchone()[0]
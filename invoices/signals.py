@@ -0,0 +1,110 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .fragments import invalidate_user_fragments
+from .currency import clear_rate_cache
+from .models import Client, ClientSummary, ExchangeRate, Invoice, InvoiceItem, PdfJob, RevenueRollup
+from .pdf_cache import get_pdf_cache
+
+
+@receiver([post_save, post_delete], sender=Invoice)
+def invalidate_invoice_pdf(sender, instance, **kwargs):
+    cache = get_pdf_cache()
+    if cache is not None:
+        cache.invalidate([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=InvoiceItem)
+def invalidate_invoice_item_pdf(sender, instance, **kwargs):
+    cache = get_pdf_cache()
+    if cache is not None:
+        cache.invalidate([instance.invoice_id])
+
+
+@receiver([post_save, post_delete], sender=Client)
+def invalidate_client_pdfs(sender, instance, **kwargs):
+    cache = get_pdf_cache()
+    if cache is not None:
+        cache.invalidate(
+            Invoice.objects.filter(client=instance).values_list('id', flat=True)
+        )
+
+
+@receiver(post_save, sender=Client)
+def touch_client_invoices(sender, instance, created, **kwargs):
+    # Invoices show their client, so a client edit is a new revision of each
+    if not created:
+        Invoice.objects.filter(client=instance).touch()
+
+
+@receiver([post_save, post_delete], sender=Invoice)
+def invalidate_invoice_fragments(sender, instance, **kwargs):
+    invalidate_user_fragments(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=InvoiceItem)
+def invalidate_invoice_item_fragments(sender, instance, **kwargs):
+    if InvoiceItem.invoice.is_cached(instance):
+        user_id = instance.invoice.user_id
+    else:
+        user_id = Invoice.objects.filter(pk=instance.invoice_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        invalidate_user_fragments(user_id)
+
+
+@receiver([post_save, post_delete], sender=Client)
+def invalidate_client_fragments(sender, instance, **kwargs):
+    # Invoice rows show the client too
+    invalidate_user_fragments(instance.created_by_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def reset_user_fragments(sender, instance, created, **kwargs):
+    # User ids can be reused, so a new account never sees stale fragments
+    if created:
+        invalidate_user_fragments(instance.pk)
+
+
+@receiver(post_delete, sender=PdfJob)
+def delete_pdf_job_file(sender, instance, **kwargs):
+    if instance.pdf:
+        instance.pdf.delete(save=False)
+
+
+@receiver(post_save, sender=Client)
+def create_client_summary(sender, instance, created, **kwargs):
+    if created:
+        ClientSummary.objects.get_or_create(client=instance)
+
+
+@receiver(post_save, sender=Invoice)
+def update_billing_aggregates_on_save(sender, instance, created, **kwargs):
+    loaded_client_id = getattr(instance, '_loaded_client_id', instance.client_id)
+    if created:
+        ClientSummary.objects.add_invoice(
+            instance.client_id, instance.base_total or 0, instance.create_date
+        )
+        RevenueRollup.objects.add_invoice(
+            instance.user_id, instance.client_id, instance.create_date, instance.base_total or 0
+        )
+    elif loaded_client_id != instance.client_id:
+        ClientSummary.objects.rebuild([loaded_client_id, instance.client_id])
+        RevenueRollup.objects.rebuild([loaded_client_id, instance.client_id])
+    instance._loaded_client_id = instance.client_id
+
+
+@receiver(post_delete, sender=Invoice)
+def update_billing_aggregates_on_delete(sender, instance, **kwargs):
+    ClientSummary.objects.remove_invoice(
+        instance.client_id, instance.base_total or 0, instance.create_date
+    )
+    RevenueRollup.objects.remove_invoice(
+        instance.user_id, instance.client_id, instance.create_date, instance.base_total or 0
+    )
+
+
+@receiver([post_save, post_delete], sender=ExchangeRate)
+def reload_exchange_rates(sender, instance, **kwargs):
+    # Other processes pick the change up when their copy expires
+    clear_rate_cache()
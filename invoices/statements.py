@@ -0,0 +1,84 @@
+"""
+Client statements: a summary page followed by the PDF of every invoice of a
+client in a period.
+
+The invoices are not laid out together as one document. Each one comes from
+get_invoice_pdf(), so invoices that haven't changed since their last render
+are read from the PDF cache, and the pages are merged with PyPDF2. Only the
+summary and the invoices that changed go through WeasyPrint.
+"""
+import io
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from PyPDF2 import PdfFileMerger
+from weasyprint import HTML
+
+from .models import InvoiceItem
+from .pdf import filter_invoices, get_invoice_pdf, get_render_resources
+from .pdf_assets import fetch_local_url
+
+
+STATEMENT_TEMPLATE = 'pdf/statement.html'
+
+
+def statement_filename(client, start_date=None, end_date=None):
+    period = '_'.join(str(date) for date in (start_date, end_date) if date is not None)
+    return f'statement_{client.pk}{"_" + period if period else ""}.pdf'
+
+
+def get_statement_context(client, invoices, start_date=None, end_date=None):
+    totals = defaultdict(Decimal)
+    for invoice in invoices:
+        totals[invoice.currency] += invoice.invoice_total
+    # Only worth a line of its own when the invoices aren't all in the base currency
+    base_total = None
+    if set(totals) - {settings.BASE_CURRENCY}:
+        base_total = sum((invoice.base_total for invoice in invoices), Decimal('0'))
+    return {
+        'client': client,
+        'user': client.created_by,
+        'invoices': invoices,
+        'start_date': start_date,
+        'end_date': end_date,
+        'totals': sorted(totals.items()),
+        'base_total': base_total,
+        'base_currency': settings.BASE_CURRENCY,
+    }
+
+
+def render_statement_summary(context):
+    resources = get_render_resources()
+    html = render_to_string(STATEMENT_TEMPLATE, context)
+    return HTML(string=html, url_fetcher=fetch_local_url).write_pdf(
+        stylesheets=resources.stylesheets, font_config=resources.font_config,
+    )
+
+
+def build_statement_pdf(client, start_date=None, end_date=None, base_url=None):
+    """
+    Statement of ``client``'s invoices created between ``start_date`` and
+    ``end_date`` (both optional and inclusive), oldest first, as PDF bytes
+    """
+    invoices = list(filter_invoices(
+        client.invoice_set.select_related('client', 'user'), start_date=start_date, end_date=end_date,
+    ).order_by('create_date', 'pk'))
+    # One query for the items of every invoice instead of one per invoice
+    invoice_items = defaultdict(list)
+    for item in InvoiceItem.objects.filter(invoice__in=invoices).order_by('id'):
+        invoice_items[item.invoice_id].append(item)
+
+    merger = PdfFileMerger(strict=False)
+    merger.append(io.BytesIO(
+        render_statement_summary(get_statement_context(client, invoices, start_date, end_date))
+    ), bookmark='Statement')
+    for invoice in invoices:
+        pdf = get_invoice_pdf(invoice, base_url=base_url, invoice_items=invoice_items[invoice.pk])
+        merger.append(io.BytesIO(pdf), bookmark=f'Invoice #{invoice.pk}')
+    output = io.BytesIO()
+    merger.write(output)
+    merger.close()
+    return output.getvalue()
@@ -0,0 +1,85 @@
+// Fills selects marked with data-autocomplete-url (see
+// ClientAutocompleteSelect) from the client-autocomplete endpoint: a search
+// box above the select narrows the options, "More clients..." loads the
+// next page.
+(function () {
+    'use strict';
+
+    var MORE = '__more__';
+
+    function setUp(select) {
+        var url = select.getAttribute('data-autocomplete-url');
+        var search = document.createElement('input');
+        search.type = 'search';
+        search.className = 'form-control mb-1';
+        search.placeholder = 'Search clients';
+        search.setAttribute('aria-label', 'Search clients');
+        select.parentNode.insertBefore(search, select);
+
+        var next = null, request = 0, timer = null;
+
+        function load(query, after) {
+            var current = ++request;
+            var params = new URLSearchParams({q: query});
+            if (after) {
+                params.set('after', after);
+            }
+            fetch(url + '?' + params, {credentials: 'same-origin'})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    if (current !== request) {
+                        return;  // a newer search is on its way
+                    }
+                    show(data.results, Boolean(after));
+                    next = data.next;
+                    toggleMore();
+                });
+        }
+
+        function show(clients, append) {
+            var more = select.querySelector('option[value="' + MORE + '"]');
+            if (more) {
+                more.remove();
+            }
+            if (!append) {
+                // Keep the empty choice and the current selection
+                Array.prototype.slice.call(select.options).forEach(function (option) {
+                    if (option.value && !option.selected) {
+                        option.remove();
+                    }
+                });
+            }
+            clients.forEach(function (client) {
+                if (select.querySelector('option[value="' + client.id + '"]')) {
+                    return;
+                }
+                var label = client.name + (client.company ? ' (' + client.company + ')' : '');
+                select.add(new Option(label, client.id));
+            });
+        }
+
+        function toggleMore() {
+            if (next) {
+                select.add(new Option('More clients…', MORE));
+            }
+        }
+
+        search.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () { load(search.value, null); }, 200);
+        });
+        select.addEventListener('change', function () {
+            if (select.value === MORE) {
+                select.value = '';
+                load(search.value, next);
+            }
+        });
+        select.addEventListener('focus', function () {
+            if (select.options.length <= 2 && next === null && !search.value) {
+                load('', null);
+            }
+        }, {once: true});
+    }
+
+    document.querySelectorAll('select[data-autocomplete-url]').forEach(setUp);
+})();
@@ -0,0 +1,168 @@
+"""
+Concurrency stress test for the SQLite settings profiles.
+
+Writer and reader processes hammer one database file for a fixed time, the
+way several gunicorn workers would, and count completed operations and
+"database is locked" errors. Processes are spawned rather than forked so
+each one sets Django up against the profile under test, which is why the
+models are imported inside the worker functions.
+"""
+import functools
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+import django
+
+
+STRESS_PREFIX = 'stress'
+
+StressResult = namedtuple('StressResult', ['role', 'ops', 'lock_errors', 'errors'])
+
+
+def is_lock_error(error):
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def prepare_database(invoices):
+    django.setup()
+    from django.core.management import call_command
+    from .datagen import DatasetGenerator
+
+    call_command('migrate', verbosity=0)
+    DatasetGenerator(users=2, clients=20, invoices=invoices, prefix=STRESS_PREFIX, seed=0).run()
+
+
+def write_operations(rng, invoice_ids):
+    """Alternately add and remove a line item, each in a read-then-write transaction"""
+    from django.db import transaction
+    from .models import Invoice, InvoiceItem
+
+    created = None
+    while True:
+        with transaction.atomic():
+            if created is None:
+                # Reading first is what makes a DEFERRED transaction upgrade its lock
+                invoice = Invoice.objects.get(pk=rng.choice(invoice_ids))
+                created = InvoiceItem.objects.create(
+                    invoice=invoice, item='Stress', quantity=1, rate=Decimal('0.01'),
+                )
+            else:
+                InvoiceItem.objects.get(pk=created.pk).delete()
+                created = None
+        yield
+
+
+def read_operations(rng, user_ids):
+    """The invoice list page and the revenue report"""
+    from .models import Invoice
+    from .reports import revenue_report
+    from django.contrib.auth import get_user_model
+
+    users = list(get_user_model().objects.filter(pk__in=user_ids))
+    while True:
+        user = rng.choice(users)
+        if rng.random() < 0.5:
+            list(Invoice.objects.filter(user=user).select_related('client').order_by('-pk')[:25])
+        else:
+            revenue_report(user, by_client=True)
+        yield
+
+
+def stress_worker(role, seconds, seed, barrier, results):
+    django.setup()
+    from django.contrib.auth import get_user_model
+    from django.db import OperationalError, connection
+    from .models import Invoice
+
+    rng = random.Random(seed)
+    ops = lock_errors = 0
+    errors = []
+    try:
+        if role == 'writer':
+            invoice_ids = list(Invoice.objects.values_list('pk', flat=True))
+            start_operations = functools.partial(write_operations, rng, invoice_ids)
+        else:
+            user_ids = list(get_user_model().objects.filter(
+                username__startswith=f'{STRESS_PREFIX}-user-'
+            ).values_list('pk', flat=True))
+            start_operations = functools.partial(read_operations, rng, user_ids)
+        connection.close()
+    except Exception:
+        barrier.abort()
+        raise
+
+    barrier.wait()
+    operations = start_operations()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            next(operations)
+            ops += 1
+        except Exception as e:
+            if isinstance(e, OperationalError) and is_lock_error(e):
+                lock_errors += 1
+            else:
+                errors.append(repr(e))
+                if len(errors) >= 10:
+                    break
+            # The failed transaction was rolled back, carry on with a new one
+            operations = start_operations()
+    results.put(StressResult(role, ops, lock_errors, errors))
+
+
+def run_profile(profile, writers=4, readers=4, seconds=10, invoices=500):
+    """
+    Stress one SQLITE_PROFILE on a fresh database file and return a summary
+    dict with per-role operation and lock error counts.
+    """
+    context = multiprocessing.get_context('spawn')
+    saved = {name: os.environ.get(name) for name in ('SQLITE_PROFILE', 'SQLITE_PATH')}
+    with tempfile.TemporaryDirectory() as directory:
+        # Spawned processes read the profile from their inherited environment
+        os.environ['SQLITE_PROFILE'] = profile
+        os.environ['SQLITE_PATH'] = os.path.join(directory, 'stress.sqlite3')
+        try:
+            prepare = context.Process(target=prepare_database, args=(invoices,))
+            prepare.start()
+            prepare.join()
+            if prepare.exitcode != 0:
+                raise RuntimeError(f'Preparing the {profile} database failed')
+
+            barrier = context.Barrier(writers + readers + 1)
+            results = context.Queue()
+            roles = ['writer'] * writers + ['reader'] * readers
+            processes = [
+                context.Process(target=stress_worker, args=(role, seconds, seed, barrier, results))
+                for seed, role in enumerate(roles)
+            ]
+            for process in processes:
+                process.start()
+            barrier.wait()
+            collected = [results.get(timeout=seconds + 120) for _ in processes]
+            for process in processes:
+                process.join()
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+    summary = {'profile': profile, 'seconds': seconds}
+    for role in ('writer', 'reader'):
+        role_results = [result for result in collected if result.role == role]
+        ops = sum(result.ops for result in role_results)
+        summary[f'{role}s'] = {
+            'processes': len(role_results),
+            'ops': ops,
+            'ops_per_second': round(ops / seconds, 1),
+            'lock_errors': sum(result.lock_errors for result in role_results),
+            'errors': [error for result in role_results for error in result.errors],
+        }
+    return summary
@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+
+from .middleware import capture_queries
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin for keeping views within a query budget.
+
+    Unlike assertNumQueries the budget is an upper bound, and repeated
+    identical queries, the usual sign of an N+1 loop, fail on their own.
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries, max_duplicates=0, label=''):
+        with capture_queries() as stats:
+            yield stats
+        prefix = f'{label}: ' if label else ''
+        self.assertLessEqual(
+            stats.count, max_queries,
+            f'{prefix}{stats.count} queries run, budget is {max_queries}',
+        )
+        self.assertLessEqual(
+            stats.duplicates, max_duplicates,
+            f'{prefix}{stats.duplicates} duplicate queries: {stats.most_duplicated()}',
+        )
+
+    def assertViewQueryBudget(self, url, max_queries, max_duplicates=0, method='get', **kwargs):
+        """GET (or ``method``) the url and check its queries against the budget"""
+        with self.assertQueryBudget(max_queries, max_duplicates, label=url):
+            response = getattr(self.client, method)(url, **kwargs)
+            if hasattr(response, 'streaming_content'):
+                b''.join(response.streaming_content)
+        return response
@@ -0,0 +1,139 @@
+import json
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from invoices.models import Invoice, InvoiceItem, Client, ClientSummary, RevenueRollup
+
+
+class BulkInvoiceApiTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.client1 = Client.objects.create(
+            first_name="Test", last_name="Client", email="test@example.com",
+            company="Xcorp", address1="1234 Paradise Lane",
+            address2="Good Street", country="Zimbabwe",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+        self.client2 = Client.objects.create(
+            first_name="Jane", last_name="Doe", email="janedoe@example.com",
+            company="Cybertron Accounting", address1="1234 Energon Lane",
+            address2="Oil Street", country="Cybertron",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+        self.client.login(username='testuser', password='secretpassword')
+
+    def post(self, payload):
+        return self.client.post(reverse('invoice-bulk-api'), json.dumps(payload),
+                                content_type='application/json')
+
+    def make_payload(self, count, items=2):
+        return [
+            {'title': f'Invoice {i}', 'client_id': self.client1.pk,
+             'items': [{'item': f'Item {n}', 'quantity': n + 1, 'rate': '10.00'} for n in range(items)]}
+            for i in range(count)
+        ]
+
+    def test_create_and_update(self):
+        existing = Invoice.objects.create(title="Old", user=self.user, client=self.client1)
+        InvoiceItem.objects.create(invoice=existing, item="Old work", quantity=1, rate=99)
+
+        response = self.post([
+            {'title': 'Website', 'client_email': 'JANEDOE@example.com', 'create_date': '2019-03-01',
+             'items': [{'item': 'Design', 'quantity': 3, 'rate': '20'}]},
+            {'id': existing.pk, 'title': 'Renamed', 'client_id': self.client2.pk,
+             'items': [{'item': 'New work', 'quantity': 2, 'rate': '5', 'tax': '1'}]},
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([(r['index'], r['status'], r['invoice_total']) for r in results],
+                         [(0, 'created', '60.00'), (1, 'updated', '10.10')])
+
+        website = Invoice.objects.get(pk=results[0]['id'])
+        self.assertEqual((website.title, website.client, str(website.create_date)),
+                         ('Website', self.client2, '2019-03-01'))
+        existing.refresh_from_db()
+        self.assertEqual(existing.title, 'Renamed')
+        self.assertEqual(list(existing.items.values_list('item', flat=True)), ['New work'])
+
+        # The invoice moved between clients, both summaries follow
+        self.assertEqual(ClientSummary.objects.get(client=self.client1).invoice_count, 0)
+        self.assertEqual(ClientSummary.objects.get(client=self.client2).total_billed, Decimal('70.10'))
+        self.assertFalse(RevenueRollup.objects.filter(client=self.client1).exists())
+
+    def test_update_without_items_keeps_them(self):
+        existing = Invoice.objects.create(title="Old", user=self.user, client=self.client1)
+        InvoiceItem.objects.create(invoice=existing, item="Work", quantity=1, rate=99)
+        response = self.post([{'id': existing.pk, 'title': 'Renamed', 'client_id': self.client1.pk}])
+        self.assertEqual(response.json()['results'][0]['invoice_total'], '99.00')
+        self.assertEqual(existing.items.count(), 1)
+
+    def test_invalid_batch_saves_nothing(self):
+        other_user = get_user_model().objects.create_user(username='other', password='secretpassword')
+        other_invoice = Invoice.objects.create(title="Theirs", user=other_user, client=self.client1)
+
+        payload = self.make_payload(2)
+        payload[1]['items'][0]['quantity'] = 'lots'
+        payload += [
+            {'title': 'No client', 'client_email': 'nobody@example.com'},
+            {'id': other_invoice.pk, 'title': 'Stolen', 'client_id': self.client1.pk},
+            'not an invoice',
+        ]
+        response = self.post(payload)
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual([error['index'] for error in errors], [1, 2, 3, 4])
+        self.assertIn('quantity', errors[0]['errors']['items']['0'])
+        self.assertEqual(errors[1]['errors']['client'][0]['message'], 'Unknown client')
+        self.assertEqual(errors[2]['errors']['id'][0]['message'], 'Unknown invoice')
+        self.assertEqual(Invoice.objects.filter(user=self.user).count(), 0)
+
+        response = self.client.post(reverse('invoice-bulk-api'), 'nope', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_large_totals(self):
+        response = self.post([
+            {'title': 'Build', 'client_id': self.client1.pk,
+             'items': [{'item': 'Build', 'quantity': 2, 'rate': '6000'}]},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['invoice_total'], '12000.00')
+        self.assertEqual(Invoice.objects.get().invoice_total, Decimal('12000'))
+
+        # More than the totals can hold is a validation error, not a failed save
+        response = self.post([
+            {'title': 'Fleet', 'client_id': self.client1.pk,
+             'items': [{'item': 'Trucks', 'quantity': 2000000, 'rate': '9999.99'}]},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('at most', response.json()['errors'][0]['errors']['items'][0]['message'])
+        self.assertEqual(Invoice.objects.count(), 1)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        def count_queries(payload):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post(payload)
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        small = count_queries(self.make_payload(5))
+        self.assertEqual(count_queries(self.make_payload(50)), small)
+
+    def test_thousand_invoices_in_one_request(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(self.make_payload(1000))
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(len(queries), 60)
+        self.assertEqual(Invoice.objects.filter(user=self.user).count(), 1000)
+        self.assertEqual(ClientSummary.objects.get(client=self.client1).total_billed, Decimal('30000'))
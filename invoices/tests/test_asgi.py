@@ -0,0 +1,128 @@
+import asyncio
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.http import StreamingHttpResponse
+from django.test import Client as TestClient, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from invoicebuilder.handlers import ThreadedASGIHandler
+from invoices.loadtest import run_load_test
+from invoices.models import Invoice, InvoiceItem, Client
+
+
+# The handler serves requests from its own threads, which only see committed data
+@override_settings(PDF_CACHE_DIR=None, PDF_RENDER_WORKERS=None)
+class ThreadedASGIHandlerTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.client1 = Client.objects.create(
+            first_name="Test", last_name="Client", email="test@example.com",
+            company="Xcorp", address1="1234 Paradise Lane",
+            address2="Good Street", country="Zimbabwe",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+        for i in range(3):
+            self.invoice = Invoice.objects.create(title=f"Website {i}", user=self.user, client=self.client1)
+            InvoiceItem.objects.create(invoice=self.invoice, item="Design", quantity=3, rate=20)
+        client = TestClient()
+        client.force_login(self.user)
+        self.cookie = f"sessionid={client.cookies['sessionid'].value}".encode()
+
+    def scope(self, path, query_string=b''):
+        return {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': path, 'root_path': '',
+            'query_string': query_string,
+            'headers': [(b'host', b'testserver'), (b'cookie', self.cookie)],
+            'server': ('testserver', 80),
+        }
+
+    def request(self, path, query_string=b''):
+        app = ThreadedASGIHandler()
+        scope = self.scope(path, query_string)
+        messages = []
+        requests = [{'type': 'http.request', 'body': b''}]
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            await asyncio.Event().wait()
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(app(scope, receive, send))
+        app.executor.shutdown()
+        return messages
+
+    def test_page(self):
+        messages = self.request(reverse('invoice-list'))
+        self.assertEqual(messages[0]['status'], 200)
+        body = b''.join(message.get('body', b'') for message in messages[1:])
+        self.assertIn(reverse('invoice-detail', args=[self.invoice.pk]).encode(), body)
+        self.assertFalse(messages[-1].get('more_body', False))
+
+    def test_streaming_export_queries_off_the_event_loop(self):
+        messages = self.request(reverse('invoice-data-export'), b'format=csv')
+        self.assertEqual(messages[0]['status'], 200)
+        body = b''.join(message.get('body', b'') for message in messages[1:])
+        self.assertEqual(body.count(b'Design'), 3)
+
+    def test_client_disconnect_mid_stream(self):
+        closed = threading.Event()
+
+        def endless_body():
+            try:
+                while True:
+                    yield b'row\n'
+            finally:
+                closed.set()
+
+        app = ThreadedASGIHandler()
+        app.put_timeout = 0.05
+        sent = []
+
+        async def run():
+            enough = asyncio.Event()
+            requests = [{'type': 'http.request', 'body': b''}]
+
+            async def receive():
+                if requests:
+                    return requests.pop()
+                await enough.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+                if len(sent) == 10:
+                    enough.set()
+                    # A slow client: the queue fills up behind it
+                    await asyncio.sleep(0.2)
+
+            await asyncio.wait_for(app(self.scope('/stream/'), receive, send), 5)
+
+        response = StreamingHttpResponse(endless_body())
+        with mock.patch.object(app, 'get_response', return_value=response):
+            asyncio.run(run())
+        # The request thread let go of the response and is free again
+        self.assertTrue(closed.is_set())
+        self.assertLessEqual(len(sent), 11)
+        self.assertEqual(app.executor.submit(lambda: 'free').result(timeout=1), 'free')
+        app.executor.shutdown()
+
+    def test_load_test(self):
+        results = run_load_test(self.user, concurrency=2, seconds=0.3, pdf_ratio=0.5)
+        for interface in ('wsgi', 'asgi'):
+            self.assertGreater(results[interface]['requests'], 0)
+            for kind in ('page', 'pdf'):
+                if kind in results[interface]:
+                    self.assertEqual(results[interface][kind]['errors'], 0)
+        self.assertIn('max_loop_lag_ms', results['asgi'])
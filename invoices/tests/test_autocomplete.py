@@ -0,0 +1,120 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from invoices.autocomplete import autocomplete_clients
+from invoices.models import Client, Invoice
+
+
+def make_client(user, first_name, last_name='Client', company='Xcorp', email=None):
+    return Client.objects.create(
+        first_name=first_name, last_name=last_name,
+        email=email or f'{first_name.lower()}@example.com',
+        company=company, address1="1234 Paradise Lane",
+        address2="Good Street", country="Zimbabwe",
+        phone_number="+263771811111",
+        created_by=user
+    )
+
+
+class ClientAutocompleteTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.other_user = get_user_model().objects.create_user(
+            username='otheruser',
+            email='other@email.com',
+            password='secretpassword'
+        )
+        self.tendai = make_client(self.user, 'Tendai', 'Moyo', 'Acme Logistics', 'accounts@acme.co.zw')
+        self.anna = make_client(self.user, 'Anna', 'Smith', 'Zeta Labs')
+        make_client(self.other_user, 'Tendai', 'Other', 'Acme')
+        self.client.login(username='testuser', password='secretpassword')
+
+    def names(self, text, **kwargs):
+        clients, _ = autocomplete_clients(self.user, text, **kwargs)
+        return [client['name'] for client in clients]
+
+    def test_prefix_of_any_field(self):
+        self.assertEqual(self.names('tend'), ['Tendai Moyo'])
+        self.assertEqual(self.names('TENDAI M'), ['Tendai Moyo'])
+        self.assertEqual(self.names('moy'), ['Tendai Moyo'])
+        # Company and email both match, the client is listed once
+        self.assertEqual(self.names('ac'), ['Tendai Moyo'])
+        self.assertEqual(self.names('zeta'), ['Anna Smith'])
+        self.assertEqual(self.names('endai'), [])
+        self.assertEqual(self.names(''), ['Anna Smith', 'Tendai Moyo'])
+
+    def test_pages_cover_every_match(self):
+        for i in range(25):
+            make_client(self.user, f'Bulk{i:02}', email=f'bulk{i:02}@example.com')
+        seen, after, pages = set(), None, 0
+        while True:
+            clients, after = autocomplete_clients(self.user, 'bulk', after=after, page_size=10)
+            self.assertLessEqual(len(clients), 10)
+            seen.update(client['id'] for client in clients)
+            pages += 1
+            if after is None:
+                break
+        self.assertEqual(len(seen), 25)
+        self.assertLessEqual(pages, 6)
+
+    def test_endpoint(self):
+        response = self.client.get(reverse('client-autocomplete'), {'q': 'tendai'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['next'], None)
+        self.assertEqual(data['results'], [{
+            'id': self.tendai.pk, 'name': 'Tendai Moyo', 'company': 'Acme Logistics',
+            'email': 'accounts@acme.co.zw',
+        }])
+
+        for i in range(25):
+            make_client(self.user, f'Bulk{i:02}', company='Bulk')
+        data = self.client.get(reverse('client-autocomplete'), {'q': 'bulk'}).json()
+        self.assertEqual(len(data['results']), 20)
+        ids = {client['id'] for client in data['results']}
+        while data['next']:
+            data = self.client.get(reverse('client-autocomplete'), {'q': 'bulk', 'after': data['next']}).json()
+            ids.update(client['id'] for client in data['results'])
+        self.assertEqual(len(ids), 25)
+
+        for after in ['nonsense', json.dumps([1, 2]), json.dumps([['a', 'b']] * 4)]:
+            response = self.client.get(reverse('client-autocomplete'), {'q': 'bulk', 'after': after})
+            self.assertEqual(response.status_code, 400)
+
+    def test_invoice_form_renders_without_the_client_list(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('new-invoice'))
+        self.assertContains(response, reverse('client-autocomplete'))
+        self.assertNotContains(response, 'Tendai Moyo')
+
+        for i in range(50):
+            make_client(self.user, f'Bulk{i:02}')
+        with self.assertNumQueries(2):
+            self.client.get(reverse('new-invoice'))
+
+    def test_invoice_form_keeps_and_checks_the_client(self):
+        data = {
+            'title': '', 'client': self.tendai.pk,
+            'items-TOTAL_FORMS': '0', 'items-INITIAL_FORMS': '0',
+            'items-MIN_NUM_FORMS': '0', 'items-MAX_NUM_FORMS': '1000',
+        }
+        response = self.client.post(reverse('new-invoice'), data)
+        # Invalid title, the chosen client is rendered as the only option
+        self.assertContains(response, 'Tendai Moyo')
+        self.assertNotContains(response, 'Anna Smith')
+
+        other = Client.objects.get(created_by=self.other_user)
+        response = self.client.post(reverse('new-invoice'), dict(data, title='Work', client=other.pk))
+        self.assertFalse(Invoice.objects.exists())
+        self.assertIn('client', response.context['form'].errors)
+
+        self.client.post(reverse('new-invoice'), dict(data, title='Work'))
+        self.assertEqual(Invoice.objects.get().client, self.tendai)
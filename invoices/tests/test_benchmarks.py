@@ -0,0 +1,91 @@
+import io
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import Count, Sum
+from django.test import TestCase
+
+from invoices.benchmarks import percentile, run_benchmarks, url_names
+from invoices.datagen import DatasetGenerator
+from invoices.models import Invoice, InvoiceItem, Client, ClientSummary, PdfJob
+
+
+class DatasetGeneratorTests(TestCase):
+
+    def test_generated_dataset(self):
+        counts = DatasetGenerator(users=3, clients=12, invoices=150, batch_size=40, seed=1).run()
+        self.assertEqual(counts['users'], 3)
+        self.assertEqual(counts['clients'], 12)
+        self.assertEqual(counts['invoices'], 150)
+        self.assertEqual(counts['items'], InvoiceItem.objects.count())
+
+        users = get_user_model().objects.filter(username__startswith='bench-user-')
+        self.assertEqual(users.count(), 3)
+        # Every user has a client, and the totals and summaries are in place
+        self.assertFalse(users.annotate(n=Count('client')).filter(n=0).exists())
+        self.assertFalse(Invoice.objects.filter(invoice_total=0).exists())
+        self.assertEqual(
+            ClientSummary.objects.aggregate(total=Sum('total_billed'))['total'],
+            Invoice.objects.aggregate(total=Sum('invoice_total'))['total'],
+        )
+        # Skewed: the busiest client gets far more than an even share
+        busiest = Client.objects.annotate(n=Count('invoice')).order_by('-n').first()
+        self.assertGreater(busiest.n, 150 / 12 * 2)
+
+    def test_same_seed_same_dataset(self):
+        def shape(prefix):
+            DatasetGenerator(users=2, clients=5, invoices=30, seed=7, prefix=prefix).run()
+            return list(
+                Invoice.objects.filter(user__username__startswith=prefix).order_by('pk')
+                .values_list('invoice_total', 'create_date')
+            )
+
+        self.assertEqual(shape('first'), shape('second'))
+
+    def test_command(self):
+        stdout = io.StringIO()
+        call_command('generate_invoice_data', users=2, clients=4, invoices=20, stdout=stdout)
+        self.assertIn('20 invoices', stdout.getvalue())
+
+
+class BenchmarkTests(TestCase):
+
+    def setUp(self):
+        DatasetGenerator(users=1, clients=3, invoices=20, seed=3).run()
+        self.user = get_user_model().objects.get(username='bench-user-0')
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([5], 95), 5)
+
+    def test_every_route_is_benchmarked(self):
+        report = run_benchmarks(self.user, iterations=2, warmup=0)
+        self.assertEqual(list(report['results']), url_names())
+        for name, result in report['results'].items():
+            with self.subTest(route=name):
+                # Form posts redirect back to the page they came from
+                self.assertEqual(result['status'], [302] if name == 'invoice-recurring' else [200])
+                self.assertEqual(set(result['latency_ms']), {'p50', 'p90', 'p95', 'p99', 'mean', 'max'})
+                self.assertGreater(result['peak_memory_kb'], 0)
+        self.assertEqual(report['meta']['dataset']['invoices'], 20)
+        # The writes of POST routes and the PDF job fixture are undone
+        self.assertEqual(Invoice.objects.count(), 20)
+        self.assertFalse(PdfJob.objects.exists())
+
+    def test_command_writes_and_compares_reports(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first = os.path.join(directory, 'first.json')
+            second = os.path.join(directory, 'second.json')
+            options = {'user': 'bench-user-0', 'iterations': 1, 'only': ['home', 'revenue-report-json']}
+            call_command('benchmark_urls', output=first, stdout=io.StringIO(), **options)
+            stdout = io.StringIO()
+            call_command('benchmark_urls', output=second, compare=first, stdout=stdout, **options)
+            with open(second) as f:
+                report = json.load(f)
+        self.assertEqual(set(report['results']), {'home', 'revenue-report-json'})
+        self.assertIn('revenue-report-json', stdout.getvalue().splitlines()[-1])
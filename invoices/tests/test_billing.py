@@ -0,0 +1,145 @@
+import datetime
+import io
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from invoices.billing import run_billing
+from invoices.models import (
+    Client, ClientSummary, Invoice, InvoiceItem, RecurringInvoice, RecurringInvoiceItem, RevenueRollup, add_months,
+)
+
+
+class RecurringInvoiceTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.client1 = Client.objects.create(
+            first_name="Test", last_name="Client", email="test@example.com",
+            company="Xcorp", address1="1234 Paradise Lane",
+            address2="Good Street", country="Zimbabwe",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+
+    def make_recurring(self, start_date, interval_months=RecurringInvoice.MONTHLY, **kwargs):
+        recurring = RecurringInvoice.objects.create(
+            user=self.user, client=self.client1, title="Retainer",
+            start_date=start_date, interval_months=interval_months, **kwargs
+        )
+        RecurringInvoiceItem.objects.create(recurring_invoice=recurring, item="Support", quantity=2, rate=50, tax=10)
+        RecurringInvoiceItem.objects.create(recurring_invoice=recurring, item="Hosting", quantity=1, rate=20)
+        return recurring
+
+    def test_cycles_keep_the_start_day(self):
+        self.assertEqual(add_months(datetime.date(2020, 1, 31), 1), datetime.date(2020, 2, 29))
+        self.assertEqual(add_months(datetime.date(2020, 11, 30), 3), datetime.date(2021, 2, 28))
+        recurring = self.make_recurring(datetime.date(2020, 1, 31))
+        self.assertEqual(recurring.next_date, datetime.date(2020, 1, 31))
+        self.assertEqual(
+            [recurring.cycle_date(cycle) for cycle in range(3)],
+            [datetime.date(2020, 1, 31), datetime.date(2020, 2, 29), datetime.date(2020, 3, 31)],
+        )
+
+    def test_billing_run(self):
+        recurring = self.make_recurring(datetime.date(2020, 1, 15))
+        self.make_recurring(datetime.date(2020, 2, 1))
+
+        result = run_billing(datetime.date(2020, 1, 31))
+        self.assertEqual((result.recurring, result.invoices, result.items), (1, 1, 2))
+        invoice = Invoice.objects.get()
+        self.assertEqual((invoice.title, invoice.client, invoice.create_date),
+                         ("Retainer", self.client1, datetime.date(2020, 1, 15)))
+        self.assertEqual((invoice.net_total, invoice.tax_total, invoice.invoice_total),
+                         (Decimal('120'), Decimal('10'), Decimal('130')))
+        self.assertEqual(sorted(invoice.items.values_list('item', 'quantity', 'rate', 'tax')), [
+            ('Hosting', 1, Decimal('20'), Decimal('0')), ('Support', 2, Decimal('50'), Decimal('10')),
+        ])
+        self.assertFalse(Invoice.objects.drifted().exists())
+
+        recurring.refresh_from_db()
+        self.assertEqual((recurring.billed_cycles, recurring.next_date), (1, datetime.date(2020, 2, 15)))
+
+        # Nothing is billed twice
+        result = run_billing(datetime.date(2020, 1, 31))
+        self.assertEqual((result.recurring, result.invoices), (0, 0))
+        self.assertEqual(Invoice.objects.count(), 1)
+
+        summary = ClientSummary.objects.get(client=self.client1)
+        self.assertEqual((summary.invoice_count, summary.total_billed, summary.last_invoice_date),
+                         (1, Decimal('130'), datetime.date(2020, 1, 15)))
+        self.assertEqual(RevenueRollup.objects.get().revenue, Decimal('130'))
+
+    def test_missed_cycles_are_caught_up_until_the_end_date(self):
+        self.make_recurring(datetime.date(2020, 1, 10), end_date=datetime.date(2020, 3, 10))
+        self.make_recurring(datetime.date(2020, 1, 10), interval_months=RecurringInvoice.QUARTERLY)
+        self.make_recurring(datetime.date(2020, 1, 10), active=False)
+
+        result = run_billing(datetime.date(2020, 6, 30), batch_size=1)
+        self.assertEqual((result.recurring, result.invoices, result.items), (2, 5, 10))
+        self.assertEqual(
+            sorted(Invoice.objects.values_list('create_date', flat=True)),
+            [datetime.date(2020, 1, 10), datetime.date(2020, 1, 10), datetime.date(2020, 2, 10),
+             datetime.date(2020, 3, 10), datetime.date(2020, 4, 10)],
+        )
+        self.assertEqual(run_billing(datetime.date(2021, 1, 1)).invoices, 2)
+
+        # The aggregates kept up with the bulk inserts
+        figures = list(ClientSummary.objects.values_list('invoice_count', 'total_billed', 'last_invoice_date'))
+        rollups = list(RevenueRollup.objects.order_by('period').values_list('period', 'invoice_count', 'revenue'))
+        ClientSummary.objects.rebuild()
+        RevenueRollup.objects.rebuild()
+        self.assertEqual(
+            figures, list(ClientSummary.objects.values_list('invoice_count', 'total_billed', 'last_invoice_date'))
+        )
+        self.assertEqual(
+            rollups, list(RevenueRollup.objects.order_by('period').values_list('period', 'invoice_count', 'revenue'))
+        )
+
+    def test_queries_do_not_grow_with_the_batch(self):
+        def count_queries(recurring_count, date):
+            for _ in range(recurring_count):
+                self.make_recurring(date, interval_months=RecurringInvoice.YEARLY)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(run_billing(date).invoices, recurring_count)
+            return len(queries)
+
+        self.assertEqual(count_queries(2, datetime.date(2020, 1, 1)), count_queries(30, datetime.date(2020, 2, 1)))
+
+    def test_command(self):
+        self.make_recurring(datetime.date(2020, 1, 15))
+        out = io.StringIO()
+        call_command('run_billing', date=datetime.date(2020, 2, 20), stdout=out)
+        self.assertIn('Billed 1 recurring invoices due by 2020-02-20: 2 invoices and 4 line items', out.getvalue())
+
+    def test_make_invoice_recurring(self):
+        invoice = Invoice.objects.create(title="Website care", user=self.user, client=self.client1)
+        InvoiceItem.objects.create(invoice=invoice, item="Updates", quantity=3, rate=15, tax=5)
+        self.client.login(username='testuser', password='secretpassword')
+
+        response = self.client.post(reverse('invoice-recurring', args=[invoice.pk]), {'interval_months': 3})
+        self.assertRedirects(response, reverse('invoice-detail', args=[invoice.pk]))
+        recurring = RecurringInvoice.objects.get()
+        self.assertEqual((recurring.title, recurring.client, recurring.start_date),
+                         ("Website care", self.client1, add_months(invoice.create_date, 3)))
+        self.assertEqual(list(recurring.items.values_list('item', 'quantity', 'rate', 'tax')),
+                         [('Updates', 3, Decimal('15'), Decimal('5'))])
+
+        response = self.client.post(reverse('invoice-recurring', args=[invoice.pk]), {
+            'interval_months': 1, 'start_date': '2020-05-01', 'end_date': '2020-04-01',
+        })
+        self.assertEqual(response.status_code, 400)
+
+        other_user = get_user_model().objects.create_user(username='other', password='secretpassword')
+        self.client.force_login(other_user)
+        response = self.client.post(reverse('invoice-recurring', args=[invoice.pk]), {'interval_months': 1})
+        self.assertEqual(response.status_code, 404)
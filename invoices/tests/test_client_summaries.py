@@ -0,0 +1,96 @@
+import datetime
+import io
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from invoices.models import ClientSummary, Invoice, InvoiceItem, Client
+
+
+class ClientSummaryTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.client1 = Client.objects.create(
+            first_name="Test", last_name="Client", email="test@example.com",
+            company="Xcorp", address1="1234 Paradise Lane",
+            address2="Good Street", country="Zimbabwe",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+        self.client2 = Client.objects.create(
+            first_name="Jane", last_name="Doe", email="janedoe@example.com",
+            company="Cybertron Accounting", address1="1234 Energon Lane",
+            address2="Oil Street", country="Cybertron",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+
+    def summary(self, client):
+        summary = ClientSummary.objects.get(client=client)
+        return summary.invoice_count, summary.total_billed, summary.last_invoice_date
+
+    def create_invoice(self, client, total, create_date=None):
+        invoice = Invoice.objects.create(title="Invoice", user=self.user, client=client)
+        if create_date is not None:
+            Invoice.objects.filter(pk=invoice.pk).update(create_date=create_date)
+            invoice.create_date = create_date
+        InvoiceItem.objects.create(invoice=invoice, item="Work", quantity=1, rate=total)
+        return invoice
+
+    def test_summary_follows_invoice_changes(self):
+        self.assertEqual(self.summary(self.client1), (0, Decimal('0'), None))
+
+        invoice = self.create_invoice(self.client1, 20)
+        item = invoice.items.get()
+        self.assertEqual(self.summary(self.client1), (1, Decimal('20'), datetime.date.today()))
+
+        item.rate = 35
+        item.save()
+        self.create_invoice(self.client1, 5)
+        self.assertEqual(self.summary(self.client1)[:2], (2, Decimal('40')))
+
+        invoice.delete()
+        self.assertEqual(self.summary(self.client1)[:2], (1, Decimal('5')))
+
+    def test_moving_invoice_to_another_client(self):
+        invoice = self.create_invoice(self.client1, 20)
+        invoice = Invoice.objects.get(pk=invoice.pk)
+        invoice.client = self.client2
+        invoice.save()
+        self.assertEqual(self.summary(self.client1), (0, Decimal('0'), None))
+        self.assertEqual(self.summary(self.client2)[:2], (1, Decimal('20')))
+
+    def test_last_invoice_date_after_delete(self):
+        older = self.create_invoice(self.client1, 10, datetime.date(2019, 1, 1))
+        newer = self.create_invoice(self.client1, 10, datetime.date(2019, 6, 1))
+        # Imports set dates behind the summary's back, rebuild to pick them up
+        ClientSummary.objects.rebuild()
+        self.assertEqual(self.summary(self.client1)[2], datetime.date(2019, 6, 1))
+        newer.delete()
+        self.assertEqual(self.summary(self.client1)[2], datetime.date(2019, 1, 1))
+        older.delete()
+        self.assertEqual(self.summary(self.client1), (0, Decimal('0'), None))
+
+    def test_rebuild_command(self):
+        self.create_invoice(self.client1, 20)
+        ClientSummary.objects.all().delete()
+        call_command('rebuild_client_summaries', stdout=io.StringIO())
+        self.assertEqual(self.summary(self.client1)[:2], (1, Decimal('20')))
+        self.assertEqual(self.summary(self.client2)[:2], (0, Decimal('0')))
+
+    def test_client_pages_show_summary(self):
+        self.create_invoice(self.client1, 20)
+        self.client.login(username='testuser', password='secretpassword')
+        response = self.client.get(reverse('client-list'))
+        self.assertContains(response, 'Total Billed')
+        self.assertContains(response, '20.00')
+        response = self.client.get(reverse('client-detail', args=[self.client1.pk]))
+        self.assertContains(response, 'Total billed: USD 20.00')
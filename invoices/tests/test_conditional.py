@@ -0,0 +1,120 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client as TestClient, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from invoices import views
+from invoices.models import Invoice, InvoiceItem, Client
+
+
+class ConditionalInvoiceResponseTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.client1 = Client.objects.create(
+            first_name="Test", last_name="Client", email="test@example.com",
+            company="Xcorp", address1="1234 Paradise Lane",
+            address2="Good Street", country="Zimbabwe",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+        self.invoice = Invoice.objects.create(title="Test Invoice", user=self.user, client=self.client1)
+        self.item = InvoiceItem.objects.create(invoice=self.invoice, item="Work", quantity=2, rate=10)
+        self.client.login(username='testuser', password='secretpassword')
+
+    def revision(self):
+        return Invoice.objects.values_list('revision', flat=True).get(pk=self.invoice.pk)
+
+    def test_revision_follows_invoice_item_and_client_changes(self):
+        revision = self.revision()
+        changes = [
+            lambda: self.invoice.save(),
+            lambda: InvoiceItem.objects.filter(pk=self.item.pk).update(item="Renamed"),
+            lambda: InvoiceItem.objects.create(invoice=self.invoice, item="More", quantity=1, rate=1),
+            lambda: InvoiceItem.objects.get(pk=self.item.pk).delete(),
+            lambda: self.client1.save(),
+        ]
+        for change in changes:
+            change()
+            self.assertGreater(self.revision(), revision)
+            revision = self.revision()
+
+        self.invoice.save()
+        self.assertEqual(self.invoice.revision, self.revision())
+
+    def test_detail_view_answers_304_from_the_revision(self):
+        url = reverse('invoice-detail', args=[self.invoice.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        invoice_queries = [q['sql'] for q in queries if 'invoices_invoice' in q['sql']]
+        self.assertEqual(len(invoice_queries), 1)
+
+        self.item.rate = 12
+        self.item.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_page_of_an_earlier_session_is_not_reused(self):
+        # The page posts the recurring form, its CSRF token must be current
+        browser = TestClient(enforce_csrf_checks=True)
+        browser.login(username='testuser', password='secretpassword')
+        url = reverse('invoice-detail', args=[self.invoice.pk])
+        etag = browser.get(url)['ETag']
+        self.assertEqual(browser.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        browser.logout()
+        browser.login(username='testuser', password='secretpassword')
+        response = browser.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        response = browser.post(reverse('invoice-recurring', args=[self.invoice.pk]), {
+            'interval_months': 1,
+            'csrfmiddlewaretoken': response.context['csrf_token'],
+        })
+        self.assertEqual(response.status_code, 302)
+
+    def test_pdf_is_not_rendered_for_a_matching_etag(self):
+        url = reverse('generate_pdf', args=[self.invoice.pk])
+        with mock.patch.object(views, 'get_invoice_pdf_pooled', return_value=b'%PDF-') as render:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(render.call_count, 1)
+
+            self.client1.company = "Ycorp"
+            self.client1.save()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(render.call_count, 2)
+
+            # The PDF shows the issuing user too
+            etag = response['ETag']
+            self.user.first_name = "Renamed"
+            self.user.save()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(render.call_count, 3)
+
+    def test_other_users_invoices_are_not_found(self):
+        other_user = get_user_model().objects.create_user(username='other', password='secretpassword')
+        self.client.force_login(other_user)
+        response = self.client.get(reverse('generate_pdf', args=[self.invoice.pk]))
+        self.assertEqual(response.status_code, 404)
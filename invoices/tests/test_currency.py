@@ -0,0 +1,173 @@
+import datetime
+import io
+import os
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from invoices.billing import run_billing
+from invoices.currency import (
+    RateFileError, UnknownCurrency, clear_rate_cache, get_rate, get_rates, import_rates, read_rates,
+)
+from invoices.models import (
+    Client, ClientSummary, ExchangeRate, Invoice, InvoiceItem, RecurringInvoice, RecurringInvoiceItem, RevenueRollup,
+)
+
+
+class ExchangeRateTests(TestCase):
+
+    def setUp(self):
+        clear_rate_cache()
+        self.addCleanup(clear_rate_cache)
+
+    def import_rates(self, content):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        out = io.StringIO()
+        call_command('import_exchange_rates', path, stdout=out)
+        return out.getvalue()
+
+    def test_import_replaces_rates(self):
+        ExchangeRate.objects.create(currency='JPY', rate='0.0068')
+        ExchangeRate.objects.create(currency='EUR', rate='1.05')
+        output = self.import_rates('currency,rate\neur,1.1\nGBP,1.27\nUSD,1\n')
+        self.assertIn('Removed the rates of JPY', output)
+        self.assertIn('Imported 2 exchange rates to USD', output)
+        self.assertEqual(get_rates(), {'EUR': Decimal('1.1'), 'GBP': Decimal('1.27')})
+        self.assertEqual(get_rate('USD'), Decimal('1'))
+        with self.assertRaises(UnknownCurrency):
+            get_rate('JPY')
+
+    def test_bad_rate_files(self):
+        for content, line in [
+            ('code,rate\nEUR,1.1\n', 1),
+            ('currency,rate\nEUR,1.1\nEURO,2\n', 3),
+            ('currency,rate\nEUR,abc\n', 2),
+            ('currency,rate\nEUR,-1\n', 2),
+            ('currency,rate\nUSD,2\n', 2),
+            ('currency,rate\nEUR,1.1\nEUR,1.2\n', 3),
+        ]:
+            with self.subTest(content=content):
+                with self.assertRaises(RateFileError) as cm:
+                    read_rates(io.StringIO(content))
+                self.assertEqual(cm.exception.line, line)
+        with self.assertRaises(CommandError):
+            self.import_rates('currency,rate\nEUR,abc\n')
+
+    def test_rates_are_cached_until_they_expire(self):
+        ExchangeRate.objects.create(currency='EUR', rate='1.1')
+        self.assertEqual(get_rate('EUR'), Decimal('1.1'))
+        # Bulk updates don't send signals, like an import by another process
+        ExchangeRate.objects.update(rate='1.2')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_rate('EUR'), Decimal('1.1'))
+        with override_settings(EXCHANGE_RATE_CACHE_TTL=-1):
+            self.assertEqual(get_rate('EUR'), Decimal('1.2'))
+        # Saves in this process reload the rates straight away
+        ExchangeRate.objects.create(currency='GBP', rate='1.27')
+        self.assertEqual(get_rate('GBP'), Decimal('1.27'))
+
+
+class InvoiceCurrencyTests(TestCase):
+
+    def setUp(self):
+        clear_rate_cache()
+        self.addCleanup(clear_rate_cache)
+        ExchangeRate.objects.create(currency='EUR', rate='1.5')
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.client1 = Client.objects.create(
+            first_name="Test", last_name="Client", email="test@example.com",
+            company="Xcorp", address1="1234 Paradise Lane",
+            address2="Good Street", country="Zimbabwe",
+            phone_number="+263771811111", currency='EUR',
+            created_by=self.user
+        )
+
+    def test_invoices_keep_the_rate_they_were_issued_at(self):
+        invoice = Invoice.objects.create(title="Invoice", user=self.user, client=self.client1)
+        InvoiceItem.objects.create(invoice=invoice, item="Design", quantity=1, rate='0.05')
+        InvoiceItem.objects.create(invoice=invoice, item="Hosting", quantity=2, rate=10, tax=10)
+        ExchangeRate.objects.filter(currency='EUR').update(rate=2)
+
+        invoice.refresh_from_db()
+        self.assertEqual((invoice.currency, invoice.exchange_rate), ('EUR', Decimal('1.5')))
+        # 22.05 EUR is 33.075 USD
+        self.assertEqual((invoice.invoice_total, invoice.base_total), (Decimal('22.05'), Decimal('33.08')))
+        self.assertEqual(ClientSummary.objects.get(client=self.client1).total_billed, Decimal('33.08'))
+        self.assertEqual(RevenueRollup.objects.get(client=self.client1).revenue, Decimal('33.08'))
+        # The database converts the same way
+        self.assertFalse(Invoice.objects.drifted().exists())
+        Invoice.objects.all().recalculate_totals()
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.base_total, Decimal('33.08'))
+
+        invoice.items.get(item="Design").delete()
+        invoice.refresh_from_db()
+        self.assertEqual((invoice.invoice_total, invoice.base_total), (Decimal('22.00'), Decimal('33.00')))
+        self.assertEqual(ClientSummary.objects.get(client=self.client1).total_billed, Decimal('33.00'))
+        invoice.delete()
+        self.assertEqual(ClientSummary.objects.get(client=self.client1).total_billed, Decimal('0'))
+
+    def test_rates_in_use_are_kept(self):
+        ExchangeRate.objects.create(currency='GBP', rate='1.27')
+        rate_file = io.StringIO('currency,rate\nGBP,1.3\nJPY,0.0068\n')
+        self.assertEqual(import_rates(rate_file), (2, [], ['EUR']))
+        self.assertEqual(get_rates(), {'EUR': Decimal('1.5'), 'GBP': Decimal('1.3'), 'JPY': Decimal('0.0068')})
+        # The client's next invoice still has a rate to be issued at
+        invoice = Invoice.objects.create(title="Invoice", user=self.user, client=self.client1)
+        self.assertEqual(invoice.exchange_rate, Decimal('1.5'))
+
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as f:
+            f.write('currency,rate\nGBP,1.3\n')
+        err = io.StringIO()
+        call_command('import_exchange_rates', path, stdout=io.StringIO(), stderr=err)
+        self.assertIn('Kept the rates of EUR', err.getvalue())
+        self.assertEqual(set(get_rates()), {'EUR', 'GBP'})
+
+    def test_billing_run_converts_totals(self):
+        recurring = RecurringInvoice.objects.create(
+            user=self.user, client=self.client1, title="Retainer", start_date=datetime.date(2020, 1, 1),
+        )
+        RecurringInvoiceItem.objects.create(recurring_invoice=recurring, item="Support", quantity=3, rate=10)
+        run_billing(datetime.date(2020, 2, 1))
+        self.assertEqual(
+            list(Invoice.objects.values_list('currency', 'invoice_total', 'base_total')),
+            [('EUR', Decimal('30.00'), Decimal('45.00'))] * 2,
+        )
+        self.assertEqual(ClientSummary.objects.get(client=self.client1).total_billed, Decimal('90.00'))
+
+    def test_pages_show_converted_totals(self):
+        invoice = Invoice.objects.create(title="Invoice", user=self.user, client=self.client1)
+        InvoiceItem.objects.create(invoice=invoice, item="Hosting", quantity=2, rate=10)
+        self.client.login(username='testuser', password='secretpassword')
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'EUR 20.00')
+        self.assertContains(response, 'USD 30.00')
+        response = self.client.get(reverse('invoice-detail', args=[invoice.pk]))
+        self.assertContains(response, 'Total: EUR 20.00')
+        self.assertContains(response, 'USD 30.00 at 1.5')
+
+    def test_client_currency_needs_a_rate(self):
+        self.client.login(username='testuser', password='secretpassword')
+        data = {
+            'first_name': 'New', 'last_name': 'Client', 'email': 'new@example.com', 'company': 'Ycorp',
+            'address1': 'Street', 'address2': 'Town', 'country': 'Zimbabwe', 'currency': 'ZWL',
+        }
+        response = self.client.post(reverse('new-client'), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('currency', response.context['form'].errors)
+        response = self.client.post(reverse('new-client'), {**data, 'currency': 'EUR'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Client.objects.get(email='new@example.com').currency, 'EUR')
@@ -0,0 +1,124 @@
+import io
+import json
+import os
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from invoices.exporter import iter_invoice_rows, stream_invoice_export
+from invoices.importer import InvoiceImporter, open_rows
+from invoices.models import Invoice, InvoiceItem, Client
+
+
+class InvoiceExportTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.other_user = get_user_model().objects.create_user(
+            username='otheruser',
+            email='other@email.com',
+            password='secretpassword'
+        )
+        self.client1 = Client.objects.create(
+            first_name="Test", last_name="Client", email="test@example.com",
+            company="Xcorp", address1="1234 Paradise Lane",
+            address2="Good Street", country="Zimbabwe",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+        self.invoice = Invoice.objects.create(title="Website", user=self.user, client=self.client1)
+        InvoiceItem.objects.create(invoice=self.invoice, item="Design", quantity=3, rate=20)
+        InvoiceItem.objects.create(invoice=self.invoice, item="Build", quantity=1, rate=20)
+        self.empty_invoice = Invoice.objects.create(title="Draft", user=self.user, client=self.client1)
+        self.invoice3 = Invoice.objects.create(title="Hosting", user=self.user, client=self.client1)
+        InvoiceItem.objects.create(invoice=self.invoice3, item="Server", quantity=12, rate=Decimal('5.50'))
+
+    def test_rows_are_flattened_per_item(self):
+        rows = list(iter_invoice_rows(Invoice.objects.filter(user=self.user), batch_size=2))
+        self.assertEqual(
+            [(row['invoice_ref'], row['item']) for row in rows],
+            [(self.invoice.pk, 'Design'), (self.invoice.pk, 'Build'),
+             (self.empty_invoice.pk, None), (self.invoice3.pk, 'Server')],
+        )
+        self.assertEqual(rows[0]['client_name'], 'Test Client')
+        self.assertEqual(rows[0]['invoice_total'], Decimal('80'))
+
+    def test_queries_grow_with_batches_not_items(self):
+        for i in range(20):
+            InvoiceItem.objects.create(invoice=self.invoice, item=f"Extra {i}", quantity=1, rate=1)
+        # Two batches of invoices and their items, then the empty batch
+        with self.assertNumQueries(5):
+            rows = list(iter_invoice_rows(Invoice.objects.filter(user=self.user), batch_size=2))
+        self.assertEqual(len(rows), 24)
+
+    def test_csv_export_can_be_imported(self):
+        data = ''.join(stream_invoice_export(Invoice.objects.filter(user=self.user)))
+        self.assertTrue(data.startswith('invoice_ref,title,create_date,invoice_total,'))
+
+        events = list(InvoiceImporter(self.user).run(open_rows(io.StringIO(data), 'invoices.csv')))
+        self.assertEqual((events[-1].invoices, events[-1].items, events[-1].errors), (3, 3, 0))
+        self.assertEqual(
+            sorted(Invoice.objects.filter(user=self.user).values_list('title', 'invoice_total')),
+            [('Draft', 0), ('Draft', 0), ('Hosting', Decimal('66')), ('Hosting', Decimal('66')),
+             ('Website', Decimal('80')), ('Website', Decimal('80'))],
+        )
+        draft = Invoice.objects.filter(title='Draft').exclude(pk=self.empty_invoice.pk).get()
+        self.assertFalse(draft.items.exists())
+
+    def test_jsonl_export_round_trip_keeps_invoices_without_items(self):
+        data = ''.join(stream_invoice_export(Invoice.objects.filter(user=self.user), 'jsonl'))
+        events = list(InvoiceImporter(self.user).run(open_rows(io.StringIO(data), 'invoices.jsonl')))
+        self.assertEqual((events[-1].invoices, events[-1].items, events[-1].errors), (3, 3, 0))
+        imported = Invoice.objects.filter(user=self.user).exclude(
+            pk__in=[self.invoice.pk, self.empty_invoice.pk, self.invoice3.pk]
+        ).order_by('pk')
+        self.assertEqual([(invoice.title, invoice.items.count()) for invoice in imported],
+                         [('Website', 2), ('Draft', 0), ('Hosting', 1)])
+
+    def test_rows_with_part_of_an_item_are_rejected(self):
+        rows = [(2, {'invoice_ref': 'A', 'title': 'Half', 'client_id': self.client1.pk,
+                     'item': 'Work', 'quantity': '', 'rate': ''})]
+        events = list(InvoiceImporter(self.user).run(rows))
+        self.assertEqual(events[-1].errors, 1)
+        self.assertIn('quantity', events[0].message)
+        self.assertIn('rate', events[0].message)
+        self.assertFalse(Invoice.objects.filter(title='Half').exists())
+
+    def test_export_view_streams_only_the_users_invoices(self):
+        other_client = Client.objects.create(
+            first_name="Jane", last_name="Doe", email="janedoe@example.com",
+            company="Cybertron Accounting", address1="1234 Energon Lane",
+            address2="Oil Street", country="Cybertron",
+            phone_number="+263771811111",
+            created_by=self.other_user
+        )
+        Invoice.objects.create(title="Not mine", user=self.other_user, client=other_client)
+        self.client.login(username='testuser', password='secretpassword')
+
+        response = self.client.get(reverse('invoice-data-export'), {'format': 'jsonl'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Website', 'Website', 'Draft', 'Hosting'])
+        self.assertEqual(rows[-1]['rate'], '5.50')
+
+        response = self.client.get(reverse('invoice-data-export'), {'client': other_client.pk})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'invoices.jsonl')
+            call_command('export_invoices', path, user='testuser', stdout=io.StringIO())
+            with open(path) as f:
+                lines = f.read().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(json.loads(lines[0])['item'], 'Design')
@@ -0,0 +1,128 @@
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from invoices.models import Invoice, InvoiceItem, Client
+
+
+class FragmentCacheTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.client1 = Client.objects.create(
+            first_name="Test", last_name="Client", email="test@example.com",
+            company="Xcorp", address1="1234 Paradise Lane",
+            address2="Good Street", country="Zimbabwe",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+        self.invoice = Invoice.objects.create(title="Test Invoice", user=self.user, client=self.client1)
+        self.item = InvoiceItem.objects.create(invoice=self.invoice, item="Work", quantity=2, rate=10)
+        self.client.login(username='testuser', password='secretpassword')
+
+    def app_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, [q['sql'] for q in queries if 'invoices_' in q['sql']]
+
+    def test_cached_pages_skip_the_queries(self):
+        for name in ['home', 'invoice-list', 'client-list']:
+            with self.subTest(view=name):
+                first, queries = self.app_queries(reverse(name))
+                self.assertTrue(queries)
+                second, queries = self.app_queries(reverse(name))
+                self.assertEqual(queries, [])
+                self.assertEqual(first.content, second.content)
+
+    def test_item_changes_refresh_the_tables(self):
+        self.client.get(reverse('invoice-list'))
+        self.client.get(reverse('client-list'))
+        self.item.quantity = 3
+        self.item.save()
+        self.assertContains(self.client.get(reverse('invoice-list')), '30.00')
+        self.assertContains(self.client.get(reverse('client-list')), '30.00')
+
+    def test_bulk_item_changes_refresh_the_tables(self):
+        changes = [
+            ('40.00', lambda: InvoiceItem.objects.bulk_create([
+                InvoiceItem(invoice=self.invoice, item="More", quantity=1, rate=20),
+            ])),
+            ('50.00', lambda: InvoiceItem.objects.filter(item="More").update(rate=30)),
+            ('60.00', lambda: InvoiceItem.objects.bulk_update(
+                [InvoiceItem(pk=self.item.pk, invoice=self.invoice, item="Work", quantity=3, rate=10)],
+                ['quantity'],
+            )),
+            ('30.00', lambda: InvoiceItem.objects.filter(item="More").delete()),
+        ]
+        for total, change in changes:
+            with self.subTest(total=total):
+                self.client.get(reverse('invoice-list'))
+                self.client.get(reverse('client-list'))
+                change()
+                self.assertContains(self.client.get(reverse('invoice-list')), total)
+                self.assertContains(self.client.get(reverse('client-list')), total)
+
+    def test_recalculated_totals_refresh_the_tables(self):
+        for invoices in [Invoice.objects.filter(pk=self.invoice.pk), Invoice.objects.all()]:
+            with self.subTest(filtered=bool(invoices.query.has_filters())):
+                # Drifted totals, as left by an UPDATE that bypassed the items
+                caches['default'].clear()
+                Invoice.objects.filter(pk=self.invoice.pk).update(net_total=99, invoice_total=99, base_total=99)
+                self.assertContains(self.client.get(reverse('invoice-list')), '99.00')
+                invoices.recalculate_totals()
+                response = self.client.get(reverse('invoice-list'))
+                self.assertContains(response, '20.00')
+                self.assertNotContains(response, '99.00')
+
+    def test_client_changes_refresh_the_tables(self):
+        self.client.get(reverse('home'))
+        self.client1.first_name = "Renamed"
+        self.client1.save()
+        self.assertContains(self.client.get(reverse('home')), 'Renamed Client')
+
+    def test_new_and_deleted_invoices_refresh_the_tables(self):
+        self.client.get(reverse('invoice-list'))
+        invoice = Invoice.objects.create(title="Second", user=self.user, client=self.client1)
+        self.assertContains(self.client.get(reverse('invoice-list')), f'#{invoice.pk}')
+        invoice.delete()
+        self.assertNotContains(self.client.get(reverse('invoice-list')), f'#{invoice.pk}')
+
+    def test_fragments_are_per_user_and_page(self):
+        self.client.get(reverse('invoice-list'))
+        other_user = get_user_model().objects.create_user(username='other', password='secretpassword')
+        self.client.force_login(other_user)
+        self.assertNotContains(self.client.get(reverse('invoice-list')), f'#{self.invoice.pk}')
+
+        self.client.force_login(self.user)
+        newer = Invoice.objects.create(title="Second", user=self.user, client=self.client1)
+        self.assertContains(self.client.get(reverse('invoice-list')), f'#{newer.pk}')
+        response = self.client.get(reverse('invoice-list'), {'after': newer.pk})
+        self.assertNotContains(response, f'#{newer.pk}')
+        self.assertContains(response, f'#{self.invoice.pk}')
+
+    def test_file_based_cache(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        file_cache = {'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': directory,
+        }}
+        with override_settings(CACHES=file_cache):
+            self.addCleanup(caches['default'].clear)
+            self.app_queries(reverse('client-list'))
+            _, queries = self.app_queries(reverse('client-list'))
+            self.assertEqual(queries, [])
+            self.client1.company = "Ycorp"
+            self.client1.save()
+            self.assertContains(self.client.get(reverse('client-list')), 'Ycorp')
@@ -0,0 +1,141 @@
+import datetime
+import io
+import json
+import os
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db.models.signals import post_save
+from django.test import TestCase
+from django.urls import reverse
+
+from invoices.importer import InvoiceImporter, open_rows
+from invoices.models import Invoice, InvoiceItem, Client, ClientSummary, RevenueRollup
+
+
+CSV_DATA = """invoice_ref,title,client_email,create_date,item,quantity,rate,tax
+A-1,Website,test@example.com,2019-03-01,Design,3,20,0
+A-1,Website,test@example.com,2019-03-01,Build,1,20,0
+A-2,Hosting,JANEDOE@example.com,,Server,12,5.50,
+A-3,Unknown,nobody@example.com,,Server,1,5,
+A-4,Broken,test@example.com,,Server,lots,5,
+"""
+
+
+class InvoiceImportTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.client1 = Client.objects.create(
+            first_name="Test", last_name="Client", email="test@example.com",
+            company="Xcorp", address1="1234 Paradise Lane",
+            address2="Good Street", country="Zimbabwe",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+        self.client2 = Client.objects.create(
+            first_name="Jane", last_name="Doe", email="janedoe@example.com",
+            company="Cybertron Accounting", address1="1234 Energon Lane",
+            address2="Oil Street", country="Cybertron",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+
+    def run_import(self, data, filename='invoices.csv', batch_size=2):
+        importer = InvoiceImporter(self.user, batch_size=batch_size)
+        return list(importer.run(open_rows(io.StringIO(data), filename)))
+
+    def test_csv_import_across_batches(self):
+        events = self.run_import(CSV_DATA)
+
+        errors = [(event.line, event.message) for event in events if event.kind == 'error']
+        self.assertEqual([line for line, _ in errors], [5, 6])
+        self.assertIn('Unknown client', errors[0][1])
+        self.assertIn('quantity', errors[1][1])
+
+        done = events[-1]
+        self.assertEqual((done.kind, done.rows, done.invoices, done.items, done.errors),
+                         ('done', 5, 2, 3, 2))
+
+        website = Invoice.objects.get(title='Website')
+        self.assertEqual(website.client, self.client1)
+        self.assertEqual(website.invoice_total, Decimal('80'))
+        self.assertEqual(website.create_date, datetime.date(2019, 3, 1))
+        hosting = Invoice.objects.get(title='Hosting')
+        self.assertEqual(hosting.client, self.client2)
+        self.assertEqual(hosting.invoice_total, Decimal('66'))
+
+    def test_invoices_are_bulk_inserted(self):
+        saved = []
+
+        def record(sender, instance, **kwargs):
+            saved.append(instance)
+
+        post_save.connect(record, sender=Invoice)
+        try:
+            self.run_import(CSV_DATA)
+        finally:
+            post_save.disconnect(record, sender=Invoice)
+        # No per-invoice saves and their signals, the aggregates are brought
+        # up to date once per batch of invoices
+        self.assertEqual(saved, [])
+        summary = ClientSummary.objects.get(client=self.client1)
+        self.assertEqual((summary.invoice_count, summary.total_billed), (1, Decimal('80')))
+        self.assertEqual(RevenueRollup.objects.get(client=self.client2).revenue, Decimal('66'))
+
+    def test_import_stopped_partway_leaves_correct_totals(self):
+        importer = InvoiceImporter(self.user, batch_size=2)
+        events = importer.run(open_rows(io.StringIO(CSV_DATA), 'invoices.csv'))
+        # The client goes away after the first batch
+        self.assertEqual(next(event for event in events if event.kind == 'progress').invoices, 1)
+        events.close()
+
+        website = Invoice.objects.get(title='Website')
+        self.assertEqual((website.net_total, website.invoice_total, website.base_total),
+                         (Decimal('80'), Decimal('80'), Decimal('80')))
+        summary = ClientSummary.objects.get(client=self.client1)
+        self.assertEqual((summary.invoice_count, summary.total_billed), (1, Decimal('80')))
+        self.assertEqual(RevenueRollup.objects.get(client=self.client1).revenue, Decimal('80'))
+        self.assertFalse(Invoice.objects.drifted().exists())
+
+    def test_jsonl_import(self):
+        rows = [
+            {'invoice_ref': 'B-1', 'title': 'Retainer', 'client_id': self.client2.pk,
+             'item': 'Support', 'quantity': 2, 'rate': '15.00'},
+            {'invoice_ref': 'B-1', 'title': 'Retainer', 'client_id': self.client2.pk,
+             'item': 'Extra', 'quantity': 1, 'rate': '5.00'},
+        ]
+        data = '\n'.join(json.dumps(row) for row in rows) + '\n{not json\n'
+        events = self.run_import(data, filename='invoices.jsonl')
+        self.assertEqual(events[-1].errors, 1)
+        self.assertEqual(Invoice.objects.get().invoice_total, Decimal('35'))
+        self.assertEqual(InvoiceItem.objects.count(), 2)
+
+    def test_import_command(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'invoices.csv')
+            with open(path, 'w') as f:
+                f.write(CSV_DATA)
+            out = io.StringIO()
+            call_command('import_invoices', path, user='testuser',
+                         stdout=out, stderr=io.StringIO())
+        self.assertIn('Imported 2 invoices with 3 items', out.getvalue())
+
+    def test_upload_endpoint_streams_progress(self):
+        self.client.login(username='testuser', password='secretpassword')
+        upload = SimpleUploadedFile('invoices.csv', CSV_DATA.encode(), content_type='text/csv')
+        response = self.client.post(reverse('invoice-import'), {'file': upload, 'batch_size': 2})
+        self.assertEqual(response.status_code, 200)
+
+        events = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([event['kind'] for event in events if event['kind'] != 'error'],
+                         ['progress', 'progress', 'progress', 'done'])
+        self.assertEqual(events[-1]['invoices'], 2)
+        self.assertEqual(Invoice.objects.filter(user=self.user).count(), 2)
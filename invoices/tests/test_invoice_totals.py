@@ -0,0 +1,308 @@
+import io
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from invoices.models import ITEM_TAX, ClientSummary, Invoice, InvoiceItem, Client, RevenueRollup
+
+
+class InvoiceTotalTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.client1 = Client.objects.create(
+            first_name="Test", last_name="Client", email="test@example.com",
+            company="Xcorp", address1="1234 Paradise Lane",
+            address2="Good Street", country="Zimbabwe",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+        self.invoice = Invoice.objects.create(
+            title="Test Invoice 1", user=self.user, client=self.client1,
+        )
+        self.invoice2 = Invoice.objects.create(
+            title="Test Invoice 2", user=self.user, client=self.client1,
+        )
+
+    def stored_total(self, invoice):
+        return Invoice.objects.values_list('invoice_total', flat=True).get(pk=invoice.pk)
+
+    def test_item_create_update_and_delete(self):
+        item = InvoiceItem.objects.create(invoice=self.invoice, item="Design", quantity=3, rate=20)
+        InvoiceItem.objects.create(invoice=self.invoice, item="Build", quantity=1, rate=20)
+        self.assertEqual(self.stored_total(self.invoice), Decimal('80'))
+
+        item.quantity = 1
+        item.save()
+        self.assertEqual(self.stored_total(self.invoice), Decimal('40'))
+
+        InvoiceItem.objects.get(pk=item.pk).delete()
+        self.assertEqual(self.stored_total(self.invoice), Decimal('20'))
+
+    def test_item_save_cost_does_not_grow_with_item_count(self):
+        InvoiceItem.objects.bulk_create([
+            InvoiceItem(invoice=self.invoice2, item=f"Item {i}", quantity=1, rate=1)
+            for i in range(50)
+        ])
+
+        def count_save_queries(invoice):
+            with CaptureQueriesContext(connection) as queries:
+                InvoiceItem(invoice=invoice, item="One more", quantity=1, rate=5).save()
+            return len(queries)
+
+        self.assertEqual(count_save_queries(self.invoice), count_save_queries(self.invoice2))
+        self.assertEqual(self.stored_total(self.invoice2), Decimal('55'))
+
+    def test_moving_item_between_invoices(self):
+        item = InvoiceItem.objects.create(invoice=self.invoice, item="Design", quantity=2, rate=10)
+        item.invoice = self.invoice2
+        item.save()
+        self.assertEqual(self.stored_total(self.invoice), Decimal('0'))
+        self.assertEqual(self.stored_total(self.invoice2), Decimal('20'))
+
+    def test_invoice_save_does_not_overwrite_total(self):
+        InvoiceItem.objects.create(invoice=self.invoice, item="Design", quantity=2, rate=10)
+        stale = Invoice.objects.get(pk=self.invoice.pk)
+        InvoiceItem.objects.create(invoice=self.invoice, item="Build", quantity=1, rate=5)
+        stale.title = "Renamed"
+        stale.save()
+        self.assertEqual(self.stored_total(self.invoice), Decimal('25'))
+
+    def test_bulk_operations(self):
+        items = InvoiceItem.objects.bulk_create([
+            InvoiceItem(invoice=self.invoice, item="Design", quantity=2, rate=10),
+            InvoiceItem(invoice=self.invoice, item="Build", quantity=1, rate=5),
+            InvoiceItem(invoice=self.invoice2, item="Host", quantity=1, rate=7),
+        ])
+        self.assertEqual(self.stored_total(self.invoice), Decimal('25'))
+        self.assertEqual(self.stored_total(self.invoice2), Decimal('7'))
+
+        items = list(InvoiceItem.objects.order_by('id'))
+        items[0].quantity = 3
+        InvoiceItem.objects.bulk_update(items, ['quantity'])
+        self.assertEqual(self.stored_total(self.invoice), Decimal('35'))
+
+        InvoiceItem.objects.filter(invoice=self.invoice).update(rate=1)
+        self.assertEqual(self.stored_total(self.invoice), Decimal('4'))
+
+        self.invoice.items.filter(item="Build").delete()
+        self.assertEqual(self.stored_total(self.invoice), Decimal('3'))
+        self.assertEqual(self.stored_total(self.invoice2), Decimal('7'))
+
+    def test_verify_command_detects_and_repairs_drift(self):
+        InvoiceItem.objects.create(invoice=self.invoice, item="Design", quantity=2, rate=10)
+        Invoice.objects.filter(pk=self.invoice.pk).update(invoice_total=99)
+
+        out = io.StringIO()
+        call_command('verify_invoice_totals', stdout=out)
+        self.assertIn('1 invoice totals have drifted', out.getvalue())
+        self.assertEqual(self.stored_total(self.invoice), Decimal('99'))
+
+        call_command('verify_invoice_totals', fix=True, stdout=out)
+        self.assertEqual(self.stored_total(self.invoice), Decimal('20'))
+
+        out = io.StringIO()
+        call_command('verify_invoice_totals', stdout=out)
+        self.assertIn('All invoice totals match', out.getvalue())
+
+        # The base total feeds the revenue reports, so its drift counts too
+        Invoice.objects.filter(pk=self.invoice.pk).update(base_total=5)
+        call_command('verify_invoice_totals', fix=True, stdout=out)
+        self.assertIn('Repaired 1 drifted invoice totals', out.getvalue())
+        self.assertEqual(Invoice.objects.get(pk=self.invoice.pk).base_total, Decimal('20'))
+
+    def test_create_view_formset_sets_total(self):
+        self.client.login(username='testuser', password='secretpassword')
+        response = self.client.post(reverse('new-invoice'), {
+            'title': 'Formset Invoice',
+            'client': self.client1.pk,
+            'items-TOTAL_FORMS': '2',
+            'items-INITIAL_FORMS': '0',
+            'items-MIN_NUM_FORMS': '0',
+            'items-MAX_NUM_FORMS': '1000',
+            'items-0-item': 'Design',
+            'items-0-quantity': '3',
+            'items-0-rate': '20',
+            'items-1-item': 'Build',
+            'items-1-quantity': '1',
+            'items-1-rate': '20',
+        })
+        self.assertEqual(response.status_code, 302)
+        invoice = Invoice.objects.get(title='Formset Invoice')
+        self.assertEqual(invoice.invoice_total, Decimal('80'))
+
+
+class TaxTotalTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.client1 = Client.objects.create(
+            first_name="Test", last_name="Client", email="test@example.com",
+            company="Xcorp", address1="1234 Paradise Lane",
+            address2="Good Street", country="Zimbabwe",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+        self.invoice = Invoice.objects.create(title="Taxed", user=self.user, client=self.client1)
+
+    def stored_totals(self, invoice=None):
+        return Invoice.objects.values_list('net_total', 'tax_total', 'invoice_total').get(
+            pk=(invoice or self.invoice).pk
+        )
+
+    def test_tax_is_a_rounded_percentage_per_item(self):
+        item = InvoiceItem.objects.create(invoice=self.invoice, item="Design", quantity=3, rate=Decimal('19.99'), tax=15)
+        InvoiceItem.objects.create(invoice=self.invoice, item="Build", quantity=1, rate=Decimal('0.05'), tax=10)
+        # 8.9955 and 0.005 round up to the cent
+        self.assertEqual(item.tax_amount(), Decimal('9.00'))
+        self.assertEqual(self.stored_totals(), (Decimal('60.02'), Decimal('9.01'), Decimal('69.03')))
+
+        invoice = Invoice.objects.with_item_totals().get(pk=self.invoice.pk)
+        self.assertEqual(
+            (invoice.item_net, invoice.item_tax, invoice.item_total),
+            (Decimal('60.02'), Decimal('9.01'), Decimal('69.03')),
+        )
+        self.assertEqual(self.invoice.get_invoice_total(), Decimal('69.03'))
+        self.assertFalse(Invoice.objects.drifted().exists())
+
+    def test_database_rounds_halves_like_python(self):
+        # 5 * 89.66 * 15% is 67.245, just under it in floating point
+        item = InvoiceItem.objects.create(invoice=self.invoice, item="Design", quantity=5, rate=Decimal('89.66'), tax=15)
+        self.assertEqual(item.tax_amount(), Decimal('67.25'))
+        self.assertEqual(InvoiceItem.objects.aggregate(tax=Sum(ITEM_TAX))['tax'], Decimal('67.25'))
+        self.assertFalse(Invoice.objects.drifted().exists())
+
+    def test_totals_follow_item_changes(self):
+        item = InvoiceItem.objects.create(invoice=self.invoice, item="Design", quantity=2, rate=50, tax=10)
+        self.assertEqual(self.stored_totals(), (Decimal('100'), Decimal('10'), Decimal('110')))
+
+        item.tax = 20
+        item.save()
+        self.assertEqual(self.stored_totals(), (Decimal('100'), Decimal('20'), Decimal('120')))
+
+        InvoiceItem.objects.bulk_create([InvoiceItem(invoice=self.invoice, item="Host", quantity=1, rate=10, tax=5)])
+        self.assertEqual(self.stored_totals(), (Decimal('110'), Decimal('20.50'), Decimal('130.50')))
+
+        InvoiceItem.objects.filter(invoice=self.invoice).update(tax=0)
+        self.assertEqual(self.stored_totals(), (Decimal('110'), Decimal('0'), Decimal('110')))
+
+        InvoiceItem.objects.filter(pk=item.pk).update(tax=50)
+        InvoiceItem.objects.filter(item="Host").delete()
+        self.assertEqual(self.stored_totals(), (Decimal('100'), Decimal('50'), Decimal('150')))
+
+        # Billing aggregates count the gross amount
+        self.assertEqual(ClientSummary.objects.get(client=self.client1).total_billed, Decimal('150'))
+        self.assertEqual(RevenueRollup.objects.get(client=self.client1).revenue, Decimal('150'))
+
+    def test_totals_of_ten_thousand_and_more(self):
+        InvoiceItem.objects.create(invoice=self.invoice, item="Build", quantity=2, rate=Decimal('6000'), tax=15)
+        self.assertEqual(self.stored_totals(), (Decimal('12000'), Decimal('1800'), Decimal('13800')))
+        self.invoice.title = "Large"
+        self.invoice.save()
+        self.assertEqual(self.invoice.invoice_total, Decimal('13800'))
+        invoice = Invoice.objects.get(pk=self.invoice.pk)
+        self.assertEqual(invoice.invoice_total, Decimal('13800'))
+        self.assertEqual(invoice.base_total, Decimal('13800'))
+
+    def test_recompute_totals_command(self):
+        InvoiceItem.objects.create(invoice=self.invoice, item="Design", quantity=2, rate=50, tax=10)
+        other = Invoice.objects.create(title="Untaxed", user=self.user, client=self.client1)
+        InvoiceItem.objects.create(invoice=other, item="Build", quantity=1, rate=5)
+        # Totals from before taxes were counted
+        Invoice.objects.filter(pk=self.invoice.pk).update(tax_total=0, invoice_total=100)
+        ClientSummary.objects.filter(client=self.client1).update(total_billed=0)
+
+        out = io.StringIO()
+        call_command('recompute_totals', dry_run=True, stdout=out)
+        self.assertIn('1 invoice totals have drifted', out.getvalue())
+        self.assertEqual(self.stored_totals(), (Decimal('100'), Decimal('0'), Decimal('100')))
+
+        out = io.StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('recompute_totals', stdout=out)
+        self.assertIn('Recomputed 2 invoices, 1 totals had drifted', out.getvalue())
+        self.assertEqual(self.stored_totals(), (Decimal('100'), Decimal('10'), Decimal('110')))
+        self.assertEqual(self.stored_totals(other), (Decimal('5'), Decimal('0'), Decimal('5')))
+        self.assertEqual(ClientSummary.objects.get(client=self.client1).total_billed, Decimal('115'))
+        # Set-based, no statement per invoice
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE "invoices_invoice"')]), 1)
+
+    def test_create_view_accepts_tax(self):
+        self.client.login(username='testuser', password='secretpassword')
+        response = self.client.post(reverse('new-invoice'), {
+            'title': 'Formset Invoice',
+            'client': self.client1.pk,
+            'items-TOTAL_FORMS': '2',
+            'items-INITIAL_FORMS': '0',
+            'items-MIN_NUM_FORMS': '0',
+            'items-MAX_NUM_FORMS': '1000',
+            'items-0-item': 'Design',
+            'items-0-quantity': '3',
+            'items-0-rate': '20',
+            'items-0-tax': '15',
+            'items-1-item': 'Build',
+            'items-1-quantity': '1',
+            'items-1-rate': '20',
+        })
+        self.assertEqual(response.status_code, 302)
+        invoice = Invoice.objects.get(title='Formset Invoice')
+        self.assertEqual(self.stored_totals(invoice), (Decimal('80'), Decimal('9'), Decimal('89')))
+
+        response = self.client.get(reverse('invoice-detail', args=[invoice.pk]))
+        self.assertContains(response, 'Tax: USD 9.00')
+
+
+class TotalsMigrationTests(TransactionTestCase):
+    before = [('invoices', '0008_client_autocomplete_indexes')]
+    after = [('invoices', '0009_invoice_net_and_tax_totals')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_totals_include_the_taxes_of_existing_items(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model(*get_user_model()._meta.label.split('.'))
+        Client = apps.get_model('invoices', 'Client')
+        Invoice = apps.get_model('invoices', 'Invoice')
+        InvoiceItem = apps.get_model('invoices', 'InvoiceItem')
+
+        user = User.objects.create(username='testuser', email='test@email.com')
+        client = Client.objects.create(
+            first_name="Test", last_name="Client", email="test@example.com",
+            company="Xcorp", address1="1234 Paradise Lane", address2="Good Street",
+            country="Zimbabwe", created_by=user,
+        )
+        # Stored without the tax, as the totals used to be
+        invoice = Invoice.objects.create(title="Taxed", user=user, client=client, invoice_total=70)
+        InvoiceItem.objects.create(invoice=invoice, item="Design", quantity=3, rate=20, tax=15)
+        InvoiceItem.objects.create(invoice=invoice, item="Hosting", quantity=1, rate=10)
+
+        apps = self.migrate(self.after)
+        invoice = apps.get_model('invoices', 'Invoice').objects.get(pk=invoice.pk)
+        self.assertEqual((invoice.net_total, invoice.tax_total, invoice.invoice_total),
+                         (Decimal('70'), Decimal('9'), Decimal('79')))
+        summary = apps.get_model('invoices', 'ClientSummary').objects.get(client_id=client.pk)
+        self.assertEqual((summary.invoice_count, summary.total_billed), (1, Decimal('79')))
+        rollup = apps.get_model('invoices', 'RevenueRollup').objects.get(client_id=client.pk)
+        self.assertEqual(rollup.revenue, Decimal('79'))
@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from invoices.models import Invoice, Client
+
+
+class InvoicePaginationTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.client.login(username='testuser', password='secretpassword')
+
+    def create_invoices(self, count):
+        for i in range(count):
+            client = Client.objects.create(
+                first_name=f"Client{i}", last_name="Test", email=f"client{i}@example.com",
+                company="Xcorp", address1="1234 Paradise Lane",
+                address2="Good Street", country="Zimbabwe",
+                created_by=self.user
+            )
+            Invoice.objects.create(title=f"Invoice {i}", user=self.user, client=client)
+
+    def count_queries(self, url_name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_invoices(self):
+        self.create_invoices(3)
+        small = {name: self.count_queries(name) for name in ('home', 'invoice-list')}
+        self.create_invoices(60)
+        large = {name: self.count_queries(name) for name in ('home', 'invoice-list')}
+        self.assertEqual(small, large)
+
+    def test_pages_follow_cursors(self):
+        self.create_invoices(30)
+        newest = Invoice.objects.order_by('-id')
+        response = self.client.get(reverse('invoice-list'))
+        page = response.context['page_obj']
+        self.assertEqual(list(page.object_list), list(newest[:25]))
+        self.assertTrue(page.has_next)
+        self.assertFalse(page.has_previous)
+
+        response = self.client.get(reverse('invoice-list'), {'after': page.next_cursor})
+        page = response.context['page_obj']
+        self.assertEqual(list(page.object_list), list(newest[25:]))
+        self.assertFalse(page.has_next)
+        self.assertTrue(page.has_previous)
+
+        response = self.client.get(reverse('invoice-list'), {'before': page.previous_cursor})
+        page = response.context['page_obj']
+        self.assertEqual(list(page.object_list), list(newest[:25]))
+        self.assertFalse(page.has_previous)
+
+    def test_recent_invoices_on_later_pages(self):
+        self.create_invoices(30)
+        oldest_on_first_page = Invoice.objects.order_by('-id')[24]
+        response = self.client.get(reverse('home'), {'after': oldest_on_first_page.pk})
+        self.assertEqual(list(response.context['recent_invoices']),
+                         list(Invoice.objects.order_by('-id')[:4]))
+        self.assertEqual(len(response.context['invoices']), 5)
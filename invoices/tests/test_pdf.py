@@ -0,0 +1,56 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from invoices import pdf
+from invoices.models import Invoice, InvoiceItem, Client
+
+
+@override_settings(PDF_CACHE_DIR=None)
+class PdfRenderTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.client1 = Client.objects.create(
+            first_name="Test", last_name="Client", email="test@example.com",
+            company="Xcorp", address1="1234 Paradise Lane",
+            address2="Good Street", country="Zimbabwe",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+        self.invoice = Invoice.objects.create(
+            title="Test Invoice 1", user=self.user, client=self.client1,
+        )
+        InvoiceItem.objects.create(
+            invoice=self.invoice, item="Test Line Item", quantity=3, rate=20,
+        )
+
+    def test_render_resources_are_loaded_once(self):
+        with mock.patch.object(pdf, '_render_resources', None), \
+                mock.patch.object(pdf, 'load_render_resources',
+                                  wraps=pdf.load_render_resources) as load:
+            first = pdf.get_render_resources()
+            second = pdf.get_render_resources()
+        self.assertIs(first, second)
+        self.assertEqual(load.call_count, 1)
+
+    def test_render_uses_shared_stylesheet_and_fonts(self):
+        resources = pdf.get_render_resources()
+        with mock.patch.object(pdf.HTML, 'write_pdf', autospec=True,
+                               return_value=b'%PDF') as write_pdf:
+            self.assertEqual(pdf.render_invoice_pdf(self.invoice), b'%PDF')
+        _, kwargs = write_pdf.call_args
+        self.assertIs(kwargs['stylesheets'], resources.stylesheets)
+        self.assertIs(kwargs['font_config'], resources.font_config)
+
+    def test_template_has_no_inline_styles(self):
+        with mock.patch.object(pdf, 'HTML', wraps=pdf.HTML) as html:
+            pdf.render_invoice_pdf(self.invoice)
+        _, kwargs = html.call_args
+        self.assertNotIn('<style>', kwargs['string'])
+        self.assertIn('Test Line Item', kwargs['string'])
@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles import finders
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from invoices import pdf
+from invoices.models import Client, Invoice
+from invoices.pdf_assets import Asset, AssetCache, AssetNotFound, asset_cache, fetch_local_url
+
+
+class LocalUrlFetcherTests(SimpleTestCase):
+
+    def setUp(self):
+        asset_cache.clear()
+        self.addCleanup(asset_cache.clear)
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_static_files_are_read_from_disk_once(self):
+        with open(finders.find('css/invoice-pdf.css'), 'rb') as f:
+            source = f.read()
+        with mock.patch.object(finders, 'find', wraps=finders.find) as find:
+            for _ in range(2):
+                result = fetch_local_url('http://testserver/static/css/invoice-pdf.css')
+                self.assertEqual((result['string'], result['mime_type']), (source, 'text/css'))
+        self.assertEqual(find.call_count, 1)
+
+    def test_media_files_are_read_again_when_replaced(self):
+        path = os.path.join(self.media_root, 'logo.png')
+        with open(path, 'wb') as f:
+            f.write(b'first')
+        self.assertEqual(fetch_local_url('http://testserver/media/logo.png')['string'], b'first')
+        with open(path, 'wb') as f:
+            f.write(b'second')
+        os.utime(path, (0, 0))
+        result = fetch_local_url('http://testserver/media/logo.png')
+        self.assertEqual((result['string'], result['mime_type']), (b'second', 'image/png'))
+
+    def test_nothing_else_is_fetched(self):
+        for url in [
+            'https://example.com/logo.png',
+            'http://testserver/admin/',
+            'http://testserver/static/../settings.py',
+            'http://testserver/static/%2e%2e/manage.py',
+            'http://testserver/static/missing.png',
+            'http://testserver/media/missing.png',
+            'ftp://example.com/static/logo.png',
+        ]:
+            with self.subTest(url=url):
+                with self.assertRaises(AssetNotFound):
+                    fetch_local_url(url)
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = AssetCache(max_bytes=10)
+        cache.set('/a', Asset(b'aaaa', 'text/plain', None))
+        cache.set('/b', Asset(b'bbbb', 'text/plain', None))
+        cache.get('/a')
+        cache.set('/c', Asset(b'cccc', 'text/plain', None))
+        cache.set('/big', Asset(b'x' * 11, 'text/plain', None))
+        self.assertIsNotNone(cache.get('/a'))
+        self.assertIsNone(cache.get('/b'))
+        self.assertIsNotNone(cache.get('/c'))
+        self.assertIsNone(cache.get('/big'))
+
+
+class RenderFetcherTests(TestCase):
+
+    def test_renders_use_the_local_fetcher(self):
+        user = get_user_model().objects.create_user(username='testuser', password='secretpassword')
+        client = Client.objects.create(
+            first_name="Test", last_name="Client", email="test@example.com", company="Xcorp",
+            address1="1234 Paradise Lane", address2="Good Street", country="Zimbabwe", created_by=user,
+        )
+        invoice = Invoice.objects.create(title="Invoice", user=user, client=client)
+        with mock.patch.object(pdf, 'HTML', wraps=pdf.HTML) as html:
+            pdf.render_invoice_pdf(invoice, base_url='http://testserver/invoices/generate/1')
+        _, kwargs = html.call_args
+        self.assertIs(kwargs['url_fetcher'], fetch_local_url)
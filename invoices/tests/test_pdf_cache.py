@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from invoices import pdf
+from invoices.models import Invoice, InvoiceItem, Client
+from invoices.pdf_cache import PdfCache, get_pdf_cache
+
+
+class PdfCacheTests(TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        settings_override = override_settings(PDF_CACHE_DIR=self.cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.client1 = Client.objects.create(
+            first_name="Test", last_name="Client", email="test@example.com",
+            company="Xcorp", address1="1234 Paradise Lane",
+            address2="Good Street", country="Zimbabwe",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+        self.invoice = Invoice.objects.create(
+            title="Test Invoice 1", user=self.user, client=self.client1,
+        )
+        self.invoice_item = InvoiceItem.objects.create(
+            invoice=self.invoice, item="Test Line Item", quantity=3, rate=20,
+        )
+        self.client.login(username='testuser', password='secretpassword')
+
+    def download(self):
+        with mock.patch.object(pdf, 'HTML', wraps=pdf.HTML) as html:
+            response = self.client.get(reverse('generate_pdf', args=[self.invoice.pk]))
+        self.assertEqual(response.status_code, 200)
+        return response.content, html.call_count
+
+    def test_repeat_download_is_served_from_cache(self):
+        first, renders = self.download()
+        self.assertEqual(renders, 1)
+        second, renders = self.download()
+        self.assertEqual(renders, 0)
+        self.assertEqual(first, second)
+
+    def test_item_change_invalidates_cache(self):
+        self.download()
+        self.invoice_item.quantity = 5
+        self.invoice_item.save()
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, str(self.invoice.pk))))
+        _, renders = self.download()
+        self.assertEqual(renders, 1)
+
+    def test_client_change_invalidates_cache(self):
+        self.download()
+        self.client1.company = "Ycorp"
+        self.client1.save()
+        _, renders = self.download()
+        self.assertEqual(renders, 1)
+
+    def test_invoice_delete_invalidates_cache(self):
+        self.download()
+        invoice_id = self.invoice.pk
+        self.invoice.delete()
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, str(invoice_id))))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = PdfCache(self.cache_dir, max_bytes=20)
+        cache.set(1, 'a', b'x' * 8)
+        cache.set(2, 'b', b'x' * 8)
+        os.utime(cache.path(1, 'a'), (1000, 1000))
+        os.utime(cache.path(2, 'b'), (2000, 2000))
+        # Reading entry 1 makes entry 2 the least recently used
+        self.assertEqual(cache.get(1, 'a'), b'x' * 8)
+        cache.set(3, 'c', b'x' * 8)
+
+        self.assertIsNotNone(cache.get(1, 'a'))
+        self.assertIsNone(cache.get(2, 'b'))
+        self.assertIsNotNone(cache.get(3, 'c'))
+
+    def test_writes_under_the_limit_do_not_list_the_cache(self):
+        cache = PdfCache(self.cache_dir, max_bytes=100)
+        cache.set(1, 'a', b'x' * 10)
+        with mock.patch.object(cache, 'entries', wraps=cache.entries) as entries:
+            for invoice_id in range(2, 10):
+                cache.set(invoice_id, 'a', b'x' * 10)
+            self.assertEqual(entries.call_count, 0)
+            # Over the limit, the cache is recounted and the oldest evicted
+            cache.set(10, 'a', b'x' * 20)
+            self.assertEqual(entries.call_count, 1)
+        self.assertLessEqual(sum(size for _, size, _ in cache.entries()), 100)
+
+    def test_evicted_invoices_leave_no_empty_directories(self):
+        cache = PdfCache(self.cache_dir, max_bytes=10)
+        cache.set(1, 'a', b'x' * 8)
+        os.utime(cache.path(1, 'a'), (1000, 1000))
+        cache.set(2, 'b', b'x' * 8)
+        self.assertEqual(os.listdir(self.cache_dir), ['2'])
+
+        # The running total follows invalidations
+        cache.invalidate([2])
+        self.assertEqual(os.listdir(self.cache_dir), [])
+        cache.set(3, 'c', b'x' * 8)
+        self.assertIsNotNone(cache.get(3, 'c'))
+
+    def test_one_cache_per_process(self):
+        self.assertIs(get_pdf_cache(), get_pdf_cache())
+
+    @override_settings(PDF_CACHE_DIR=None)
+    def test_cache_can_be_disabled(self):
+        self.assertIsNone(get_pdf_cache())
+        self.download()
+        _, renders = self.download()
+        self.assertEqual(renders, 1)
@@ -0,0 +1,129 @@
+import io
+import re
+from decimal import Decimal
+from html.parser import HTMLParser
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.template.loader import render_to_string
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from PyPDF2 import PdfFileReader
+
+from invoices import pdf, pdf_reportlab
+from invoices.models import Client, Invoice, InvoiceItem
+
+
+class TextParser(HTMLParser):
+    # Text of an HTML document, one entry per text node
+
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def handle_data(self, data):
+        self.lines.extend(line.strip() for line in data.splitlines() if line.strip())
+
+
+def squash(text):
+    # Engines break lines and space letters differently, and the stylesheet
+    # uppercases headings
+    return re.sub(r'\s+', '', text).lower()
+
+
+@override_settings(PDF_CACHE_DIR=None)
+class ReportLabEngineTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.client1 = Client.objects.create(
+            first_name="Test", last_name="Client", email="test@example.com",
+            company="Xcorp", address1="1234 Paradise Lane",
+            address2="Good Street", country="Zimbabwe",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+        self.invoice = Invoice.objects.create(title="Test Invoice 1", user=self.user, client=self.client1)
+        InvoiceItem.objects.create(invoice=self.invoice, item="Design", quantity=3, rate=20, tax=15)
+        InvoiceItem.objects.create(invoice=self.invoice, item="Hosting", quantity=1, rate=Decimal('9.99'))
+        self.client.login(username='testuser', password='secretpassword')
+
+    def get_invoice(self):
+        return Invoice.objects.select_related('client', 'user').get(pk=self.invoice.pk)
+
+    def pdf_pages(self, data):
+        reader = PdfFileReader(io.BytesIO(data))
+        return [reader.getPage(i).extractText() for i in range(reader.getNumPages())]
+
+    def test_shows_everything_the_template_shows(self):
+        invoice = self.get_invoice()
+        context = pdf.get_invoice_context(invoice, list(invoice.items.order_by('id')))
+        parser = TextParser()
+        parser.feed(render_to_string(pdf.INVOICE_TEMPLATE, context))
+        drawn = squash(''.join(self.pdf_pages(pdf.render_invoice_pdf(invoice, engine=pdf.REPORTLAB))))
+
+        self.assertIn('USD 78.99', parser.lines)
+        # The template's title is the document title rather than page text
+        missing = [line for line in parser.lines if squash(line) not in drawn and line != 'Invoice']
+        self.assertEqual(missing, [])
+
+    def test_long_invoices_continue_on_new_pages(self):
+        InvoiceItem.objects.bulk_create([
+            InvoiceItem(invoice=self.invoice, item=f"Support call {i} " * 3, quantity=1, rate=1)
+            for i in range(80)
+        ])
+        pages = self.pdf_pages(pdf.render_invoice_pdf(self.get_invoice(), engine=pdf.REPORTLAB))
+        self.assertGreater(len(pages), 1)
+        for page in pages[:-1]:
+            self.assertEqual(page.count('Qty/Hours'), 1)
+        text = squash(''.join(pages))
+        for i in range(80):
+            self.assertIn(squash(f'Support call {i}'), text)
+        self.assertIn('balancedue', squash(pages[-1]))
+
+    def test_text_beyond_latin_1(self):
+        self.client1.company = "Ωmega Rupees ₹"
+        self.client1.save()
+        with mock.patch.object(pdf, 'HTML') as html:
+            data = pdf.render_invoice_pdf(self.get_invoice(), engine=pdf.REPORTLAB)
+        self.assertFalse(html.called)
+        self.assertRegex(data, rb'/BaseFont /[A-Z]+\+DejaVuSans-Bold')
+
+        # No glyphs for it in DejaVu Sans, nor for Greek in the standard fonts
+        for company, fonts in [
+            ("東京商事", ('DejaVuSans.ttf', 'DejaVuSans-Bold.ttf')),
+            ("Ωmega", ('missing.ttf', 'missing-bold.ttf')),
+        ]:
+            self.client1.company = company
+            self.client1.save()
+            with self.subTest(company=company), override_settings(PDF_REPORTLAB_FONTS=fonts):
+                with self.assertRaises(pdf_reportlab.UnsupportedText):
+                    pdf_reportlab.draw_invoice_pdf(pdf.get_invoice_context(self.get_invoice()))
+                with mock.patch.object(pdf, 'HTML') as html:
+                    pdf.render_invoice_pdf(self.get_invoice(), engine=pdf.REPORTLAB)
+                self.assertTrue(html.called)
+
+    def test_engine_setting(self):
+        weasyprint_version = pdf.render_version()
+        with override_settings(PDF_ENGINE='reportlab'):
+            self.assertNotEqual(pdf.render_version(), weasyprint_version)
+            with mock.patch.object(pdf, 'HTML') as html:
+                response = self.client.get(reverse('generate_pdf', args=[self.invoice.pk]))
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(html.called)
+            self.assertIn('Design', self.pdf_pages(response.content)[0])
+        with override_settings(PDF_ENGINE='latex'):
+            with self.assertRaises(ImproperlyConfigured):
+                pdf.get_pdf_engine()
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('benchmark_pdf_render', self.invoice.pk, iterations=1, stdout=out)
+        self.assertIn('reportlab: median', out.getvalue())
@@ -0,0 +1,174 @@
+import csv
+import io
+import os
+import tempfile
+import zipfile
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from invoices import pdf
+from invoices.models import Invoice, InvoiceItem, Client
+from invoices.pdf import EXPORT_REPORT_FILENAME, render_invoices, stream_invoices_zip
+
+
+class InProcessPool:
+    # Stands in for the spawned render pool, whose processes can't see the
+    # in-memory test database
+    def __init__(self, broken_after=None):
+        self.submitted = 0
+        self.broken_after = broken_after
+
+    def submit(self, fn, *args):
+        self.submitted += 1
+        future = Future()
+        if self.broken_after is not None and self.submitted > self.broken_after:
+            future.set_exception(BrokenProcessPool('A process in the pool was terminated abruptly'))
+        else:
+            future.set_result(fn(*args))
+        return future
+
+    def shutdown(self):
+        pass
+
+
+@override_settings(PDF_EXPORT_WORKERS=1, PDF_CACHE_DIR=None)
+class BulkPdfExportTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.other_user = get_user_model().objects.create_user(
+            username='otheruser',
+            email='other@email.com',
+            password='secretpassword'
+        )
+
+        self.client1 = Client.objects.create(
+            first_name="Test", last_name="Client", email="test@example.com",
+            company="Xcorp", address1="1234 Paradise Lane",
+            address2="Good Street", country="Zimbabwe",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+        self.client2 = Client.objects.create(
+            first_name="Jane", last_name="Doe", email="janedoe@example.com",
+            company="Cybertron Accounting", address1="1234 Energon Lane",
+            address2="Oil Street", country="Cybertron",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+
+        self.invoice1 = Invoice.objects.create(
+            title="Test Invoice 1", user=self.user, client=self.client1,
+        )
+        InvoiceItem.objects.create(
+            invoice=self.invoice1, item="Test Line Item", quantity=3, rate=20,
+        )
+        self.invoice2 = Invoice.objects.create(
+            title="Test Invoice 2", user=self.user, client=self.client2,
+        )
+        self.client.login(username='testuser', password='secretpassword')
+
+    def read_archive(self, content):
+        archive = zipfile.ZipFile(io.BytesIO(content))
+        report = list(csv.DictReader(io.StringIO(
+            archive.read(EXPORT_REPORT_FILENAME).decode()
+        )))
+        return archive, report
+
+    def test_stream_contains_pdfs_and_report(self):
+        content = b''.join(stream_invoices_zip([self.invoice1.id, self.invoice2.id, 999], workers=1))
+        archive, report = self.read_archive(content)
+
+        self.assertEqual(
+            sorted(archive.namelist()),
+            [EXPORT_REPORT_FILENAME, 'invoice_1.pdf', 'invoice_2.pdf'],
+        )
+        self.assertTrue(archive.read('invoice_1.pdf').startswith(b'%PDF'))
+        self.assertEqual([row['invoice_id'] for row in report], ['1', '2', '999'])
+        self.assertEqual(report[0]['error'], '')
+        self.assertIn('DoesNotExist', report[2]['error'])
+
+    def use_render_pool(self, pool, workers=2):
+        for name, value in [('_render_pool', pool), ('_render_pool_size', workers)]:
+            patcher = mock.patch(f'invoices.pdf.{name}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_render_pool_keeps_order_and_bounds_renders_in_flight(self):
+        pool = InProcessPool()
+        self.use_render_pool(pool)
+        invoice_ids = [self.invoice2.id, 999, self.invoice1.id, 998] * 3
+
+        results, in_flight = [], []
+        for result in render_invoices(invoice_ids):
+            results.append(result)
+            in_flight.append(pool.submitted - len(results))
+
+        # Two per process of the pool, one of which was just handed back
+        self.assertEqual(max(in_flight), 3)
+        self.assertEqual([result.invoice_id for result in results], invoice_ids)
+        for result in results[0::2]:
+            self.assertIsNone(result.error)
+            self.assertTrue(result.pdf.startswith(b'%PDF'))
+        for result in results[1::2]:
+            self.assertIsNone(result.pdf)
+            self.assertIn('DoesNotExist', result.error)
+
+    def test_export_view_uses_render_pool(self):
+        pool = InProcessPool()
+        self.use_render_pool(pool)
+        response = self.client.get(reverse('export-pdfs'))
+        archive, report = self.read_archive(b''.join(response.streaming_content))
+
+        self.assertEqual(pool.submitted, 2)
+        self.assertEqual(archive.namelist(), ['invoice_1.pdf', 'invoice_2.pdf', EXPORT_REPORT_FILENAME])
+        self.assertEqual([row['invoice_id'] for row in report], ['1', '2'])
+
+    def test_broken_render_pool_is_replaced(self):
+        self.use_render_pool(InProcessPool(broken_after=1))
+        with self.assertRaises(BrokenProcessPool):
+            list(render_invoices([self.invoice1.id, self.invoice2.id]))
+        self.assertIsNone(pdf._render_pool)
+
+    def test_export_view_filters_by_client(self):
+        response = self.client.get(reverse('export-pdfs'), {'client': self.client2.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+
+        archive, report = self.read_archive(b''.join(response.streaming_content))
+        self.assertEqual(archive.namelist(), ['invoice_2.pdf', EXPORT_REPORT_FILENAME])
+
+    def test_export_view_rejects_other_users_client(self):
+        other_client = Client.objects.create(
+            first_name="Other", last_name="Client", email="other@example.com",
+            company="Ycorp", address1="1 Lane", address2="Street",
+            country="Zimbabwe", created_by=self.other_user
+        )
+        response = self.client.get(reverse('export-pdfs'), {'client': other_client.pk})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_view_requires_login(self):
+        self.client.logout()
+        response = self.client.get(reverse('export-pdfs'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_export_command(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, 'invoices.zip')
+            call_command('export_invoice_pdfs', output, user='testuser',
+                         workers=1, stdout=io.StringIO())
+            with open(output, 'rb') as f:
+                archive, report = self.read_archive(f.read())
+
+        self.assertEqual(len(report), 2)
+        self.assertIn('invoice_1.pdf', archive.namelist())
@@ -0,0 +1,154 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from invoices import jobs, pdf
+from invoices.jobs import claim_next_job, enqueue_pdf_job, expire_finished_jobs, requeue_stale_jobs, run_pdf_worker
+from invoices.models import Invoice, InvoiceItem, Client, PdfJob
+
+
+class FlakyPool:
+    # In-process stand-in for ProcessPoolExecutor whose first pool dies
+    pools = 0
+
+    def __init__(self, max_workers, initializer):
+        FlakyPool.pools += 1
+        self.broken = FlakyPool.pools == 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        if self.broken:
+            future.set_exception(BrokenProcessPool('A process in the pool was terminated abruptly'))
+        else:
+            future.set_result(fn(*args))
+        return future
+
+
+@override_settings(PDF_CACHE_DIR=None)
+class PdfJobTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.client1 = Client.objects.create(
+            first_name="Test", last_name="Client", email="test@example.com",
+            company="Xcorp", address1="1234 Paradise Lane",
+            address2="Good Street", country="Zimbabwe",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+        self.invoice = Invoice.objects.create(
+            title="Test Invoice 1", user=self.user, client=self.client1,
+        )
+        InvoiceItem.objects.create(
+            invoice=self.invoice, item="Test Line Item", quantity=3, rate=20,
+        )
+        self.client.login(username='testuser', password='secretpassword')
+
+    def test_job_mode_enqueues_and_returns_job_id(self):
+        response = self.client.get(reverse('generate_pdf', args=[self.invoice.pk]), {'mode': 'job'})
+        self.assertEqual(response.status_code, 202)
+        job = PdfJob.objects.get()
+        self.assertEqual(response.json()['id'], job.pk)
+        self.assertEqual(response.json()['status'], PdfJob.PENDING)
+
+    @override_settings(PDF_JOB_MODE=True)
+    def test_job_mode_setting_reuses_queued_job(self):
+        self.client.get(reverse('generate_pdf', args=[self.invoice.pk]))
+        self.client.get(reverse('generate_pdf', args=[self.invoice.pk]))
+        self.assertEqual(PdfJob.objects.count(), 1)
+
+    def test_worker_renders_job_and_download_serves_it(self):
+        job = enqueue_pdf_job(self.invoice, self.user)
+        response = self.client.get(reverse('pdf-job-download', args=[job.pk]))
+        self.assertEqual(response.status_code, 404)
+
+        run_pdf_worker(concurrency=1, once=True)
+
+        status = self.client.get(reverse('pdf-job-status', args=[job.pk])).json()
+        self.assertEqual(status['status'], PdfJob.DONE)
+        response = self.client.get(status['download_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_failed_render_is_reported(self):
+        job = enqueue_pdf_job(self.invoice, self.user)
+        with mock.patch.object(pdf, 'get_invoice_pdf', side_effect=RuntimeError('boom')):
+            run_pdf_worker(concurrency=1, once=True)
+        status = self.client.get(reverse('pdf-job-status', args=[job.pk])).json()
+        self.assertEqual(status['status'], PdfJob.FAILED)
+        self.assertIn('boom', status['error'])
+
+    def test_claim_is_exclusive(self):
+        enqueue_pdf_job(self.invoice, self.user)
+        self.assertIsNotNone(claim_next_job())
+        self.assertIsNone(claim_next_job())
+
+    def test_stale_running_jobs_are_requeued(self):
+        job = enqueue_pdf_job(self.invoice, self.user)
+        PdfJob.objects.filter(pk=job.pk).update(
+            status=PdfJob.RUNNING, started_at=timezone.now() - timedelta(hours=1),
+        )
+        self.assertEqual(requeue_stale_jobs(600), 1)
+        self.assertEqual(claim_next_job().pk, job.pk)
+
+    def test_finished_jobs_expire_with_their_files(self):
+        job = enqueue_pdf_job(self.invoice, self.user)
+        run_pdf_worker(concurrency=1, once=True)
+        job.refresh_from_db()
+        path = job.pdf.path
+        self.assertTrue(os.path.exists(path))
+
+        self.assertEqual(expire_finished_jobs(3600), 0)
+        PdfJob.objects.filter(pk=job.pk).update(finished_at=timezone.now() - timedelta(hours=2))
+        pending = enqueue_pdf_job(self.invoice, self.user)
+        run_pdf_worker(concurrency=1, once=True, max_age=3600)
+        # The job that just finished stays
+        self.assertEqual(list(PdfJob.objects.values_list('pk', flat=True)), [pending.pk])
+        self.assertFalse(os.path.exists(path))
+
+    def test_broken_process_pool_fails_its_jobs_and_carries_on(self):
+        for i in range(2):
+            invoice = Invoice.objects.create(title=f"Invoice {i}", user=self.user, client=self.client1)
+            enqueue_pdf_job(invoice, self.user)
+        enqueue_pdf_job(self.invoice, self.user)
+        FlakyPool.pools = 0
+        with mock.patch.object(jobs, 'ProcessPoolExecutor', FlakyPool):
+            run_pdf_worker(concurrency=2, once=True, poll_interval=0.01)
+        self.assertEqual(FlakyPool.pools, 2)
+        statuses = list(PdfJob.objects.order_by('pk').values_list('status', 'error'))
+        self.assertEqual([status for status, error in statuses], [PdfJob.FAILED, PdfJob.FAILED, PdfJob.DONE])
+        self.assertIn('exited unexpectedly', statuses[0][1])
+
+    def test_other_users_cannot_see_job(self):
+        job = enqueue_pdf_job(self.invoice, self.user)
+        get_user_model().objects.create_user(
+            username='otheruser', email='other@email.com', password='secretpassword'
+        )
+        self.client.login(username='otheruser', password='secretpassword')
+        response = self.client.get(reverse('pdf-job-status', args=[job.pk]))
+        self.assertEqual(response.status_code, 404)
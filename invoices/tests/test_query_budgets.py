@@ -0,0 +1,135 @@
+import json
+import logging
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from invoices.middleware import QueryInstrumentationMiddleware
+from invoices.models import Invoice, InvoiceItem, Client
+from invoices.testing import QueryBudgetMixin
+
+
+# Most queries a view may run for a logged in user, whatever the data size.
+# Session and user lookups account for two of them.
+QUERY_BUDGETS = {
+    'home': 3,
+    'invoice-list': 3,
+    'invoice-detail': 5,  # including the ETag lookup
+    'new-invoice': 3,
+    'invoice-edit': 4,
+    'invoice-delete': 3,
+    'generate_pdf': 5,  # including the ETag lookup
+    'client-list': 3,
+    'client-detail': 3,
+    'new-client': 2,
+    'client-edit': 3,
+    'client-statement': 5,  # however many invoices it renders
+    'client-autocomplete': 6,  # one per autocomplete index
+    'invoice-search': 4,
+    'invoice-data-export': 5,  # a batch of invoices with their items, then the empty batch
+    'revenue-report': 3,
+    'revenue-report-json': 3,
+    'invoice-bulk-api': 25,  # however many invoices are posted
+    'invoice-recurring': 8,  # including the savepoint
+}
+
+
+@override_settings(PDF_CACHE_DIR=None)
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        for i in range(10):
+            client = Client.objects.create(
+                first_name=f"Client{i}", last_name="Test", email=f"client{i}@example.com",
+                company="Xcorp", address1="1234 Paradise Lane",
+                address2="Good Street", country="Zimbabwe",
+                created_by=self.user
+            )
+            invoice = Invoice.objects.create(title=f"Invoice {i}", user=self.user, client=client)
+            InvoiceItem.objects.bulk_create([
+                InvoiceItem(invoice=invoice, item=f"Item {j}", quantity=1, rate=10)
+                for j in range(5)
+            ])
+        self.invoice = invoice
+        self.client.login(username='testuser', password='secretpassword')
+
+    def url_args(self, name):
+        if name in ('invoice-detail', 'invoice-edit', 'invoice-delete', 'generate_pdf'):
+            return [self.invoice.pk]
+        if name in ('client-detail', 'client-edit', 'client-statement'):
+            return [self.invoice.client_id]
+        if name == 'invoice-recurring':
+            return [self.invoice.pk]
+        return []
+
+    def request_kwargs(self, name):
+        # How each view is called, for those not answering a plain GET
+        if name == 'client-autocomplete':
+            return {'data': {'q': 'Client'}}
+        if name == 'invoice-search':
+            return {'data': {'q': 'Invoice'}}
+        if name == 'invoice-bulk-api':
+            payload = [
+                {'title': f'Bulk {i}', 'client_id': self.invoice.client_id,
+                 'items': [{'item': f'Item {j}', 'quantity': 1, 'rate': '10'} for j in range(5)]}
+                for i in range(10)
+            ]
+            payload.append({'id': self.invoice.pk, 'title': 'Renamed', 'client_id': self.invoice.client_id,
+                            'items': [{'item': 'Item', 'quantity': 2, 'rate': '10'}]})
+            return {'method': 'post', 'data': json.dumps(payload), 'content_type': 'application/json'}
+        if name == 'invoice-recurring':
+            return {'method': 'post', 'data': {'interval_months': 1}, 'follow': False}
+        return {}
+
+    def test_views_stay_within_query_budget(self):
+        for name, budget in QUERY_BUDGETS.items():
+            with self.subTest(view=name):
+                response = self.assertViewQueryBudget(
+                    reverse(name, args=self.url_args(name)), budget, **self.request_kwargs(name)
+                )
+                self.assertIn(response.status_code, (200, 302))
+
+    def test_budget_catches_n_plus_one(self):
+        with self.assertRaises(AssertionError):
+            with self.assertQueryBudget(max_queries=3):
+                for invoice in Invoice.objects.all():
+                    invoice.client.company
+
+    def test_budget_catches_duplicate_queries(self):
+        with self.assertRaises(AssertionError):
+            with self.assertQueryBudget(max_queries=100):
+                for _ in range(2):
+                    Invoice.objects.get(pk=self.invoice.pk)
+
+
+class QueryInstrumentationMiddlewareTests(TestCase):
+
+    def setUp(self):
+        get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.client.login(username='testuser', password='secretpassword')
+
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('invoice-list'))
+        self.assertNotIn(QueryInstrumentationMiddleware.header, response)
+
+    @override_settings(QUERY_INSTRUMENTATION=True)
+    def test_reports_stats_in_header_and_log(self):
+        with self.assertLogs('invoices.queries', level=logging.INFO) as logs:
+            response = self.client.get(reverse('invoice-list'))
+        header = response[QueryInstrumentationMiddleware.header]
+        self.assertIn('view=invoice-list', header)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'invoice-list')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertEqual(record['duplicates'], 0)
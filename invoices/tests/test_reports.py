@@ -0,0 +1,101 @@
+import datetime
+import io
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from invoices.models import Invoice, InvoiceItem, Client, RevenueRollup
+from invoices.reports import revenue_report
+
+
+class RevenueReportTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.client1 = Client.objects.create(
+            first_name="Test", last_name="Client", email="test@example.com",
+            company="Xcorp", address1="1234 Paradise Lane",
+            address2="Good Street", country="Zimbabwe",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+        self.client2 = Client.objects.create(
+            first_name="Jane", last_name="Doe", email="janedoe@example.com",
+            company="Cybertron Accounting", address1="1234 Energon Lane",
+            address2="Oil Street", country="Cybertron",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+        for client, create_date, rate in [
+            (self.client1, datetime.date(2019, 1, 10), 10),
+            (self.client1, datetime.date(2019, 2, 10), 20),
+            (self.client2, datetime.date(2019, 2, 20), 30),
+            (self.client2, datetime.date(2019, 4, 1), 40),
+        ]:
+            invoice = Invoice.objects.create(title="Invoice", user=self.user, client=client)
+            Invoice.objects.filter(pk=invoice.pk).update(create_date=create_date)
+            InvoiceItem.objects.create(invoice=invoice, item="Work", quantity=1, rate=rate)
+        # The dates were changed behind the rollups' back
+        RevenueRollup.objects.rebuild()
+
+    def test_monthly_report(self):
+        rows = revenue_report(self.user)
+        self.assertEqual(
+            [(row['period'], row['invoice_count'], row['revenue']) for row in rows],
+            [(datetime.date(2019, 1, 1), 1, Decimal('10')),
+             (datetime.date(2019, 2, 1), 2, Decimal('50')),
+             (datetime.date(2019, 4, 1), 1, Decimal('40'))],
+        )
+
+    def test_quarterly_report_by_client_within_range(self):
+        rows = revenue_report(self.user, start_date=datetime.date(2019, 2, 15),
+                              period='quarter', by_client=True)
+        self.assertEqual(
+            [(row['period'], row['client']['company'], row['revenue']) for row in rows],
+            [(datetime.date(2019, 1, 1), 'Xcorp', Decimal('20')),
+             (datetime.date(2019, 1, 1), 'Cybertron Accounting', Decimal('30')),
+             (datetime.date(2019, 4, 1), 'Cybertron Accounting', Decimal('40'))],
+        )
+
+    def test_rollups_follow_item_and_invoice_changes(self):
+        invoice = Invoice.objects.filter(client=self.client2).latest('create_date')
+        item = invoice.items.get()
+        item.rate = 45
+        item.save()
+        self.assertEqual(revenue_report(self.user)[-1]['revenue'], Decimal('45'))
+
+        invoice.delete()
+        self.assertEqual(revenue_report(self.user)[-1]['period'], datetime.date(2019, 2, 1))
+
+    def test_report_does_not_read_invoices(self):
+        with self.assertNumQueries(1):
+            rows = revenue_report(self.user, period='quarter', by_client=True)
+        self.assertEqual(len(rows), 3)
+
+    def test_rebuild_command(self):
+        RevenueRollup.objects.all().delete()
+        call_command('rebuild_revenue_rollups', stdout=io.StringIO())
+        self.assertEqual(RevenueRollup.objects.count(), 4)
+
+    def test_report_views(self):
+        self.client.login(username='testuser', password='secretpassword')
+        response = self.client.get(reverse('revenue-report'), {'period': 'quarter'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'revenue_report.html')
+        self.assertContains(response, '2019-04')
+
+        response = self.client.get(reverse('revenue-report-json'), {'end_date': '2019-01-31'})
+        self.assertEqual(response.json(), {
+            'period': 'month',
+            'rows': [{'period': '2019-01-01', 'invoice_count': 1, 'revenue': '10.00'}],
+        })
+
+        response = self.client.get(reverse('revenue-report-json'), {'period': 'week'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,135 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from invoices.operations import SEARCH_TRIGGERS, autocomplete_indexes
+from invoices.search import SEARCH_TABLE, rebuild_search_index, search_invoices
+from invoices.models import Invoice, InvoiceItem, Client
+
+
+class InvoiceSearchTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.other_user = get_user_model().objects.create_user(
+            username='otheruser',
+            email='other@email.com',
+            password='secretpassword'
+        )
+        self.client1 = Client.objects.create(
+            first_name="Test", last_name="Client", email="test@example.com",
+            company="Xcorp", address1="1234 Paradise Lane",
+            address2="Good Street", country="Zimbabwe",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+        self.client2 = Client.objects.create(
+            first_name="Tendai", last_name="Moyo", email="tendai@acme.co.zw",
+            company="Acme Logistics", address1="1 Main Road",
+            address2="", country="Zimbabwe",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+        self.website = Invoice.objects.create(title="Website redesign", user=self.user, client=self.client1)
+        InvoiceItem.objects.create(invoice=self.website, item="Hosting", quantity=1, rate=20)
+        self.audit = Invoice.objects.create(title="Security audit", user=self.user, client=self.client2)
+        InvoiceItem.objects.create(invoice=self.audit, item="Website review", quantity=1, rate=50)
+
+        other_client = Client.objects.create(
+            first_name="Other", last_name="Client", email="other@example.com",
+            company="Ycorp", address1="1 Lane", address2="", country="Zimbabwe",
+            phone_number="+263771811111", created_by=self.other_user
+        )
+        Invoice.objects.create(title="Website", user=self.other_user, client=other_client)
+
+    def search(self, text):
+        return [invoice['pk'] for invoice in search_invoices(self.user, text)]
+
+    def test_ranked_and_scoped_to_user(self):
+        # A title match outranks an item match, the other user's invoice is left out
+        self.assertEqual(self.search('website'), [self.website.pk, self.audit.pk])
+
+    def test_older_title_match_outranks_many_newer_item_matches(self):
+        newer = Invoice.objects.bulk_insert(
+            Invoice(title=f"Maintenance {i}", user=self.user, client=self.client1) for i in range(250)
+        )
+        InvoiceItem.objects.bulk_create(
+            [InvoiceItem(invoice=invoice, item="Website updates", quantity=1, rate=5) for invoice in newer],
+            update_totals=False,
+        )
+        results = self.search('website')
+        self.assertEqual(results[0], self.website.pk)
+        # Equal ranks come newest first
+        self.assertEqual(results[1:4], [invoice.pk for invoice in newer[::-1][:3]])
+
+    def test_prefix_and_all_words(self):
+        self.assertEqual(self.search('acme logist'), [self.audit.pk])
+        self.assertEqual(self.search('sec'), [self.audit.pk])
+        # Only the last word is a prefix
+        self.assertEqual(self.search('acm logistics'), [])
+        self.assertEqual(self.search('tendai@acme.co.zw'), [self.audit.pk])
+        self.assertEqual(self.search('website hosting'), [self.website.pk])
+        self.assertEqual(self.search('website nothing'), [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search('"audit*'), [self.audit.pk])
+        # OR is just a word nothing contains
+        self.assertEqual(self.search('hosting OR audit'), [])
+        self.assertEqual(self.search(' - " * '), [])
+
+    def test_index_follows_changes(self):
+        self.website.title = "Logo"
+        self.website.save()
+        self.assertEqual(self.search('redesign'), [])
+        self.assertEqual(self.search('logo'), [self.website.pk])
+
+        self.client1.company = "Zeta Holdings"
+        self.client1.save()
+        self.assertEqual(self.search('zeta'), [self.website.pk])
+
+        item = self.website.items.get()
+        item.item = "Domains"
+        item.save()
+        self.assertEqual(self.search('hosting'), [])
+        self.assertEqual(self.search('domains'), [self.website.pk])
+        InvoiceItem.objects.filter(invoice=self.website).delete()
+        self.assertEqual(self.search('domains'), [])
+
+        self.audit.delete()
+        self.assertEqual(self.search('audit'), [])
+
+    def test_rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        self.assertEqual(self.search('website'), [])
+        self.assertEqual(rebuild_search_index(), 3)
+        self.assertEqual(self.search('website'), [self.website.pk, self.audit.pk])
+        call_command('rebuild_search_index', stdout=open('/dev/null', 'w'))
+        self.assertEqual(self.search('website'), [self.website.pk, self.audit.pk])
+
+    def test_view(self):
+        self.client.login(username='testuser', password='secretpassword')
+        with self.assertNumQueries(4):
+            # session, user, FTS lookup, invoices
+            response = self.client.get(reverse('invoice-search'), {'q': 'acme'})
+        self.assertContains(response, 'Security audit')
+        self.assertNotContains(response, 'Website redesign')
+        response = self.client.get(reverse('invoice-search'))
+        self.assertEqual(response.context['results'], [])
+
+    def test_migrations_keep_triggers_and_indexes(self):
+        # Table rebuilds in later migrations must not lose them, see invoices.operations
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT type, name FROM sqlite_master WHERE type IN ('trigger', 'index')")
+            objects = set(cursor.fetchall())
+        self.assertEqual(len(SEARCH_TRIGGERS), 7)
+        for name in SEARCH_TRIGGERS:
+            self.assertIn(('trigger', name), objects)
+        for name in autocomplete_indexes.INDEXES:
+            self.assertIn(('index', name), objects)
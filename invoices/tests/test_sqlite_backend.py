@@ -0,0 +1,65 @@
+import os
+import sqlite3
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import SimpleTestCase
+
+from invoicebuilder.db.sqlite3.base import DatabaseWrapper
+from invoices.stress import run_profile
+
+
+class ConcurrentSqliteBackendTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'test.sqlite3')
+
+    def get_wrapper(self, **options):
+        profile = settings.SQLITE_PROFILES['concurrent']
+        settings_dict = dict(connection.settings_dict, NAME=self.path,
+                             OPTIONS=dict(profile['OPTIONS'], **options))
+        wrapper = DatabaseWrapper(settings_dict, alias='concurrent-test')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_init_command_pragmas(self):
+        with self.get_wrapper().cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_transactions_take_the_write_lock_when_they_begin(self):
+        wrapper = self.get_wrapper()
+        wrapper.ensure_connection()
+        wrapper._start_transaction_under_autocommit()
+        other = sqlite3.connect(self.path, timeout=0)
+        self.addCleanup(other.close)
+        with self.assertRaisesMessage(sqlite3.OperationalError, 'locked'):
+            other.execute('BEGIN IMMEDIATE')
+        wrapper.connection.rollback()
+        other.execute('BEGIN IMMEDIATE')
+        other.rollback()
+
+    def test_invalid_transaction_mode(self):
+        wrapper = self.get_wrapper(transaction_mode='SOMETIMES')
+        wrapper.ensure_connection()
+        with self.assertRaises(ImproperlyConfigured):
+            wrapper._start_transaction_under_autocommit()
+
+
+class StressTests(SimpleTestCase):
+
+    def test_concurrent_profile_has_no_lock_errors(self):
+        summary = run_profile('concurrent', writers=2, readers=2, seconds=1.5, invoices=50)
+        for role in ('writers', 'readers'):
+            self.assertEqual(summary[role]['processes'], 2)
+            self.assertGreater(summary[role]['ops'], 0)
+            self.assertEqual(summary[role]['lock_errors'], 0)
+            self.assertEqual(summary[role]['errors'], [])
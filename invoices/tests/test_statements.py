@@ -0,0 +1,85 @@
+import datetime
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from PyPDF2 import PdfFileReader
+
+from invoices import pdf
+from invoices.models import Client, Invoice, InvoiceItem
+
+
+class StatementTests(TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        settings_override = override_settings(PDF_CACHE_DIR=self.cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = get_user_model().objects.create_user(
+            username='testuser',
+            email='test@email.com',
+            password='secretpassword'
+        )
+        self.client1 = Client.objects.create(
+            first_name="Test", last_name="Client", email="test@example.com",
+            company="Xcorp", address1="1234 Paradise Lane",
+            address2="Good Street", country="Zimbabwe",
+            phone_number="+263771811111",
+            created_by=self.user
+        )
+        self.invoices = []
+        for i, create_date in enumerate([datetime.date(2020, 1, 10), datetime.date(2020, 2, 10),
+                                         datetime.date(2020, 3, 10)]):
+            invoice = Invoice.objects.create(title=f"Invoice {i}", user=self.user, client=self.client1)
+            Invoice.objects.filter(pk=invoice.pk).update(create_date=create_date)
+            InvoiceItem.objects.create(invoice=invoice, item="Work", quantity=i + 1, rate=20)
+            self.invoices.append(invoice)
+        self.client.login(username='testuser', password='secretpassword')
+
+    def download(self, **params):
+        with mock.patch.object(pdf, 'HTML', wraps=pdf.HTML) as html:
+            response = self.client.get(reverse('client-statement', args=[self.client1.pk]), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        return PdfFileReader(io.BytesIO(response.content)), html.call_count
+
+    def test_statement_has_a_summary_and_every_invoice(self):
+        statement, renders = self.download()
+        self.assertEqual(statement.getNumPages(), 4)
+        self.assertEqual(renders, 3)
+        self.assertEqual(
+            [bookmark.title for bookmark in statement.getOutlines()],
+            ['Statement'] + [f'Invoice #{invoice.pk}' for invoice in self.invoices],
+        )
+
+    def test_only_changed_invoices_are_rendered_again(self):
+        self.download()
+        statement, renders = self.download()
+        self.assertEqual((statement.getNumPages(), renders), (4, 0))
+        item = self.invoices[1].items.get()
+        item.quantity = 10
+        item.save()
+        statement, renders = self.download()
+        self.assertEqual((statement.getNumPages(), renders), (4, 1))
+
+    def test_statement_period(self):
+        statement, renders = self.download(start_date='2020-02-01', end_date='2020-02-29')
+        self.assertEqual((statement.getNumPages(), renders), (2, 1))
+        response = self.client.get(reverse('client-statement', args=[self.client1.pk]), {
+            'start_date': '2020-03-01', 'end_date': '2020-02-01',
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_other_users_clients_are_not_found(self):
+        other = get_user_model().objects.create_user(username='other', password='secretpassword')
+        self.client.force_login(other)
+        response = self.client.get(reverse('client-statement', args=[self.client1.pk]))
+        self.assertEqual(response.status_code, 404)
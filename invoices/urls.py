@@ -12,12 +12,25 @@ urlpatterns = [
     path('invoices/edit/<int:pk>/', views.InvoiceUpdateView.as_view(), name='invoice-edit'),
     path('invoices/delete/<int:pk>/', views.InvoiceDeleteView.as_view(), name='invoice-delete'),
     path('invoices/delete/<int:pk>/', views.InvoiceDeleteView.as_view(), name='invoice-delete'),
+    path('invoices/<int:pk>/recurring/', views.make_invoice_recurring, name='invoice-recurring'),
     path('invoices/generate/<invoice_id>', views.generate_pdf_invoice, name='generate_pdf'),
+    path('invoices/export/', views.export_pdf_invoices, name='export-pdfs'),
+    path('invoices/export/data/', views.export_invoice_data, name='invoice-data-export'),
+    path('invoices/search/', views.InvoiceSearchView.as_view(), name='invoice-search'),
+    path('invoices/import/', views.import_invoices, name='invoice-import'),
+    path('invoices/pdf-jobs/<int:pk>/', views.pdf_job_status, name='pdf-job-status'),
+    path('invoices/pdf-jobs/<int:pk>/download/', views.download_pdf_job, name='pdf-job-download'),
+    path('api/invoices/bulk/', views.bulk_invoices_api, name='invoice-bulk-api'),
     # Clients
     path('clients/', views.ClientListView.as_view(), name='client-list'),
+    path('clients/autocomplete/', views.client_autocomplete, name='client-autocomplete'),
     path('clients/new/', views.ClientCreateView.as_view(), name='new-client'),
     path('clients/<int:pk>/', views.ClientDetailView.as_view(), name='client-detail'),
     path('clients/edit/<int:pk>/', views.ClientUpdateView.as_view(), name='client-edit'),
+    path('clients/<int:pk>/statement/', views.client_statement, name='client-statement'),
+    # Reports
+    path('reports/revenue/', views.RevenueReportView.as_view(), name='revenue-report'),
+    path('reports/revenue.json', views.revenue_report_json, name='revenue-report-json'),
 
 
     # path('logout', )
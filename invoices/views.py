@@ -1,58 +1,128 @@
+import hashlib
+import json
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404
-from django.template.loader import render_to_string
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404, redirect
+from django.views.decorators.http import require_POST
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse, reverse_lazy
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.middleware.csrf import get_token
 from django.forms.models import inlineformset_factory
-from django.views.generic import View, ListView, DetailView, CreateView, UpdateView, DeleteView
-
-from .models import Invoice, Client, InvoiceItem
-from .forms import InvoiceCreateForm
+from django.views.generic import View, ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
 
-from weasyprint import HTML
+from .models import Invoice, Client, InvoiceItem, PdfJob, RecurringInvoice
+from .forms import (
+    InvoiceCreateForm, InvoiceDataExportForm, InvoiceExportForm, InvoiceImportForm, InvoiceItemsForm,
+    RecurringInvoiceForm, RevenueReportForm, StatementForm,
+)
+from .api import save_invoices, validate_invoices
+from .autocomplete import InvalidCursor, autocomplete_clients
+from .exporter import EXPORT_FORMATS, stream_invoice_export
+from .fragments import FragmentCacheMixin
+from .importer import InvoiceImporter, open_rows
+from .jobs import enqueue_pdf_job
+from .pagination import KeysetPaginationMixin
+from .reports import revenue_report
+from .search import MAX_RESULTS, search_invoices
+from .pdf import filter_invoices, get_invoice_pdf_pooled, invoice_pdf_filename, render_version, stream_invoices_zip
+from .pdf_cache import issuer_parts, template_version
+from .statements import build_statement_pdf, statement_filename
 
 
 InvoiceItemsFormset = inlineformset_factory(
-    Invoice, InvoiceItem, fields=('item', 'quantity', 'rate',),
+    Invoice, InvoiceItem, form=InvoiceItemsForm, fields=('item', 'quantity', 'rate', 'tax'),
     extra=1,
 )
 
 
-class HomePage(LoginRequiredMixin, ListView):
+def invoice_validators(request, invoice_id, version):
+    """
+    ETag and Last-Modified timestamp of one of the user's invoices, read
+    with a single primary key lookup. ``version`` identifies everything
+    else the response is rendered from, see page_version().
+    """
+    row = Invoice.objects.filter(user=request.user, pk=invoice_id).values_list(
+        'revision', 'modified_at'
+    ).first()
+    if row is None:
+        raise Http404("No invoice found matching the query")
+    revision, modified_at = row
+    return quote_etag(f'{invoice_id}-{revision}-{version[:16]}'), int(modified_at.timestamp())
+
+
+def page_version(request, *template_names):
+    """
+    Version of an HTML page for ``invoice_validators``: its templates, and
+    the user, session and CSRF token it is rendered for. A page kept from
+    an earlier session would post its forms with a stale CSRF token.
+    """
+    get_token(request)
+    user = request.user
+    parts = [template_version(name) for name in template_names]
+    parts += [
+        user.pk, user.get_username(), user.first_name, user.last_name, user.email,
+        request.session.session_key, request.META['CSRF_COOKIE'],
+    ]
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def pdf_version(request):
+    """
+    Version of an invoice PDF for ``invoice_validators``: the engine and
+    layout it is rendered with, and the details of the user issuing it
+    """
+    parts = [render_version(), *issuer_parts(request.user)]
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Cache, but check back every time; unchanged invoices cost a 304
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+class HomePage(LoginRequiredMixin, FragmentCacheMixin, KeysetPaginationMixin, ListView):
     template_name = 'home.html'
+    fragment_template_name = 'fragments/home_invoices.html'
     context_object_name = 'invoices'
+    recent_invoices_count = 4
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            # Ensure queryset is cached
-            invoices = Invoice.objects.filter(user=self.request.user)
-            return invoices
+            # The client is shown on every row, fetch it in the same query
+            return Invoice.objects.filter(user=self.request.user).select_related('client')
         else:
             return Invoice.objects.none()
 
     def get_context_data(self, **kwargs):
         # Call the base implementation first to get the data
         context = super(HomePage, self).get_context_data(**kwargs)
-        try:
-            recent_invoices = context['invoices'].order_by('-id')[:4]
-        except (IndexError, AttributeError):
-            recent_invoices = None
+        page = context['page_obj']
+        if page.is_first:
+            # The most recent invoices head the first page already
+            recent_invoices = page.object_list[:self.recent_invoices_count]
+        else:
+            recent_invoices = self.get_queryset().order_by('-id')[:self.recent_invoices_count]
         context['recent_invoices'] = recent_invoices
         return context
 
 
-
-
-class InvoiceListView(LoginRequiredMixin, ListView):
+class InvoiceListView(LoginRequiredMixin, FragmentCacheMixin, KeysetPaginationMixin, ListView):
 
     template_name = 'dashboard.html'
+    fragment_template_name = 'fragments/invoice_table.html'
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            # Ensure queryset is cached
-            invoices = Invoice.objects.filter(user=self.request.user)
-            return invoices
+            return Invoice.objects.filter(user=self.request.user).select_related('client')
         else:
             return Invoice.objects.none()
 
@@ -60,10 +130,18 @@ class InvoiceDetailView(LoginRequiredMixin, DetailView):
 
     template_name = 'invoice_detail.html'
 
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = invoice_validators(
+            request, kwargs['pk'], page_version(request, self.template_name, 'base.html'),
+        )
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified)
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return Invoice.objects.filter(user=self.request.user)
+            return Invoice.objects.filter(user=self.request.user).select_related('client', 'user')
         else:
             return Invoice.objects.none()
 
@@ -162,7 +240,7 @@ class ClientCreateView(LoginRequiredMixin, CreateView):
     template_name = 'new_client.html'
     fields = (
                 'first_name', 'last_name', 'email', 'company',
-                'address1', 'address2', 'country', 'phone_number'
+                'address1', 'address2', 'country', 'phone_number', 'currency',
     )
 
     def form_valid(self, form):
@@ -170,12 +248,13 @@ class ClientCreateView(LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
-class ClientListView(LoginRequiredMixin, ListView):
+class ClientListView(LoginRequiredMixin, FragmentCacheMixin, ListView):
     template_name = 'clients.html'
+    fragment_template_name = 'fragments/client_table.html'
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return Client.objects.filter(created_by=self.request.user)
+            return Client.objects.filter(created_by=self.request.user).select_related('summary')
         else:
             return Client.objects.none()
 
@@ -185,7 +264,7 @@ class ClientDetailView(LoginRequiredMixin, DetailView):
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return Client.objects.filter(created_by=self.request.user)
+            return Client.objects.filter(created_by=self.request.user).select_related('summary')
         else:
             return Client.objects.none()
 
@@ -193,7 +272,7 @@ class ClientUpdateView(LoginRequiredMixin, UpdateView):
     template_name = 'edit_client.html'
     fields = [
         'first_name', 'last_name', 'email', 'company',
-        'address1', 'address2', 'country', 'phone_number',
+        'address1', 'address2', 'country', 'phone_number', 'currency',
     ]
 
 
@@ -204,30 +283,225 @@ class ClientUpdateView(LoginRequiredMixin, UpdateView):
             return Client.objects.none()
 
 
+@login_required
+def client_autocomplete(request):
+    """One page of the user's clients starting with ?q=, for the invoice form"""
+    try:
+        clients, next_cursor = autocomplete_clients(
+            request.user, request.GET.get('q', ''), after=request.GET.get('after'),
+        )
+    except InvalidCursor:
+        return JsonResponse({"errors": {"after": [{"message": "Invalid cursor"}]}}, status=400)
+    return JsonResponse({'results': clients, 'next': next_cursor})
+
+
 @login_required
 def generate_pdf_invoice(request, invoice_id):
     """Generate PDF Invoice"""
 
-    queryset = Invoice.objects.filter(user=request.user)
+    queryset = Invoice.objects.filter(user=request.user).select_related('client', 'user')
+
+    if settings.PDF_JOB_MODE or request.GET.get('mode') == 'job':
+        # Leave the render to the process_pdf_jobs worker
+        invoice = get_object_or_404(queryset, pk=invoice_id)
+        job = enqueue_pdf_job(invoice, request.user)
+        return JsonResponse(pdf_job_payload(job), status=202)
+
+    etag, last_modified = invoice_validators(request, invoice_id, pdf_version(request))
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return set_validators(response, etag, last_modified)
+
     invoice = get_object_or_404(queryset, pk=invoice_id)
+    pdf_file = get_invoice_pdf_pooled(invoice, base_url=request.build_absolute_uri())
+    pdf_filename = invoice_pdf_filename(invoice.id)
+    response = HttpResponse(pdf_file,
+                            content_type='application/pdf')
+    response['Content-Disposition'] = 'filename=%s' % (pdf_filename)
+    return set_validators(response, etag, last_modified)
+
+
+@login_required
+def export_pdf_invoices(request):
+    """Stream a ZIP archive of the user's invoices rendered as PDFs"""
+
+    form = InvoiceExportForm(request.GET, user=request.user)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+
+    queryset = filter_invoices(
+        Invoice.objects.filter(user=request.user), **form.cleaned_data
+    )
+    invoice_ids = queryset.order_by('id').values_list('id', flat=True)
+
+    response = StreamingHttpResponse(
+        stream_invoices_zip(invoice_ids, base_url=request.build_absolute_uri('/')),
+        content_type='application/zip',
+    )
+    response['Content-Disposition'] = 'attachment; filename=invoices.zip'
+    return response
+
+
+@login_required
+def client_statement(request, pk):
+    """PDF statement of a client's invoices, optionally between ?start_date= and ?end_date="""
+
+    client = get_object_or_404(Client.objects.select_related('created_by'), pk=pk, created_by=request.user)
+    form = StatementForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+
+    pdf_file = build_statement_pdf(client, base_url=request.build_absolute_uri('/'), **form.cleaned_data)
+    response = HttpResponse(pdf_file, content_type='application/pdf')
+    response['Content-Disposition'] = 'attachment; filename=%s' % statement_filename(client, **form.cleaned_data)
+    return response
 
-    client = invoice.client
-    user = invoice.user
-    invoice_items = InvoiceItem.objects.filter(invoice=invoice)
 
+@login_required
+def export_invoice_data(request):
+    """Stream the user's invoices and line items as CSV or JSONL"""
+
+    form = InvoiceDataExportForm(request.GET, user=request.user)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
 
-    context = {
-        "invoice": invoice,
-        "client": client,
-        "user": user,
-        "invoice_items": invoice_items,
+    export_format = form.cleaned_data.pop('format')
+    queryset = filter_invoices(
+        Invoice.objects.filter(user=request.user), **form.cleaned_data
+    )
+    response = StreamingHttpResponse(
+        stream_invoice_export(queryset, export_format),
+        content_type=EXPORT_FORMATS[export_format],
+    )
+    response['Content-Disposition'] = f'attachment; filename=invoices.{export_format}'
+    return response
+
+
+def pdf_job_payload(job):
+    payload = {
+        "id": job.pk,
+        "invoice": job.invoice_id,
+        "status": job.status,
+        "status_url": reverse('pdf-job-status', args=[job.pk]),
     }
+    if job.status == PdfJob.DONE:
+        payload["download_url"] = reverse('pdf-job-download', args=[job.pk])
+    elif job.status == PdfJob.FAILED:
+        payload["error"] = job.error
+    return payload
 
-    html_template = render_to_string('pdf/html-invoice.html', context)
 
-    pdf_file = HTML(string=html_template, base_url=request.build_absolute_uri()).write_pdf()
-    pdf_filename = f'invoice_{invoice.id}.pdf'
-    response = HttpResponse(pdf_file,
-                            content_type='application/pdf')
-    response['Content-Disposition'] = 'filename=%s' % (pdf_filename)
-    return  response
+@login_required
+@require_POST
+def make_invoice_recurring(request, pk):
+    """Bill the invoice's client for the same items on a schedule, see invoices.billing"""
+
+    invoice = get_object_or_404(Invoice.objects.filter(user=request.user), pk=pk)
+    form = RecurringInvoiceForm(request.POST)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    RecurringInvoice.objects.create_from_invoice(invoice, **form.cleaned_data)
+    return redirect(invoice)
+
+
+@login_required
+def pdf_job_status(request, pk):
+    """Report the progress of a queued PDF render"""
+
+    job = get_object_or_404(PdfJob.objects.filter(user=request.user), pk=pk)
+    return JsonResponse(pdf_job_payload(job))
+
+
+@login_required
+def download_pdf_job(request, pk):
+    """Serve the PDF produced by a finished job"""
+
+    job = get_object_or_404(PdfJob.objects.filter(user=request.user), pk=pk)
+    if job.status != PdfJob.DONE:
+        raise Http404("PDF job has not finished")
+    response = FileResponse(job.pdf.open('rb'), content_type='application/pdf')
+    response['Content-Disposition'] = 'filename=%s' % (invoice_pdf_filename(job.invoice_id))
+    return response
+
+
+@login_required
+@require_POST
+def import_invoices(request):
+    """
+    Import invoices from an uploaded CSV or JSONL file.
+
+    Progress, rejected rows and the final counts are streamed back as one
+    JSON object per line while the file is being imported.
+    """
+
+    form = InvoiceImportForm(request.POST, request.FILES)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+
+    upload = form.cleaned_data['file']
+    importer = InvoiceImporter(request.user, batch_size=form.cleaned_data['batch_size'] or 1000)
+    events = importer.run(open_rows(upload.file, upload.name))
+    return StreamingHttpResponse(
+        (json.dumps(event._asdict()) + '\n' for event in events),
+        content_type='application/x-ndjson',
+    )
+
+
+@login_required
+@require_POST
+def bulk_invoices_api(request):
+    """
+    Create or update a batch of invoices with their items from a JSON array.
+
+    The batch is validated as a whole and only saved when every invoice is
+    valid; otherwise the errors are returned by array index.
+    """
+
+    try:
+        records = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"errors": [{"index": None, "errors": {"__all__": [{"message": "Invalid JSON"}]}}]}, status=400)
+
+    invoices, errors = validate_invoices(request.user, records)
+    if errors:
+        return JsonResponse({"errors": errors}, status=400)
+    return JsonResponse({"results": save_invoices(request.user, invoices)})
+
+
+class InvoiceSearchView(LoginRequiredMixin, TemplateView):
+    template_name = 'search.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        context['query'] = query
+        context['results'] = search_invoices(self.request.user, query) if query else []
+        context['max_results'] = MAX_RESULTS
+        return context
+
+
+class RevenueReportView(LoginRequiredMixin, TemplateView):
+    template_name = 'revenue_report.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        form = RevenueReportForm(self.request.GET or None)
+        context['form'] = form
+        if form.is_bound and form.is_valid():
+            context['rows'] = revenue_report(self.request.user, **form.cleaned_data)
+        elif not form.is_bound:
+            context['rows'] = revenue_report(self.request.user)
+        return context
+
+
+@login_required
+def revenue_report_json(request):
+    """Revenue per month or quarter as JSON, answered from the rollups"""
+
+    form = RevenueReportForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+    return JsonResponse({
+        "period": form.cleaned_data['period'],
+        "rows": revenue_report(request.user, **form.cleaned_data),
+    })